@@ -0,0 +1,98 @@
+
+import logging
+import threading
+from collections import deque
+
+from eta import quantile
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveTimeouts:
+    """Per-site timeouts derived from rolling latency quantiles.
+
+    Every wait site (a selector or page event the automation waits for)
+    keeps its recent latencies. Once a site has min_samples observations its
+    timeout becomes the configured percentile times a safety factor, clamped
+    between min_ms and max_factor times the site's fixed default. Waits that
+    time out are recorded at the timeout value, so a slow spell pushes the
+    percentile up instead of failing wait after wait.
+    """
+
+    def __init__(self, enabled=True, percentile=0.95, safety_factor=1.5, min_ms=1000,
+                 max_factor=3.0, min_samples=20, window=200):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.safety_factor = safety_factor
+        self.min_ms = min_ms
+        self.max_factor = max_factor
+        self.min_samples = min_samples
+        self.window = window
+        self._samples = {}
+        self._defaults = {}
+        self._timeouts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build adaptive timeouts from get_config values"""
+        return cls(
+            enabled=config.get("ADAPTIVE_TIMEOUTS", True),
+            percentile=config.get("TIMEOUT_PERCENTILE", 0.95),
+            safety_factor=config.get("TIMEOUT_SAFETY_FACTOR", 1.5),
+            min_ms=config.get("TIMEOUT_MIN_MS", 1000),
+            max_factor=config.get("TIMEOUT_MAX_FACTOR", 3.0),
+            min_samples=config.get("TIMEOUT_MIN_SAMPLES", 20),
+            window=config.get("TIMEOUT_WINDOW", 200),
+        )
+
+    def get(self, site, default_ms):
+        """Timeout in ms to use for a wait site"""
+        with self._lock:
+            self._defaults[site] = default_ms
+            if not self.enabled:
+                return default_ms
+            return self._timeouts.get(site, default_ms)
+
+    def observe(self, site, elapsed_ms):
+        """Record a wait that succeeded after elapsed_ms"""
+        self._add(site, elapsed_ms)
+
+    def observe_timeout(self, site, timeout_ms):
+        """Record a wait that gave up after timeout_ms"""
+        self._add(site, timeout_ms)
+
+    def _add(self, site, value_ms):
+        with self._lock:
+            samples = self._samples.setdefault(site, deque(maxlen=self.window))
+            samples.append(value_ms)
+            if len(samples) < self.min_samples:
+                return
+            default_ms = self._defaults.get(site, value_ms)
+            target = quantile(list(samples), self.percentile) * self.safety_factor
+            timeout = int(min(max(target, self.min_ms), default_ms * self.max_factor))
+            previous = self._timeouts.get(site)
+            self._timeouts[site] = timeout
+        if previous is None or abs(timeout - previous) > previous * 0.25:
+            logger.info(f"Adaptive timeout for '{site}': {timeout}ms (default {default_ms}ms, {len(samples)} samples)")
+
+    def status(self):
+        """Current timeout and latency quantiles of every site"""
+        with self._lock:
+            sites = {}
+            for site, default_ms in self._defaults.items():
+                samples = list(self._samples.get(site, []))
+                sites[site] = {
+                    "timeout_ms": self._timeouts.get(site, default_ms) if self.enabled else default_ms,
+                    "default_ms": default_ms,
+                    "samples": len(samples),
+                    "p50_ms": quantile(samples, 0.5) if samples else None,
+                    "p95_ms": quantile(samples, 0.95) if samples else None,
+                    "adaptive": self.enabled and site in self._timeouts,
+                }
+            return {
+                "enabled": self.enabled,
+                "percentile": self.percentile,
+                "safety_factor": self.safety_factor,
+                "sites": sites,
+            }
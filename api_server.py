@@ -1,8 +1,25 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from typing import List
+import asyncio
+import hashlib
+import hmac
+import json
 import logging
+import os
+from audio_stream import RangeFileResponse
+from downloader import DownloadError
+from jobs import Job
+from mp3index import frame_index
+from circuit_breaker import CircuitOpenError
+from credits import InsufficientCreditsError
+import metrics
+from tracing import now_us, trace_of
+from profiling import HeapTracker, ProfilerBusyError, SamplingProfiler
 
 app = FastAPI()
 
@@ -19,12 +36,88 @@ app.add_middleware(
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# In-process diagnostics behind /debug, enabled by setting DEBUG_TOKEN
+profiler = SamplingProfiler()
+heap_tracker = HeapTracker()
+
 class GenerateRequest(BaseModel):
     prompt: str
     style: str = None
     title: str = None
     instrumental: bool = True
     download: bool = True
+    timeout: float = None  # Overall job budget in seconds
+    trace: bool = False  # Always record a trace for this job, regardless of sampling
+
+class BatchRequest(BaseModel):
+    songs: List[GenerateRequest]
+
+def _job_from_request(request: GenerateRequest):
+    """Build a staged job from a generate request"""
+    job = Job(
+        prompt=request.prompt,
+        style=request.style,
+        title=request.title,
+        instrumental=request.instrumental,
+        download=request.download,
+        timeout=request.timeout
+    )
+    # Start the trace here so it also covers admission and queueing
+    if hasattr(app.state, "tracer"):
+        app.state.tracer.begin(job, force=request.trace)
+    return job
+
+def _submit(job):
+    """Queue a job, failing fast while the circuit breakers are open or credits are short"""
+    return _submit_batch([job])[0]
+
+def _submit_batch(jobs):
+    job_manager = _get_job_manager()
+    started_us = now_us()
+    try:
+        if len(jobs) == 1:
+            return [job_manager.submit(jobs[0])]
+        return job_manager.submit_batch(jobs)
+    except CircuitOpenError as e:
+        retry_after = int(e.retry_after or 0) + 1
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(retry_after)})
+    except InsufficientCreditsError as e:
+        raise HTTPException(status_code=402, detail=str(e))
+    finally:
+        for job in jobs:
+            trace_of(job).complete("api.admission", started_us, now_us(), cat="api", batch_size=len(jobs))
+
+def _get_job_manager():
+    if not hasattr(app.state, "job_manager"):
+        raise HTTPException(status_code=500, detail="Job manager not initialized")
+    return app.state.job_manager
+
+def _require_debug_token(http_request: Request):
+    """Only allow /debug calls carrying the configured X-Debug-Token header"""
+    expected = getattr(app.state, "debug_token", None)
+    if not expected:
+        raise HTTPException(status_code=404, detail="Debug endpoints are disabled (set DEBUG_TOKEN)")
+    provided = http_request.headers.get("X-Debug-Token", "")
+    if not hmac.compare_digest(provided.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+def _job_eta(job):
+    """ETA of a job from the phase history, adjusted for its queue position"""
+    if not hasattr(app.state, "eta"):
+        return None
+    job_manager = _get_job_manager()
+    workers = max(1, job_manager.pool_status()["slots"])
+    return app.state.eta.estimate(job, job_manager.queue_position(job), workers)
+
+async def _wait_for_job(job, http_request: Request):
+    """Wait for a job to finish, cancelling it if the client goes away"""
+    while not job.done.is_set():
+        if await http_request.is_disconnected():
+            logger.info(f"Client disconnected, cancelling job {job.id}")
+            app.state.job_manager.cancel(job.id)
+            return False
+        await asyncio.sleep(0.5)
+    return True
 
 @app.get("/status")
 async def get_status():
@@ -38,44 +131,349 @@ async def get_status():
     automation_status = app.state.automation.get_status()
     logger.info(f"Returning status: {automation_status}")
     
-    return {
+    status = {
         "status": "running", 
         "logged_in": automation_status["logged_in"],
         "connected": automation_status["connected"],
         "error": automation_status["error"]
     }
+    
+    if hasattr(app.state.automation, "timeouts"):
+        status["timeouts"] = {site: data["timeout_ms"] for site, data in app.state.automation.timeouts.status()["sites"].items()}
+    
+    if hasattr(app.state, "job_manager"):
+        status["queue_depth"] = app.state.job_manager.queue_depth()
+        status["pool"] = app.state.job_manager.pool_status()
+        status["circuit_breakers"] = app.state.job_manager.breakers.status()
+        status["credits"] = app.state.job_manager.credits.status()
+    
+    return status
 
 @app.post("/generate")
-async def generate_song(request: GenerateRequest):
+async def generate_song(request: GenerateRequest, http_request: Request):
     """Generate a song with the provided prompt"""
-    if not hasattr(app.state, "automation"):
-        raise HTTPException(status_code=500, detail="Automation not initialized")
-    
     try:
-        # Generate the song
-        result = app.state.automation.generate_song(
-            prompt=request.prompt,
-            style=request.style,
-            title=request.title,
-            instrumental=request.instrumental
-        )
+        # Run generation and download as one staged job, so a failed download
+        # is retried on its own instead of forcing a new generation
+        job = _submit(_job_from_request(request))
+        if not await _wait_for_job(job, http_request):
+            raise HTTPException(status_code=499, detail="Client disconnected, job cancelled")
+        result = job.result()
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result.get("error", "Failed to generate song"))
         
-        # Download if requested
-        if request.download:
-            download_result = app.state.automation.download_song(result["url"])
-            if download_result["success"]:
-                result["file_path"] = download_result["file_path"]
-            else:
-                result["download_error"] = download_result.get("error", "Unknown download error")
-        
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating song: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/jobs", status_code=202)
+async def submit_job(request: GenerateRequest):
+    """Queue a song job and return immediately with its id"""
+    job = _submit(_job_from_request(request))
+    return {"job_id": job.id, "status": job.status}
+
+@app.post("/jobs/batch", status_code=202)
+async def submit_batch(request: BatchRequest):
+    """Queue several song jobs, rejecting the whole batch if credits do not cover it"""
+    if not request.songs:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    jobs = _submit_batch([_job_from_request(song) for song in request.songs])
+    return {"jobs": [{"job_id": job.id, "status": job.status} for job in jobs]}
+
+@app.get("/jobs/dead-letter")
+async def list_dead_letter_jobs():
+    """List jobs that exhausted their retries"""
+    if not hasattr(app.state, "automation"):
+        raise HTTPException(status_code=500, detail="Automation not initialized")
+    
+    dead_letter = app.state.automation.job_runner.dead_letter
+    return {"jobs": [job.to_dict() for job in dead_letter.list()]}
+
+@app.post("/jobs/dead-letter/{job_id}/replay")
+async def replay_dead_letter_job(job_id: str):
+    """Run a dead-lettered job again, resuming from its durable checkpoints"""
+    if not hasattr(app.state, "automation"):
+        raise HTTPException(status_code=500, detail="Automation not initialized")
+    
+    job = app.state.automation.job_runner.dead_letter.pop(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found in dead-letter queue")
+    
+    logger.info(f"Replaying dead-lettered job {job_id}")
+    job.reset_for_replay()
+    try:
+        _submit(job)
+    except HTTPException:
+        # Keep the job around so it can be replayed once the breaker closes
+        app.state.automation.job_runner.dead_letter.add(job)
+        raise
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return the state of a job, including its result once finished"""
+    job = _get_job_manager().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    
+    data = job.to_dict()
+    data["eta"] = _job_eta(job)
+    if job.done.is_set():
+        data["result"] = job.result()
+    return data
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, http_request: Request):
+    """Server-sent events with the job's stage and ETA until it finishes"""
+    job = _get_job_manager().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    async def events():
+        while True:
+            if await http_request.is_disconnected():
+                return
+            data = {"job_id": job.id, "status": job.status, "stage": job.current_stage, "eta": _job_eta(job)}
+            if job.done.is_set():
+                data["result"] = job.result()
+                yield f"event: done\ndata: {json.dumps(data)}\n\n"
+                return
+            yield f"event: progress\ndata: {json.dumps(data)}\n\n"
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/trace")
+async def get_job_trace(job_id: str):
+    """Chrome Trace Event JSON of a traced job, for chrome://tracing or Perfetto"""
+    job = _get_job_manager().get(job_id)
+    trace_path = job.trace_path if job else None
+    if not trace_path and hasattr(app.state, "tracer") and app.state.tracer.output_dir:
+        # Traces outlive the in-memory job history
+        trace_path = os.path.join(app.state.tracer.output_dir, f"trace_{os.path.basename(job_id)}.json")
+    if not trace_path or not os.path.exists(trace_path):
+        raise HTTPException(status_code=404, detail=f"No trace recorded for job {job_id}")
+    return FileResponse(trace_path, media_type="application/json", filename=f"trace_{job_id}.json")
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job and free its browser slot"""
+    job = _get_job_manager().cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {"job_id": job.id, "status": job.status}
+
+def _get_library():
+    library = getattr(app.state, "library", None)
+    if library is None:
+        raise HTTPException(status_code=500, detail="Song library not initialized")
+    return library
+
+def _library_etag(library, request: Request):
+    """Weak ETag of a library response: data version plus the query that produced it"""
+    digest = hashlib.sha1(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:16]
+    return f'W/"{library.version()}-{request.url.path}-{digest}"'
+
+def _not_modified(request: Request, etag):
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
+@app.get("/songs")
+def list_songs(request: Request, q: str = None, sort: str = "created", order: str = "desc", limit: int = 50,
+               cursor: str = None, instrumental: bool = None, min_duration: float = None, max_duration: float = None):
+    """Search the song library by prompt, style and title, a cursor page at a time"""
+    library = _get_library()
+    etag = _library_etag(library, request)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    filters = {"instrumental": instrumental, "min_duration": min_duration, "max_duration": max_duration}
+    try:
+        songs, next_cursor = library.page(q, sort=sort, descending=order != "asc", limit=max(1, min(limit, 500)),
+                                          cursor=cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    body = {"songs": songs, "next_cursor": next_cursor}
+    if not cursor:
+        # Counting is the expensive part, so only the first page carries the total
+        body["total"] = library.count(q, **filters)
+    return JSONResponse(body, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.get("/songs/export")
+def export_songs(request: Request, q: str = None, sort: str = "created", order: str = "desc",
+                 instrumental: bool = None, min_duration: float = None, max_duration: float = None):
+    """Every matching song as NDJSON, streamed from the database in batches"""
+    library = _get_library()
+    etag = _library_etag(library, request)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    if sort not in ("created", "duration", "relevance"):
+        raise HTTPException(status_code=400, detail=f"Unknown sort '{sort}'")
+    songs = library.iter_songs(q, sort=sort, descending=order != "asc", instrumental=instrumental,
+                               min_duration=min_duration, max_duration=max_duration)
+    lines = (json.dumps(song) + "\n" for song in songs)
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers={
+        "ETag": etag,
+        "Content-Disposition": 'attachment; filename="songs.ndjson"',
+    })
+
+@app.get("/songs/{song_id}")
+def get_song(song_id: int, request: Request):
+    """One song of the library"""
+    library = _get_library()
+    etag = _library_etag(library, request)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    song = library.get(song_id)
+    if not song:
+        raise HTTPException(status_code=404, detail=f"Song {song_id} not found")
+    fetcher = getattr(app.state, "fetcher", None)
+    if fetcher:
+        # Looking at a song is a good hint it will be played: start fetching its audio
+        fetcher.want(song)
+    return JSONResponse(song, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.api_route("/songs/{song_id}/audio", methods=["GET", "HEAD"])
+async def get_song_audio(song_id: int, request: Request, start: float = None, end: float = None):
+    """The song's audio file, with Range support for seeking; start and end (seconds) pick a span of it"""
+    library = _get_library()
+    song = await run_in_threadpool(library.get, song_id)
+    if not song:
+        raise HTTPException(status_code=404, detail=f"Song {song_id} not found")
+    file_path = song.get("file_path")
+    try:
+        stat_result = await run_in_threadpool(os.stat, file_path) if file_path else None
+    except OSError:
+        stat_result = None
+    fetcher = getattr(app.state, "fetcher", None)
+    if stat_result is None and fetcher and song.get("audio_url"):
+        # Not downloaded yet (lazy mode, or the download failed): fetch it now
+        try:
+            file_path = await run_in_threadpool(fetcher.fetch, song)
+            stat_result = await run_in_threadpool(os.stat, file_path)
+        except (DownloadError, OSError) as e:
+            raise HTTPException(status_code=502, detail=f"Could not fetch the audio of song {song_id}: {str(e)}")
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail=f"Song {song_id} has no audio file")
+    if request.method == "GET" and start is None and request.headers.get("range", "bytes=0-").startswith("bytes=0-"):
+        # Seeks within a playback are not new plays
+        await run_in_threadpool(library.record_play, song_id)
+    byte_range = None
+    if start is not None or end is not None:
+        # The frame index maps times to frame boundaries without reading the audio
+        index = await run_in_threadpool(frame_index, file_path)
+        if not index.frames:
+            raise HTTPException(status_code=400, detail=f"Song {song_id} cannot be seeked by time")
+        byte_range = index.byte_range(start or 0, end)
+    return RangeFileResponse(file_path, request.headers, etag=song.get("sha256"), method=request.method,
+                             stat_result=stat_result, byte_range=byte_range)
+
+@app.put("/songs/{song_id}/pin")
+def pin_song(song_id: int):
+    """Keep the song's audio on disk whatever the audio quota"""
+    library = _get_library()
+    if not library.get(song_id):
+        raise HTTPException(status_code=404, detail=f"Song {song_id} not found")
+    library.pin(song_id)
+    return {"id": song_id, "pinned": True}
+
+@app.delete("/songs/{song_id}/pin")
+def unpin_song(song_id: int):
+    """Let the audio quota evict the song's audio again"""
+    library = _get_library()
+    if not library.get(song_id):
+        raise HTTPException(status_code=404, detail=f"Song {song_id} not found")
+    library.pin(song_id, pinned=False)
+    return {"id": song_id, "pinned": False}
+
+def _get_housekeeper():
+    housekeeper = getattr(app.state, "housekeeper", None)
+    if housekeeper is None:
+        raise HTTPException(status_code=500, detail="Housekeeping not initialized")
+    return housekeeper
+
+@app.get("/storage")
+def get_storage():
+    """Disk usage and limits of audio, debug captures, temp files and logs"""
+    housekeeper = _get_housekeeper()
+    return {"categories": housekeeper.usage(), "last_run": housekeeper.last_run}
+
+@app.post("/storage/cleanup")
+def run_storage_cleanup():
+    """Enforce the quotas now instead of waiting for the next pass"""
+    return _get_housekeeper().run()
+
+def _get_sync():
+    sync = getattr(app.state, "sync", None)
+    if sync is None:
+        raise HTTPException(status_code=500, detail="Library sync not initialized")
+    return sync
+
+@app.post("/library/sync", status_code=202)
+def start_library_sync(full: bool = False):
+    """Import the account's songs missing from the library, in the background"""
+    sync = _get_sync()
+    try:
+        # Cookies and the session token live in the browser, which only a worker thread may touch
+        headers = _get_job_manager().call(lambda automation: automation.session_headers(sync.feed_url, bearer=True))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Could not read the browser session: {str(e)}")
+    if not sync.start(headers, full=full):
+        raise HTTPException(status_code=409, detail="A library sync is already running")
+    return sync.status
+
+@app.get("/library/sync")
+def get_library_sync():
+    """State and counts of the current or last library sync"""
+    return _get_sync().status
+
+@app.get("/timeouts")
+async def get_timeouts():
+    """Timeouts currently chosen for each wait site, with their latency quantiles"""
+    if not hasattr(app.state, "automation"):
+        raise HTTPException(status_code=500, detail="Automation not initialized")
+    return app.state.automation.timeouts.status()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: phase latencies, outcomes, queue and pool state"""
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
+
+@app.get("/debug/profile")
+async def debug_profile(http_request: Request, seconds: float = 10):
+    """Sample every thread for N seconds and return collapsed stacks for a flamegraph"""
+    _require_debug_token(http_request)
+    loop = asyncio.get_event_loop()
+    try:
+        # Sample from a worker thread so the event loop keeps serving (and shows up in the profile)
+        collapsed = await loop.run_in_executor(None, profiler.profile, seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(
+        content=collapsed,
+        media_type="text/plain",
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+    )
+
+@app.get("/debug/heap")
+async def debug_heap(http_request: Request, limit: int = 25, group_by: str = "lineno"):
+    """Top tracemalloc allocations and the diff since the previous call"""
+    _require_debug_token(http_request)
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, heap_tracker.report, limit, group_by)
+
+@app.delete("/debug/heap")
+async def debug_heap_stop(http_request: Request):
+    """Stop tracemalloc and drop the saved snapshot"""
+    _require_debug_token(http_request)
+    heap_tracker.stop()
+    return {"tracing": False}
+
 @app.get("/health")
 async def health_check():
     """Simple health check endpoint"""
@@ -0,0 +1,144 @@
+
+import logging
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+
+import anyio
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    """(start, end) of a single-range Range header, inclusive.
+
+    Returns None when there is no usable range, so the whole file is sent:
+    no header, another unit, or several ranges. Raises ValueError when the
+    range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip().replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {header} outside of {size} bytes")
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """A file, or the byte range of it the client asked for.
+
+    Answers Range requests with 206 (seeking in an <audio> element), If-Range
+    and If-None-Match with the full file or a 304, and unsatisfiable ranges
+    with 416. byte_range, a span chosen by the server (a time span of the
+    song), is served as a resource of its own: 200 with an ETag naming the
+    span, and client ranges relative to it. The body goes out through the server's zero-copy send when it
+    offers the ASGI extension, otherwise in chunks read off the event loop,
+    so a long playback never holds a worker thread or the whole file in
+    memory.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path, request_headers, etag=None, media_type=None, method="GET",
+                 cache_control="public, max-age=3600", stat_result=None, byte_range=None):
+        stat_result = stat_result or os.stat(path)
+        self.path = path
+        offset, last = byte_range or (0, stat_result.st_size - 1)
+        self.size = last - offset + 1
+        self.send_header_only = method.upper() == "HEAD"
+        self.background = None
+        self.media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        etag = etag or f"{int(stat_result.st_mtime)}-{stat_result.st_size}"
+        # A span is other content than the whole file, so it cannot share its validator
+        etag = f'"{etag}-{offset}-{last}"' if byte_range else f'"{etag}"'
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "cache-control": cache_control,
+        }
+
+        self.start, self.end = offset, last
+        self.status_code = 200
+        if etag in [tag.strip() for tag in request_headers.get("if-none-match", "").split(",")]:
+            self.status_code = 304
+        else:
+            if_range = request_headers.get("if-range")
+            # A range against an older version of the file is ignored: send it all
+            range_header = request_headers.get("range") if not if_range or if_range == etag else None
+            try:
+                requested = parse_range(range_header, self.size)
+            except ValueError:
+                self.status_code = 416
+                headers["content-range"] = f"bytes */{self.size}"
+            else:
+                if requested:
+                    self.start, self.end = offset + requested[0], offset + requested[1]
+                    self.status_code = 206
+                    headers["content-range"] = f"bytes {requested[0]}-{requested[1]}/{self.size}"
+        if self.status_code in (304, 416):
+            self.start, self.end = 0, -1
+        if self.status_code == 304:
+            self.media_type = None
+        else:
+            headers["content-length"] = str(self.end - self.start + 1)
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or self.end < self.start:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with anyio.create_task_group() as task_group:
+            async def send_and_cancel():
+                await self._send_body(scope, send)
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(send_and_cancel)
+            # A client that seeks closes the connection; stop reading the file then
+            await self._wait_for_disconnect(receive)
+            task_group.cancel_scope.cancel()
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def _send_body(self, scope, send):
+        count = self.end - self.start + 1
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": f.fileno(),
+                            "offset": self.start, "count": count, "more_body": False})
+                return
+            offset = self.start
+            while count > 0:
+                # pread leaves the file position alone and runs in a worker for each chunk only
+                chunk = await anyio.to_thread.run_sync(os.pread, f.fileno(), min(self.chunk_size, count), offset)
+                if not chunk:
+                    logger.warning(f"{self.path} shrank while being sent")
+                    break
+                offset += len(chunk)
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+        if count > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,402 @@
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from statistics import NormalDist
+
+from jobs import Job
+from loadtest import git_revision
+
+logger = logging.getLogger(__name__)
+
+# Registered benchmarks: name -> (function, unit, higher_is_better)
+BENCHMARKS = {}
+
+FORM_TEXT = "A slow acoustic ballad about a lighthouse keeper who talks to the sea"
+
+
+def benchmark(name, unit="s", higher_is_better=False):
+    """Register a benchmark. The function returns one measurement per call"""
+    def register(func):
+        BENCHMARKS[name] = (func, unit, higher_is_better)
+        return func
+    return register
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class BenchContext:
+    """Deterministic mock backend and a shared automation for the browser benchmarks"""
+
+    def __init__(self, headless=True):
+        self.headless = headless
+        self.tmpdir = tempfile.mkdtemp(prefix="suno_bench_")
+        self._mock = None
+        self._automation = None
+        self.base_url = None
+
+    def mock(self):
+        if self._mock is None:
+            from mock_suno import MockSettings, start_in_thread
+            # No jitter, faults or latency, so run-to-run variance comes from our code
+            settings = MockSettings(render_seconds=3, render_jitter=0, credits=10 ** 9, audio_seconds=120)
+            port = _free_port()
+            self._mock = start_in_thread(settings, port=port)
+            self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    def store(self):
+        # Keep benchmark downloads out of the user's song store
+        from storage import SongStore
+        return SongStore(os.path.join(self.tmpdir, "store"), links=False)
+
+    def automation(self):
+        if self._automation is None:
+            from playwright_automation import SunoAutomation
+            self._automation = SunoAutomation(headless=self.headless, base_url=self.mock(), store=self.store())
+            if not self._automation.connected:
+                raise RuntimeError(f"Browser not available: {self._automation.connection_error}")
+            self._automation.login()
+        return self._automation
+
+    def close(self):
+        if self._automation:
+            self._automation.close()
+        if self._mock:
+            self._mock.should_exit = True
+
+
+@benchmark("browser_launch")
+def bench_browser_launch(ctx):
+    """Playwright start, browser launch, context and page creation"""
+    from playwright_automation import SunoAutomation
+    started = time.perf_counter()
+    automation = SunoAutomation(headless=ctx.headless, base_url=ctx.mock(), store=ctx.store())
+    elapsed = time.perf_counter() - started
+    if not automation.connected:
+        raise RuntimeError(f"Browser not available: {automation.connection_error}")
+    automation.close()
+    return elapsed
+
+
+@benchmark("login_stored_state")
+def bench_login_stored_state(ctx):
+    """New context from saved storage state until the create form is usable"""
+    automation = ctx.automation()
+    state_path = os.path.join(ctx.tmpdir, "storage_state.json")
+    if not os.path.exists(state_path):
+        automation.context.storage_state(path=state_path)
+    started = time.perf_counter()
+    context = automation.browser.new_context(storage_state=state_path)
+    page = context.new_page()
+    page.goto(automation.create_url, wait_until="domcontentloaded")
+    page.wait_for_selector('textarea[placeholder="Enter style of music"]')
+    elapsed = time.perf_counter() - started
+    context.close()
+    return elapsed
+
+
+def _form_fill(ctx, strategy):
+    automation = ctx.automation()
+    automation._goto(automation.create_url)
+    textarea = automation.page.wait_for_selector("textarea")
+    started = time.perf_counter()
+    if strategy == "human_type":
+        automation._human_type(textarea, FORM_TEXT)
+    elif strategy == "insert_text":
+        textarea.click()
+        automation.page.keyboard.insert_text(FORM_TEXT)
+    else:
+        textarea.fill(FORM_TEXT)
+    return time.perf_counter() - started
+
+
+@benchmark("form_fill_human_type")
+def bench_form_fill_human_type(ctx):
+    """The automation's per-character typing"""
+    return _form_fill(ctx, "human_type")
+
+
+@benchmark("form_fill_fill")
+def bench_form_fill_fill(ctx):
+    """Playwright fill() of the same text, as the lower bound"""
+    return _form_fill(ctx, "fill")
+
+
+@benchmark("form_fill_insert_text")
+def bench_form_fill_insert_text(ctx):
+    """Single input event with keyboard.insert_text()"""
+    return _form_fill(ctx, "insert_text")
+
+
+@benchmark("form_fill_stage")
+def bench_form_fill_stage(ctx):
+    """The whole fill stage: navigation, waits, typing and toggles"""
+    automation = ctx.automation()
+    automation._goto(automation.create_url)
+    job = Job(FORM_TEXT, style="acoustic, folk", title="Benchmark", instrumental=True, download=False)
+    handler = automation.stage_handlers()["fill"]
+    started = time.perf_counter()
+    handler(job)
+    return time.perf_counter() - started
+
+
+@benchmark("selector_resolution", unit="ms")
+def bench_selector_resolution(ctx):
+    """Mean time to resolve the create-form selectors on a loaded page"""
+    automation = ctx.automation()
+    automation._goto(automation.create_url)
+    selectors = [
+        'textarea[placeholder="Enter style of music"]',
+        'textarea[placeholder="Enter a title"]',
+        'div[aria-label="Instrumental"]',
+        '.buttonAnimate >> text=Create',
+        'textarea',
+    ]
+    rounds = 20
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for selector in selectors:
+            automation.page.wait_for_selector(selector)
+    return (time.perf_counter() - started) * 1000 / (rounds * len(selectors))
+
+
+@benchmark("create_to_complete")
+def bench_create_to_complete(ctx):
+    """Submit and await stages against a fixed 3 s render; overhead above 3 s is ours"""
+    automation = ctx.automation()
+    # Start from an empty feed so earlier clips cannot satisfy the wait
+    urllib.request.urlopen(urllib.request.Request(f"{ctx.mock()}/mock/reset", method="POST")).close()
+    automation._goto(automation.create_url)
+    job = Job(FORM_TEXT, download=False)
+    handlers = automation.stage_handlers()
+    automation.page.fill("textarea", FORM_TEXT)
+    started = time.perf_counter()
+    job.checkpoint("submit", handlers["submit"](job))
+    handlers["await"](job)
+    return time.perf_counter() - started
+
+
+@benchmark("download_throughput", unit="MB/s", higher_is_better=True)
+def bench_download_throughput(ctx):
+    """Save a finished 120 s clip through the page's download button"""
+    automation = ctx.automation()
+    if not automation.page.query_selector('button:has-text("Download")'):
+        bench_create_to_complete(ctx)
+    started = time.perf_counter()
+    path = automation._download_file()
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(path)
+    os.remove(path)
+    return size / 1048576 / elapsed
+
+
+@benchmark("download_ranged", unit="MB/s", higher_is_better=True)
+def bench_download_ranged(ctx):
+    """Fetch a finished 120 s clip with the ranged downloader, no browser involved"""
+    from downloader import Downloader
+    if not getattr(ctx, "audio_url", None):
+        request = urllib.request.Request(f"{ctx.mock()}/api/generate", data=json.dumps({"prompt": FORM_TEXT}).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request) as response:
+            clip = json.load(response)["clips"][0]
+        time.sleep(3.5)
+        ctx.audio_url = f"{ctx.mock()}/api/audio/{clip['id']}.mp3"
+    path = os.path.join(ctx.tmpdir, "ranged.mp3")
+    started = time.perf_counter()
+    result = Downloader().download(ctx.audio_url, path)
+    elapsed = time.perf_counter() - started
+    os.remove(path)
+    return result["size"] / 1048576 / elapsed
+
+
+@benchmark("api_startup")
+def bench_api_startup(ctx):
+    """Interpreter start, imports and uvicorn startup until /health answers"""
+    port = _free_port()
+    code = f"import uvicorn, api_server; uvicorn.run(api_server.app, host='127.0.0.1', port={port}, log_level='warning')"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < 60:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError("API server did not start within 60s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(names, repeat=5, warmup=1, headless=True):
+    """Run the selected benchmarks and return the result document"""
+    ctx = BenchContext(headless=headless)
+    results = {}
+    try:
+        for name in names:
+            func, unit, higher_is_better = BENCHMARKS[name]
+            samples = []
+            try:
+                for i in range(warmup + repeat):
+                    value = func(ctx)
+                    if i >= warmup:
+                        samples.append(round(value, 6))
+            except Exception as e:
+                logger.error(f"Benchmark {name} failed: {str(e)}")
+                results[name] = {"unit": unit, "higher_is_better": higher_is_better, "error": str(e), "samples": samples}
+                continue
+            results[name] = {
+                "unit": unit,
+                "higher_is_better": higher_is_better,
+                "samples": samples,
+                "median": statistics.median(samples),
+            }
+            logger.info(f"{name}: median {results[name]['median']:.4g} {unit} over {len(samples)} runs")
+    finally:
+        ctx.close()
+    return {
+        "created_at": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "benchmarks": results,
+    }
+
+
+def mann_whitney_p(a, b):
+    """Two-sided p-value of the Mann-Whitney U test (normal approximation)"""
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return 1.0
+    combined = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+    ranks = [0.0] * len(combined)
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        i = j + 1
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    sigma = math.sqrt(n1 * n2 * (n1 + n2 + 1) / 12)
+    if sigma == 0:
+        return 1.0
+    z = (u - n1 * n2 / 2) / sigma
+    return 2 * (1 - NormalDist().cdf(abs(z)))
+
+
+def compare(baseline, current, threshold=0.10, alpha=0.05):
+    """Compare two result documents, returning one row per shared benchmark"""
+    rows = []
+    for name, new in current["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if not old or not old.get("samples") or not new.get("samples"):
+            continue
+        old_median = statistics.median(old["samples"])
+        new_median = statistics.median(new["samples"])
+        change = (new_median - old_median) / old_median if old_median else 0.0
+        worse = -change if new.get("higher_is_better") else change
+        p_value = mann_whitney_p(old["samples"], new["samples"])
+        if p_value < alpha and worse > threshold:
+            verdict = "REGRESSION"
+        elif p_value < alpha and worse < -threshold:
+            verdict = "improvement"
+        else:
+            verdict = "ok"
+        rows.append({
+            "name": name,
+            "unit": new["unit"],
+            "baseline": old_median,
+            "current": new_median,
+            "change": change,
+            "p_value": p_value,
+            "verdict": verdict,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Performance benchmarks with stored baselines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run benchmarks and store the results")
+    run_parser.add_argument("--only", help="comma-separated benchmark names")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--headed", action="store_true", help="show the browser")
+    run_parser.add_argument("--output", help="result file (default benchmarks/<revision>-<date>.json)")
+    run_parser.add_argument("--baseline", help="compare against this result file when done")
+
+    compare_parser = commands.add_parser("compare", help="flag significant regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--threshold", type=float, default=0.10, help="relative change that counts (default 10%%)")
+        sub.add_argument("--alpha", type=float, default=0.05, help="significance level (default 0.05)")
+
+    commands.add_parser("list", help="list available benchmarks")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.command == "list":
+        for name, (func, unit, _) in BENCHMARKS.items():
+            print(f"{name:24} {unit:5} {func.__doc__}")
+        return 0
+
+    if args.command == "run":
+        names = args.only.split(",") if args.only else list(BENCHMARKS)
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+        current = run(names, repeat=args.repeat, warmup=args.warmup, headless=not args.headed)
+        output = args.output or os.path.join("benchmarks", f"{current['revision'] or 'local'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Results written to {output}")
+        if not args.baseline:
+            return 0
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+
+    rows = compare(baseline, current, threshold=args.threshold, alpha=args.alpha)
+    for row in rows:
+        print(f"{row['name']:24} {row['baseline']:>10.4g} -> {row['current']:<10.4g} {row['unit']:5} "
+              f"{row['change']:+7.1%}  p={row['p_value']:.3f}  {row['verdict']}")
+    regressions = [row for row in rows if row["verdict"] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} significant regression(s)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,7 +16,9 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException,
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.core.os_manager import ChromeType
 import pyautogui
-from utils import random_wait, ensure_dir_exists
+from utils import random_wait, ensure_dir_exists, safe_filename
+from downloader import Downloader, DownloadError
+from storage import SongStore
 
 pyautogui.FAILSAFE = True  # Move mouse to upper-left corner to abort
 
@@ -25,16 +27,19 @@ logger = logging.getLogger(__name__)
 class SunoAutomation:
     """Class to automate interactions with Suno.com"""
     
-    def __init__(self, email=None, password=None, headless=False, use_chrome_profile=False, chrome_user_data_dir=None):
+    def __init__(self, email=None, password=None, headless=False, use_chrome_profile=False, chrome_user_data_dir=None, base_url=None, downloader=None, store=None):
         self.email = email
         self.password = password
         self.logged_in = False
         self.headless = headless
         self.use_chrome_profile = use_chrome_profile
         self.chrome_user_data_dir = chrome_user_data_dir
+        self.create_url = f"{(base_url or 'https://suno.com').rstrip('/')}/create?wid=default"
         self.driver = None
         self.connected = False
         self.connection_error = None
+        self.downloader = downloader or Downloader()
+        self.store = store or SongStore(os.path.join(os.path.expanduser("~"), "Downloads", "suno"))
         
         try:
             self.driver = self._setup_driver()
@@ -198,7 +203,7 @@ class SunoAutomation:
         logger.info("Navigating to Suno.com")
         try:
             # Updated URL to use the new domain and dashboard path
-            self.driver.get("https://suno.com/create?wid=default")
+            self.driver.get(self.create_url)
             
             # Take a debug screenshot
             screenshot_path = os.path.join(os.path.expanduser("~"), "suno_debug_login.png")
@@ -344,7 +349,7 @@ class SunoAutomation:
         try:
             # Navigate to create page if not already there
             if "create" not in self.driver.current_url:
-                self.driver.get("https://suno.com/create?wid=default")
+                self.driver.get(self.create_url)
                 time.sleep(3)
                 logger.info("Navigated to the create page")
             
@@ -632,6 +637,13 @@ class SunoAutomation:
             # Take a screenshot to debug download process
             self.driver.save_screenshot(os.path.join(os.path.expanduser("~"), "suno_debug_download.png"))
             
+            downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
+            
+            # Fetch the audio directly when the page exposes its URL
+            file_path = self._download_audio()
+            if file_path:
+                return {"success": True, "file_path": file_path}
+            
             # Look for download button - there are several ways it might appear in the UI
             download_selectors = [
                 "//button[contains(text(), 'Download')]", 
@@ -663,23 +675,21 @@ class SunoAutomation:
             time.sleep(1)
             
             # Click the download button
+            clicked_at = time.time()
             self._human_move_and_click(download_element)
             
-            # Wait for download to start
-            time.sleep(5)
-            
-            # Get the most recently downloaded file in the Downloads folder
-            downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
-            files = sorted(
-                [os.path.join(downloads_path, f) for f in os.listdir(downloads_path)],
-                key=os.path.getctime
-            )
-            
-            if files:
-                latest_file = files[-1]
-                if (latest_file.endswith('.mp3') or latest_file.endswith('.wav')) and (time.time() - os.path.getctime(latest_file)) < 10:
+            # Wait for Chrome to finish writing a new audio file instead of a fixed sleep
+            deadline = clicked_at + 60
+            while time.time() < deadline:
+                files = [os.path.join(downloads_path, f) for f in os.listdir(downloads_path)]
+                finished = [f for f in files if f.endswith(('.mp3', '.wav')) and os.path.getctime(f) >= clicked_at - 1]
+                in_progress = [f for f in files if f.endswith('.crdownload')]
+                if finished and not in_progress:
+                    latest_file = max(finished, key=os.path.getctime)
                     logger.info(f"Song downloaded to {latest_file}")
-                    return {"success": True, "file_path": latest_file}
+                    entry = self.store.put(latest_file, metadata={"url": self.driver.current_url})
+                    return {"success": True, "file_path": entry["path"]}
+                time.sleep(0.5)
             
             return {"success": False, "error": "Downloaded file not found"}
             
@@ -687,6 +697,28 @@ class SunoAutomation:
             logger.error(f"Download failed: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    def _download_audio(self):
+        """Download the page's audio element into the song store, or return None"""
+        sources = [el.get_attribute("src") for el in self.driver.find_elements(By.TAG_NAME, "audio")]
+        sources = [src for src in sources if src and src.startswith("http")]
+        if not sources:
+            return None
+        audio_url = sources[0]
+        headers = {"User-Agent": self.driver.execute_script("return navigator.userAgent")}
+        cookies = self.driver.get_cookies()
+        if cookies:
+            headers["Cookie"] = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+        name = safe_filename(os.path.splitext(os.path.basename(audio_url.split("?")[0]))[0])
+        save_path = self.store.staging_path(name + ".mp3")
+        try:
+            result = self.downloader.download(audio_url, save_path, headers=headers)
+        except DownloadError as e:
+            logger.warning(f"Direct audio download failed ({str(e)}), falling back to the download button")
+            return None
+        logger.info(f"Song downloaded to {result['path']}")
+        entry = self.store.put(save_path, name=name, metadata={"url": self.driver.current_url}, sha256=result["sha256"])
+        return entry["path"]
+    
     def close(self):
         """Close the browser and clean up"""
         logger.info("Closing browser")
@@ -0,0 +1,180 @@
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Stages whose failures point at Suno itself (outage, UI change, exhausted
+# account) rather than at the local machine or the download
+SUNO_STAGES = ["login", "fill", "submit", "await", "harvest"]
+
+
+class CircuitOpenError(Exception):
+    """Raised when a job is rejected because the account's breaker is open"""
+
+    def __init__(self, account, retry_after=None):
+        if account:
+            message = f"Circuit breaker open for account '{account}'"
+        else:
+            message = "Circuit breakers open for all accounts"
+        if retry_after:
+            message += f", retry in {retry_after:.0f}s"
+        super().__init__(message)
+        self.account = account
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding window of job outcomes"""
+
+    def __init__(self, name, failure_rate=0.5, min_calls=4, window=20, open_seconds=120, half_open_probes=1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.opened_at = None
+        self.last_failure = None
+        self.times_opened = 0
+        self._outcomes = deque(maxlen=window)
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.time()
+            self.times_opened += 1
+            self._probes = 0
+        elif state == CLOSED:
+            self.opened_at = None
+            self._outcomes.clear()
+            self._probes = 0
+
+    def retry_after(self):
+        """Seconds until an open breaker lets a probe through"""
+        if self.state != OPEN:
+            return 0
+        return max(0, self.opened_at + self.open_seconds - time.time())
+
+    def allow(self):
+        """Check whether a job may run now, reserving a probe slot if half-open"""
+        with self._lock:
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                logger.info(f"Circuit breaker '{self.name}': letting a probe job through")
+                return True
+            return False
+
+    def available(self):
+        """Like allow() but without reserving a probe slot"""
+        with self._lock:
+            if self.state == OPEN:
+                return self.retry_after() <= 0
+            if self.state == HALF_OPEN:
+                return self._probes < self.half_open_probes
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED)
+                return
+            self._outcomes.append(True)
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.last_failure = error
+            if self.state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            self._outcomes.append(False)
+            calls = len(self._outcomes)
+            failures = calls - sum(self._outcomes)
+            if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._transition(OPEN)
+
+    def release(self):
+        """Give back a probe slot for a job that ended without a verdict"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def status(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "state": self.state,
+                "failure_rate": round((calls - sum(self._outcomes)) / calls, 3) if calls else 0.0,
+                "calls": calls,
+                "retry_after": round(self.retry_after(), 1),
+                "times_opened": self.times_opened,
+                "last_failure": self.last_failure,
+            }
+
+
+class BreakerRegistry:
+    """One circuit breaker per Suno account"""
+
+    def __init__(self, mode="fail", **breaker_options):
+        self.mode = mode
+        self.breaker_options = breaker_options
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the registry from get_config values"""
+        return cls(
+            mode=config.get("BREAKER_MODE", "fail"),
+            failure_rate=config.get("BREAKER_FAILURE_RATE", 0.5),
+            min_calls=config.get("BREAKER_MIN_CALLS", 4),
+            window=config.get("BREAKER_WINDOW", 20),
+            open_seconds=config.get("BREAKER_OPEN_SECONDS", 120),
+        )
+
+    def get(self, account):
+        with self._lock:
+            if account not in self._breakers:
+                self._breakers[account] = CircuitBreaker(account, **self.breaker_options)
+            return self._breakers[account]
+
+    def any_available(self):
+        """True if some account can take a job, or no account has been seen yet"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return not breakers or any(breaker.available() for breaker in breakers)
+
+    def shortest_retry_after(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return min((breaker.retry_after() for breaker in breakers), default=0)
+
+    def record(self, account, job):
+        """Feed a finished job's outcome into the account's breaker"""
+        breaker = self.get(account)
+        if job.status == "succeeded" or (job.error_stage == "download" and "harvest" in job.checkpoints):
+            breaker.record_success()
+        elif job.status == "dead" and job.error_stage in SUNO_STAGES:
+            breaker.record_failure(job.error)
+        else:
+            # Cancelled jobs and local failures say nothing about Suno
+            breaker.release()
+
+    def status(self):
+        with self._lock:
+            return {account: breaker.status() for account, breaker in self._breakers.items()}
@@ -50,6 +50,10 @@ def get_default_driver_path():
     else:
         return os.path.join(driver_dir, "chromedriver")
 
+def get_default_state_dir():
+    """Get the default directory for persistent automation state"""
+    return os.path.join(os.path.expanduser("~"), ".suno_automation")
+
 def get_config():
     """Load configuration from .env file or environment variables"""
     # Load .env file if it exists
@@ -115,8 +119,136 @@ def get_config():
         if value:
             config[var] = value
     
+    # Site to automate; point it at the local mock (python mock_suno.py) for offline runs
+    config["SUNO_BASE_URL"] = os.environ.get("SUNO_BASE_URL", "https://suno.com")
+
+    # Settings of the local mock site
+    config["MOCK_RENDER_SECONDS"] = float(os.environ.get("MOCK_RENDER_SECONDS", "20"))
+    config["MOCK_LATENCY_MS"] = int(os.environ.get("MOCK_LATENCY_MS", "0"))
+    config["MOCK_ERROR_RATE"] = float(os.environ.get("MOCK_ERROR_RATE", "0"))
+    config["MOCK_CAPTCHA_RATE"] = float(os.environ.get("MOCK_CAPTCHA_RATE", "0"))
+    config["MOCK_CREDITS"] = int(os.environ.get("MOCK_CREDITS", "500"))
+    
     # Use debug mode by default in development
     debug_mode = os.environ.get("DEBUG", "True").lower() == "true"
     config["DEBUG"] = debug_mode
-    
+
+    # Directory for persistent automation state (dead-letter queue, etc.)
+    state_dir = os.environ.get("STATE_DIR", get_default_state_dir())
+    config["STATE_DIR"] = state_dir
+
+    # Job retry settings
+    config["JOB_MAX_ATTEMPTS"] = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+    config["JOB_BACKOFF_BASE"] = float(os.environ.get("JOB_BACKOFF_BASE", "2.0"))
+    config["JOB_BACKOFF_MAX"] = float(os.environ.get("JOB_BACKOFF_MAX", "60.0"))
+    config["DEAD_LETTER_PATH"] = os.environ.get("DEAD_LETTER_PATH", os.path.join(state_dir, "dead_letter.json"))
+
+    # Overall time budget for a job in seconds (0 disables the deadline)
+    config["JOB_DEADLINE"] = float(os.environ.get("JOB_DEADLINE", "900"))
+
+    # Circuit breaker on Suno-side failures, per account.
+    # BREAKER_MODE is "fail" (reject jobs while open) or "hold" (keep them queued)
+    config["BREAKER_MODE"] = os.environ.get("BREAKER_MODE", "fail").lower()
+    config["BREAKER_FAILURE_RATE"] = float(os.environ.get("BREAKER_FAILURE_RATE", "0.5"))
+    config["BREAKER_MIN_CALLS"] = int(os.environ.get("BREAKER_MIN_CALLS", "4"))
+    config["BREAKER_WINDOW"] = int(os.environ.get("BREAKER_WINDOW", "20"))
+    config["BREAKER_OPEN_SECONDS"] = float(os.environ.get("BREAKER_OPEN_SECONDS", "120"))
+
+    # Credit-aware admission. CREDITS_MODE is "reject" (refuse jobs that cannot
+    # be paid for) or "hold" (keep them queued until credits are known again)
+    config["CREDITS_PER_JOB"] = int(os.environ.get("CREDITS_PER_JOB", "10"))
+    config["CREDITS_MAX_AGE"] = float(os.environ.get("CREDITS_MAX_AGE", "600"))
+    config["CREDITS_MODE"] = os.environ.get("CREDITS_MODE", "reject").lower()
+
+    # Per-job Chrome traces. TRACE_SAMPLE_RATE is the fraction of jobs traced
+    config["TRACE_SAMPLE_RATE"] = float(os.environ.get("TRACE_SAMPLE_RATE", "0.1"))
+    config["TRACE_DIR"] = os.environ.get("TRACE_DIR", os.path.join(state_dir, "traces"))
+    config["TRACE_MAX_FILES"] = int(os.environ.get("TRACE_MAX_FILES", "200"))
+
+    # Stage durations of past jobs, used for ETA estimates
+    config["PHASE_HISTORY_PATH"] = os.environ.get("PHASE_HISTORY_PATH", os.path.join(state_dir, "phase_history.csv"))
+
+    # SQLite library of every generated song, with full-text search
+    config["LIBRARY_PATH"] = os.environ.get("LIBRARY_PATH", os.path.join(state_dir, "library.db"))
+
+    # DOWNLOAD_MODE "eager" downloads every song when it is generated; "lazy" only
+    # keeps its audio URL and fetches the file when first played, while a
+    # background prefetch (capped at PREFETCH_BANDWIDTH_KBPS) warms songs created
+    # in the last PREFETCH_RECENT_HOURS or played PREFETCH_MIN_PLAYS times
+    config["DOWNLOAD_MODE"] = os.environ.get("DOWNLOAD_MODE", "eager").lower()
+    config["PREFETCH_BANDWIDTH_KBPS"] = int(os.environ.get("PREFETCH_BANDWIDTH_KBPS", "512"))
+    config["PREFETCH_INTERVAL"] = float(os.environ.get("PREFETCH_INTERVAL", "60"))
+    config["PREFETCH_RECENT_HOURS"] = float(os.environ.get("PREFETCH_RECENT_HOURS", "24"))
+    config["PREFETCH_MIN_PLAYS"] = int(os.environ.get("PREFETCH_MIN_PLAYS", "2"))
+    config["PREFETCH_BATCH"] = int(os.environ.get("PREFETCH_BATCH", "5"))
+
+    # Import of the songs already in the Suno account (POST /library/sync). The feed
+    # is paged newest first; SYNC_STATE_PATH remembers the newest song synced so
+    # later runs stop as soon as they reach it
+    base_url = config["SUNO_BASE_URL"].rstrip("/")
+    default_feed = "https://studio-api.suno.ai/api/feed/v2" if base_url.endswith("suno.com") else f"{base_url}/api/feed"
+    config["SUNO_FEED_URL"] = os.environ.get("SUNO_FEED_URL", default_feed)
+    config["SYNC_STATE_PATH"] = os.environ.get("SYNC_STATE_PATH", os.path.join(state_dir, "library_sync.json"))
+    config["SYNC_CONCURRENCY"] = int(os.environ.get("SYNC_CONCURRENCY", "4"))
+
+    # Work done on each downloaded song in a process pool, off the browser workers.
+    # POSTPROCESS_STAGES is a comma-separated list of registered stages or
+    # module:function paths; empty disables the pipeline. "hash" is off by
+    # default since the downloader already computed the digest
+    stages = os.environ.get("POSTPROCESS_STAGES", "frame_index")
+    config["POSTPROCESS_STAGES"] = [stage.strip() for stage in stages.split(",") if stage.strip()]
+    config["POSTPROCESS_WORKERS"] = int(os.environ.get("POSTPROCESS_WORKERS", "2"))
+    config["POSTPROCESS_MAX_PENDING"] = int(os.environ.get("POSTPROCESS_MAX_PENDING", "8"))
+    config["POSTPROCESS_RETRIES"] = int(os.environ.get("POSTPROCESS_RETRIES", "2"))
+
+    # Adaptive wait timeouts: TIMEOUT_PERCENTILE of recent latencies times
+    # TIMEOUT_SAFETY_FACTOR, between TIMEOUT_MIN_MS and TIMEOUT_MAX_FACTOR x the default
+    config["ADAPTIVE_TIMEOUTS"] = os.environ.get("ADAPTIVE_TIMEOUTS", "True").lower() == "true"
+    config["TIMEOUT_PERCENTILE"] = float(os.environ.get("TIMEOUT_PERCENTILE", "0.95"))
+    config["TIMEOUT_SAFETY_FACTOR"] = float(os.environ.get("TIMEOUT_SAFETY_FACTOR", "1.5"))
+    config["TIMEOUT_MIN_MS"] = int(os.environ.get("TIMEOUT_MIN_MS", "1000"))
+    config["TIMEOUT_MAX_FACTOR"] = float(os.environ.get("TIMEOUT_MAX_FACTOR", "3.0"))
+    config["TIMEOUT_MIN_SAMPLES"] = int(os.environ.get("TIMEOUT_MIN_SAMPLES", "20"))
+    config["TIMEOUT_WINDOW"] = int(os.environ.get("TIMEOUT_WINDOW", "200"))
+
+    # Songs are stored by content hash under DOWNLOAD_PATH (default ~/Downloads/suno);
+    # STORAGE_LINKS adds hard links with readable names in its songs/ folder
+    config["STORAGE_LINKS"] = os.environ.get("STORAGE_LINKS", "True").lower() == "true"
+
+    # Disk housekeeping, every HOUSEKEEPING_INTERVAL seconds: size quotas (MB) and
+    # age limits per category, 0 = no limit. Least recently used files go first;
+    # pinned songs (PUT /songs/{id}/pin) and files in use are never deleted.
+    # Evicted songs stay in the library and are fetched again when played
+    config["HOUSEKEEPING_INTERVAL"] = float(os.environ.get("HOUSEKEEPING_INTERVAL", "600"))
+    config["DEBUG_DIR"] = os.environ.get("DEBUG_DIR", os.path.join(state_dir, "debug"))
+    config["AUDIO_QUOTA_MB"] = int(os.environ.get("AUDIO_QUOTA_MB", "0"))
+    config["AUDIO_MAX_AGE_DAYS"] = float(os.environ.get("AUDIO_MAX_AGE_DAYS", "0"))
+    config["CAPTURES_QUOTA_MB"] = int(os.environ.get("CAPTURES_QUOTA_MB", "200"))
+    config["CAPTURES_MAX_AGE_DAYS"] = float(os.environ.get("CAPTURES_MAX_AGE_DAYS", "7"))
+    config["TEMP_QUOTA_MB"] = int(os.environ.get("TEMP_QUOTA_MB", "0"))
+    config["TEMP_MAX_AGE_HOURS"] = float(os.environ.get("TEMP_MAX_AGE_HOURS", "24"))
+    config["LOGS_QUOTA_MB"] = int(os.environ.get("LOGS_QUOTA_MB", "100"))
+    config["LOGS_MAX_AGE_DAYS"] = float(os.environ.get("LOGS_MAX_AGE_DAYS", "30"))
+
+    # Direct audio downloads: connections and bandwidth (KB/s, 0 = unlimited)
+    # shared by all downloads, and connections and segment size per file
+    config["DOWNLOAD_MAX_CONNECTIONS"] = int(os.environ.get("DOWNLOAD_MAX_CONNECTIONS", "8"))
+    config["DOWNLOAD_BANDWIDTH_KBPS"] = int(os.environ.get("DOWNLOAD_BANDWIDTH_KBPS", "0"))
+    config["DOWNLOAD_CONNECTIONS_PER_FILE"] = int(os.environ.get("DOWNLOAD_CONNECTIONS_PER_FILE", "4"))
+    config["DOWNLOAD_SEGMENT_SIZE"] = int(os.environ.get("DOWNLOAD_SEGMENT_SIZE", str(1024 * 1024)))
+    config["DOWNLOAD_TIMEOUT"] = float(os.environ.get("DOWNLOAD_TIMEOUT", "30"))
+    config["DOWNLOAD_RETRIES"] = int(os.environ.get("DOWNLOAD_RETRIES", "3"))
+
+    # HAR recording (HAR_MODE=record) or offline replay (HAR_MODE=replay) of the
+    # browser session. HAR_TIME_SCALE replays with recorded timing, e.g. 0.1 = 10x faster
+    config["HAR_MODE"] = os.environ.get("HAR_MODE", "").lower() or None
+    config["HAR_PATH"] = os.environ.get("HAR_PATH", os.path.join(state_dir, "session.har.zip"))
+    har_time_scale = os.environ.get("HAR_TIME_SCALE")
+    config["HAR_TIME_SCALE"] = float(har_time_scale) if har_time_scale else None
+
+    # /debug/profile and /debug/heap are only served when DEBUG_TOKEN is set
+    config["DEBUG_TOKEN"] = os.environ.get("DEBUG_TOKEN")
+    config["DEBUG_TRACEMALLOC"] = os.environ.get("DEBUG_TRACEMALLOC", "False").lower() == "true"
+    config["DEBUG_TRACEMALLOC_FRAMES"] = int(os.environ.get("DEBUG_TRACEMALLOC_FRAMES", "1"))
+
     return config
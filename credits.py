@@ -0,0 +1,140 @@
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Only responses from these endpoints are parsed for credit information
+CREDIT_URL_MARKERS = ["/billing/info", "/billing/", "/credits", "/api/generate"]
+
+# Keys Suno uses for the remaining balance, most specific first
+CREDIT_KEYS = ["total_credits_left", "credits_left", "credits"]
+
+
+class InsufficientCreditsError(Exception):
+    """Raised when a request costs more credits than the accounts have left"""
+
+    def __init__(self, needed, available):
+        super().__init__(f"Not enough credits: {needed} needed, {available} available")
+        self.needed = needed
+        self.available = available
+
+
+def extract_credits(data):
+    """Find the remaining credit balance in a Suno API response body"""
+    if not isinstance(data, dict):
+        return None
+    for key in CREDIT_KEYS:
+        value = data.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return int(value)
+    # Some responses nest the balance one level down
+    for value in data.values():
+        if isinstance(value, dict):
+            for key in CREDIT_KEYS:
+                nested = value.get(key)
+                if isinstance(nested, (int, float)) and not isinstance(nested, bool):
+                    return int(nested)
+    return None
+
+
+class CreditTracker:
+    """Cached per-account credit balances learned from Suno's network traffic.
+
+    Balances are decremented locally for every submission so admission
+    decisions stay accurate between refreshes. A balance older than max_age
+    is treated as unknown, which lets the next job through to refresh it.
+    """
+
+    def __init__(self, cost_per_job=10, max_age=600, mode="reject"):
+        self.cost_per_job = cost_per_job
+        self.max_age = max_age
+        self.mode = mode
+        self._balances = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a tracker from get_config values"""
+        return cls(
+            cost_per_job=config.get("CREDITS_PER_JOB", 10),
+            max_age=config.get("CREDITS_MAX_AGE", 600),
+            mode=config.get("CREDITS_MODE", "reject"),
+        )
+
+    def watch(self, context, account):
+        """Read credit balances from the responses seen by a browser context"""
+        context.on("response", lambda response: self._on_response(account, response))
+
+    def _on_response(self, account, response):
+        if not any(marker in response.url for marker in CREDIT_URL_MARKERS):
+            return
+        try:
+            credits = extract_credits(response.json())
+        except Exception:
+            return
+        if credits is not None:
+            self.update(account, credits, source=response.url)
+
+    def update(self, account, credits, source=None):
+        """Record an authoritative balance for an account"""
+        with self._lock:
+            self._balances[account] = {"credits": int(credits), "updated_at": time.time()}
+        logger.info(f"Credits for account '{account}': {credits}" + (f" (from {source})" if source else ""))
+
+    def remaining(self, account):
+        """Known remaining credits, or None when unknown or stale"""
+        with self._lock:
+            balance = self._balances.get(account)
+            if not balance or time.time() - balance["updated_at"] > self.max_age:
+                return None
+            return balance["credits"]
+
+    def can_afford(self, account, cost=None):
+        """True unless the account is known to have less than the cost"""
+        remaining = self.remaining(account)
+        return remaining is None or remaining >= (cost or self.cost_per_job)
+
+    def consume(self, account, cost=None, unless_updated_since=None):
+        """Decrement the cached balance after a submission.
+
+        Skipped when an authoritative balance arrived after
+        unless_updated_since, since that one already counts the submission.
+        """
+        cost = cost or self.cost_per_job
+        with self._lock:
+            balance = self._balances.get(account)
+            if balance and unless_updated_since and balance["updated_at"] >= unless_updated_since:
+                logger.info(f"Credits for account '{account}' already refreshed after the submission")
+                return
+            if balance:
+                balance["credits"] = max(0, balance["credits"] - cost)
+                logger.info(f"Credits for account '{account}' after submission: {balance['credits']}")
+
+    def check_projected(self, job_count):
+        """Raise InsufficientCreditsError if job_count more jobs cannot be paid for.
+
+        The check only applies when every known account has a fresh balance;
+        with no information at all the batch is admitted.
+        """
+        with self._lock:
+            accounts = list(self._balances)
+        if not accounts:
+            return
+        balances = [self.remaining(account) for account in accounts]
+        if any(balance is None for balance in balances):
+            return
+        needed = job_count * self.cost_per_job
+        available = sum(balances)
+        if needed > available:
+            raise InsufficientCreditsError(needed, available)
+
+    def status(self):
+        with self._lock:
+            accounts = list(self._balances)
+        return {
+            "cost_per_job": self.cost_per_job,
+            "mode": self.mode,
+            "accounts": {account: self.remaining(account) for account in accounts},
+        }
@@ -0,0 +1,294 @@
+
+import hashlib
+import http.client
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+
+
+class DownloadError(Exception):
+    """Raised when a file could not be fetched"""
+
+
+class IntegrityError(DownloadError):
+    """Raised when a finished download has the wrong size or checksum"""
+
+
+class BandwidthLimiter:
+    """Token bucket shared by every download; 0 bytes per second means unlimited"""
+
+    def __init__(self, bytes_per_second=0):
+        self.rate = bytes_per_second
+        self._tokens = bytes_per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        """Block until size bytes fit in the budget"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Go into debt and sleep it off, so concurrent readers share the rate
+            self._tokens -= size
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+    def lift(self):
+        """Stop limiting from now on"""
+        with self._lock:
+            self.rate = 0
+
+
+class Downloader:
+    """Parallel HTTP Range downloads that resume after an interruption.
+
+    A file is split into segments fetched over up to connections_per_download
+    connections, all drawn from one pool of max_connections shared by every
+    download, and from one bandwidth budget. Data goes to <path>.part; the
+    finished segments are listed in <path>.part.json, so a later call for
+    the same URL only fetches what is missing. The finished file is checked
+    against the server's size and an optional SHA-256, then renamed into
+    place.
+    """
+
+    def __init__(self, max_connections=8, connections_per_download=4, segment_size=1024 * 1024,
+                 bandwidth=0, timeout=30, retries=3):
+        self.max_connections = max_connections
+        self.connections_per_download = connections_per_download
+        self.segment_size = segment_size
+        self.timeout = timeout
+        self.retries = retries
+        self.limiter = BandwidthLimiter(bandwidth)
+        self._connections = threading.BoundedSemaphore(max_connections)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a downloader from get_config values"""
+        return cls(
+            max_connections=config.get("DOWNLOAD_MAX_CONNECTIONS", 8),
+            connections_per_download=config.get("DOWNLOAD_CONNECTIONS_PER_FILE", 4),
+            segment_size=config.get("DOWNLOAD_SEGMENT_SIZE", 1024 * 1024),
+            bandwidth=config.get("DOWNLOAD_BANDWIDTH_KBPS", 0) * 1024,
+            timeout=config.get("DOWNLOAD_TIMEOUT", 30),
+            retries=config.get("DOWNLOAD_RETRIES", 3),
+        )
+
+    def _open(self, url, headers, byte_range=None):
+        request = urllib.request.Request(url, headers=dict(headers or {}))
+        if byte_range:
+            request.add_header("Range", f"bytes={byte_range[0]}-{byte_range[1]}")
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            raise DownloadError(f"HTTP {e.code} for {url}")
+        except (urllib.error.URLError, OSError) as e:
+            raise DownloadError(f"Connection error for {url}: {str(e)}")
+
+    def _probe(self, url, headers):
+        """Size, range support and validator of the remote file"""
+        for attempt in range(1, self.retries + 1):
+            try:
+                with self._connections:
+                    response = self._open(url, headers, (0, 0))
+                    with response:
+                        content_range = response.headers.get("Content-Range", "")
+                        match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+                        length = response.headers.get("Content-Length")
+                        return {
+                            "size": int(match.group(1)) if match else (int(length) if length else None),
+                            "ranges": response.status == 206 and match is not None,
+                            "etag": response.headers.get("ETag") or response.headers.get("Last-Modified"),
+                        }
+            except (DownloadError, OSError, http.client.HTTPException) as e:
+                error = self._transfer_error(url, e)
+                if attempt == self.retries:
+                    if error is e:
+                        raise
+                    raise error from e
+                logger.warning(f"Probe of {url} failed ({str(error)}), retry {attempt}/{self.retries - 1}")
+                time.sleep(min(10, 0.5 * 2 ** attempt))
+
+    def download(self, url, path, headers=None, expected_size=None, sha256=None, job=None, limiter=None):
+        """Fetch url to path and return size, digest and timing.
+
+        limiter replaces the shared bandwidth budget for this download.
+        Raises DownloadError when the server cannot be reached after the
+        retries and IntegrityError when the result does not verify.
+        """
+        limiter = limiter or self.limiter
+        started = time.monotonic()
+        part_path = f"{path}.part"
+        state_path = f"{part_path}.json"
+        info = self._probe(url, headers)
+        if expected_size and info["size"] and info["size"] != expected_size:
+            raise IntegrityError(f"Server reports {info['size']} bytes, expected {expected_size}")
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        resumed = 0
+        if info["ranges"] and info["size"]:
+            done = self._resume_state(state_path, part_path, url, info)
+            resumed = sum(end - start + 1 for start, end in done)
+            if resumed:
+                logger.info(f"Resuming {os.path.basename(path)}: {resumed}/{info['size']} bytes already on disk")
+            self._fetch_segments(url, headers, part_path, state_path, info, done, job, limiter)
+        else:
+            # No range support: a plain stream, which restarts from scratch
+            self._fetch_stream(url, headers, part_path, job, limiter)
+
+        try:
+            size, digest = self._verify(part_path, info["size"] or expected_size, expected_size, sha256)
+        except IntegrityError:
+            # A corrupt partial file would only fail again on resume
+            self._discard(part_path, state_path)
+            raise
+        os.replace(part_path, path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Downloaded {os.path.basename(path)}: {size} bytes in {elapsed:.1f}s")
+        return {"path": path, "size": size, "sha256": digest, "resumed_bytes": resumed, "seconds": round(elapsed, 3)}
+
+    def _resume_state(self, state_path, part_path, url, info):
+        """Segments already on disk for this exact remote file"""
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if (state.get("url") == url and state.get("size") == info["size"]
+                    and state.get("etag") == info["etag"] and os.path.getsize(part_path) == info["size"]):
+                return {tuple(segment) for segment in state.get("done", [])}
+        except (OSError, ValueError):
+            pass
+        self._discard(part_path, state_path)
+        with open(part_path, "wb") as f:
+            f.truncate(info["size"])
+        return set()
+
+    def _save_state(self, state_path, url, info, done):
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "size": info["size"], "etag": info["etag"], "done": sorted(done)}, f)
+        os.replace(tmp_path, state_path)
+
+    def _fetch_segments(self, url, headers, part_path, state_path, info, done, job, limiter):
+        size = info["size"]
+        segments = [(start, min(start + self.segment_size, size) - 1) for start in range(0, size, self.segment_size)]
+        missing = [segment for segment in segments if segment not in done]
+        if not missing:
+            return
+        abort = threading.Event()
+        workers = max(1, min(self.connections_per_download, len(missing)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._fetch_segment, url, headers, part_path, segment, abort, job, limiter)
+                       for segment in missing]
+            failure = None
+            for future in as_completed(futures):
+                try:
+                    done.add(future.result())
+                except BaseException as e:
+                    # Stop the queued segments, but keep those in flight for the next attempt
+                    if failure is None:
+                        failure = e
+                        abort.set()
+                    continue
+                self._save_state(state_path, url, info, done)
+        if failure:
+            raise failure
+
+    def _fetch_segment(self, url, headers, part_path, segment, abort, job, limiter):
+        start, end = segment
+        for attempt in range(1, self.retries + 1):
+            if abort.is_set():
+                raise DownloadError("Download aborted")
+            if job:
+                job.check()
+            try:
+                with self._connections:
+                    response = self._open(url, headers, segment)
+                    with response, open(part_path, "r+b") as f:
+                        if response.status != 206 or not response.headers.get("Content-Range", "").startswith(f"bytes {start}-"):
+                            raise DownloadError(f"Server ignored the range {start}-{end}")
+                        f.seek(start)
+                        received = 0
+                        while received < end - start + 1:
+                            block = response.read(min(BLOCK_SIZE, end - start + 1 - received))
+                            if not block:
+                                raise DownloadError(f"Connection closed after {received} bytes of {start}-{end}")
+                            limiter.consume(len(block))
+                            f.write(block)
+                            received += len(block)
+                return segment
+            except (DownloadError, OSError, http.client.HTTPException) as e:
+                error = self._transfer_error(url, e)
+                if attempt == self.retries or abort.is_set():
+                    if error is e:
+                        raise
+                    raise error from e
+                logger.warning(f"Segment {start}-{end} failed ({str(error)}), retry {attempt}/{self.retries - 1}")
+                time.sleep(min(10, 0.5 * 2 ** attempt))
+
+    def _fetch_stream(self, url, headers, part_path, job, limiter):
+        for attempt in range(1, self.retries + 1):
+            try:
+                with self._connections:
+                    response = self._open(url, headers)
+                    with response, open(part_path, "wb") as f:
+                        while True:
+                            if job:
+                                job.check()
+                            block = response.read(BLOCK_SIZE)
+                            if not block:
+                                return
+                            limiter.consume(len(block))
+                            f.write(block)
+            except (DownloadError, OSError, http.client.HTTPException) as e:
+                error = self._transfer_error(url, e)
+                if attempt == self.retries:
+                    if error is e:
+                        raise
+                    raise error from e
+                logger.warning(f"Download of {url} failed ({str(error)}), retry {attempt}/{self.retries - 1}")
+                time.sleep(min(10, 0.5 * 2 ** attempt))
+
+    @staticmethod
+    def _transfer_error(url, error):
+        """A failure while reading a response as a DownloadError"""
+        if isinstance(error, DownloadError):
+            return error
+        # A stalled transfer times out in read(), a cut one ends in IncompleteRead
+        return DownloadError(f"Transfer of {url} failed: {str(error) or type(error).__name__}")
+
+    @staticmethod
+    def _verify(part_path, size, expected_size, sha256):
+        """Size and digest of a finished download; the digest is where the store files it"""
+        actual = os.path.getsize(part_path)
+        for wanted in (size, expected_size):
+            if wanted and actual != wanted:
+                raise IntegrityError(f"Downloaded {actual} bytes, expected {wanted}")
+        digest = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        if sha256 and digest.hexdigest() != sha256.lower():
+            raise IntegrityError(f"SHA-256 mismatch: got {digest.hexdigest()}, expected {sha256}")
+        return actual, digest.hexdigest()
+
+    @staticmethod
+    def _discard(*paths):
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
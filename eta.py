@@ -0,0 +1,187 @@
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Used until enough history has been recorded (seconds per stage)
+DEFAULT_STAGE_SECONDS = {
+    "login": 5,
+    "fill": 25,
+    "submit": 2,
+    "await": 150,
+    "harvest": 2,
+    "download": 20,
+}
+
+# Render times drift over the day, so recent samples from nearby hours are
+# preferred once there are enough of them
+HOUR_WINDOW = 2
+MIN_SAMPLES = 5
+
+
+def job_tag(params):
+    """Coarse prompt type used to group durations"""
+    return "instrumental" if params.get("instrumental") else "vocals"
+
+
+def quantile(values, q):
+    """Nearest-rank quantile of a non-empty list"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class PhaseHistory:
+    """Stage durations of finished jobs, kept in a compact CSV time series.
+
+    One line per stage: unix time, prompt tag, stage, seconds. The file is
+    appended to as jobs finish and rewritten with only the newest lines
+    once it grows past twice max_records.
+    """
+
+    def __init__(self, path=None, max_records=20000):
+        self.path = path
+        self.max_records = max_records
+        self._records = deque(maxlen=max_records)
+        self._lines_on_disk = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.strip().split(",")
+                    if len(parts) != 4:
+                        continue
+                    self._records.append((float(parts[0]), parts[1], parts[2], float(parts[3])))
+                    self._lines_on_disk += 1
+            logger.info(f"Loaded {len(self._records)} phase durations from {self.path}")
+        except Exception as e:
+            logger.error(f"Could not load phase history from {self.path}: {str(e)}")
+
+    def record(self, job):
+        """Store the stage durations of a successfully finished job"""
+        if not job.stage_durations:
+            return
+        now = time.time()
+        tag = job_tag(job.params)
+        rows = [(now, tag, stage, round(seconds, 2)) for stage, seconds in job.stage_durations.items()]
+        with self._lock:
+            self._records.extend(rows)
+            self._append(rows)
+
+    def _append(self, rows):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            if self._lines_on_disk + len(rows) > 2 * self.max_records:
+                # Compact: keep only what is held in memory
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.writelines(self._format(row) for row in self._records)
+                os.replace(tmp_path, self.path)
+                self._lines_on_disk = len(self._records)
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(self._format(row) for row in rows)
+                self._lines_on_disk += len(rows)
+        except Exception as e:
+            logger.error(f"Could not save phase history to {self.path}: {str(e)}")
+
+    @staticmethod
+    def _format(row):
+        return f"{row[0]:.0f},{row[1]},{row[2]},{row[3]}\n"
+
+    def samples(self, stage, tag=None, hour=None, limit=200):
+        """Recent durations of a stage, preferring the same tag and time of day"""
+        with self._lock:
+            records = [r for r in self._records if r[2] == stage]
+        if tag:
+            tagged = [r for r in records if r[1] == tag]
+            if len(tagged) >= MIN_SAMPLES:
+                records = tagged
+        if hour is not None:
+            nearby = [r for r in records if _hour_distance(datetime.fromtimestamp(r[0]).hour, hour) <= HOUR_WINDOW]
+            if len(nearby) >= MIN_SAMPLES:
+                records = nearby
+        return [r[3] for r in records[-limit:]]
+
+
+def _hour_distance(a, b):
+    distance = abs(a - b) % 24
+    return min(distance, 24 - distance)
+
+
+class EtaEstimator:
+    """Predict when a job will finish from recent stage-duration quantiles"""
+
+    def __init__(self, history):
+        self.history = history
+
+    def stage_quantiles(self, stage, tag=None, hour=None):
+        """Median and 90th percentile duration of a stage, in seconds"""
+        samples = self.history.samples(stage, tag, hour)
+        if len(samples) < MIN_SAMPLES:
+            default = DEFAULT_STAGE_SECONDS.get(stage, 10)
+            return default, default * 1.5
+        return quantile(samples, 0.5), quantile(samples, 0.9)
+
+    def job_quantiles(self, job, hour=None):
+        """Median and 90th percentile of a whole job's run time"""
+        tag = job_tag(job.params)
+        p50 = p90 = 0
+        for stage in job.stages:
+            stage_p50, stage_p90 = self.stage_quantiles(stage, tag, hour)
+            p50 += stage_p50
+            p90 += stage_p90
+        return p50, p90
+
+    def estimate(self, job, queue_position=0, workers=1):
+        """ETA of a job, accounting for the jobs queued ahead of it"""
+        now = time.time()
+        hour = datetime.now().hour
+        tag = job_tag(job.params)
+
+        if job.done.is_set() or job.status in ("succeeded", "dead", "failed", "cancelled"):
+            return {"eta_seconds": 0, "eta_p90_seconds": 0, "progress": 1.0, "queue_position": 0}
+
+        # Work left on this job
+        remaining_p50 = remaining_p90 = 0
+        for stage in job.stages:
+            if job.is_done(stage):
+                continue
+            p50, p90 = self.stage_quantiles(stage, tag, hour)
+            if stage == job.current_stage and job.stage_started_at:
+                elapsed = now - job.stage_started_at
+                # A stage running past its median is assumed nearly done, not negative
+                p50 = max(p50 - elapsed, p50 * 0.1)
+                p90 = max(p90 - elapsed, p90 * 0.1)
+            remaining_p50 += p50
+            remaining_p90 += p90
+
+        # Jobs ahead of it in the queue, shared across the workers
+        wait_p50 = wait_p90 = 0
+        if queue_position:
+            job_p50, job_p90 = self.job_quantiles(job, hour)
+            rounds = queue_position / max(1, workers)
+            wait_p50 = rounds * job_p50
+            wait_p90 = rounds * job_p90
+
+        elapsed = now - job.started_at if job.started_at else 0
+        total = elapsed + remaining_p50
+        return {
+            "eta_seconds": round(wait_p50 + remaining_p50, 1),
+            "eta_p90_seconds": round(wait_p90 + remaining_p90, 1),
+            "progress": round(elapsed / total, 3) if total and job.started_at else 0.0,
+            "queue_position": queue_position,
+            "stage": job.current_stage,
+        }
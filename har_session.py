@@ -0,0 +1,144 @@
+
+import base64
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MODES = ["record", "replay"]
+
+
+def _parse_time(value):
+    """Seconds since the epoch of a HAR startedDateTime"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class HarSession:
+    """Record a browser session to a HAR file or replay one offline.
+
+    Recording hands Playwright's record_har options to the new context; the
+    file is written when the context closes. Replay serves the file through
+    context.route_from_har, so nothing reaches the network. With a time_scale
+    the recorded timing is reproduced as well: responses are delayed by their
+    recorded duration and polled URLs (the song feed) return the response
+    that was current at the same point of the recording, so a 0.1 scale runs
+    the session ten times faster with the same shape.
+    """
+
+    def __init__(self, mode, path, time_scale=None, content="embed"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown HAR mode '{mode}', expected one of {MODES}")
+        self.mode = mode
+        self.path = path
+        self.time_scale = time_scale
+        self.content = content
+        self._entries = {}
+        self._recording_start = None
+        self._replay_start = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a HAR session from get_config values, or None when disabled"""
+        mode = config.get("HAR_MODE")
+        if not mode:
+            return None
+        return cls(mode, config.get("HAR_PATH"), time_scale=config.get("HAR_TIME_SCALE"))
+
+    def context_options(self):
+        """Extra new_context options; only recording needs any"""
+        if self.mode != "record":
+            return {}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        options = {"record_har_path": self.path, "record_har_mode": "full"}
+        # A .zip keeps audio as separate attachments instead of base64 in the JSON
+        if not self.path.endswith(".zip"):
+            options["record_har_content"] = self.content
+        logger.info(f"Recording browser session to {self.path}")
+        return options
+
+    def install(self, context):
+        """Route the context's requests from the HAR file when replaying"""
+        if self.mode != "replay":
+            return
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"HAR file not found: {self.path}")
+        context.route_from_har(self.path, not_found="abort")
+        if self.time_scale:
+            # Registered last, so it runs first and falls back to route_from_har
+            self._load()
+            context.route("**/*", self._timed_route)
+        logger.info(f"Replaying browser session from {self.path}"
+                    f"{f' at {self.time_scale}x recorded time' if self.time_scale else ''}")
+
+    def _load(self):
+        """Index the recorded entries by method and URL, in recording order"""
+        if self.path.endswith(".zip"):
+            with zipfile.ZipFile(self.path) as archive:
+                name = next(n for n in archive.namelist() if n.endswith(".har"))
+                har = json.loads(archive.read(name))
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                har = json.load(f)
+        entries = har["log"]["entries"]
+        starts = [_parse_time(entry["startedDateTime"]) for entry in entries]
+        self._recording_start = min(starts) if starts else 0.0
+        self._entries = {}
+        for started, entry in sorted(zip(starts, entries), key=lambda pair: pair[0]):
+            key = (entry["request"]["method"], entry["request"]["url"])
+            self._entries.setdefault(key, []).append((started - self._recording_start, entry))
+        logger.info(f"Loaded {len(entries)} HAR entries for {len(self._entries)} distinct requests")
+
+    def _pick(self, method, url):
+        """Recorded entry that was current at this point of the replay"""
+        candidates = self._entries.get((method, url))
+        if not candidates:
+            return None
+        with self._lock:
+            if self._replay_start is None:
+                self._replay_start = time.monotonic()
+            elapsed = (time.monotonic() - self._replay_start) / self.time_scale
+        chosen = candidates[0][1]
+        for offset, entry in candidates:
+            if offset > elapsed:
+                break
+            chosen = entry
+        return chosen
+
+    def _body(self, content):
+        if "_file" in content:
+            if not self.path.endswith(".zip"):
+                with open(os.path.join(os.path.dirname(self.path), content["_file"]), "rb") as f:
+                    return f.read()
+            with zipfile.ZipFile(self.path) as archive:
+                return archive.read(content["_file"])
+        text = content.get("text", "")
+        if content.get("encoding") == "base64":
+            return base64.b64decode(text)
+        return text.encode("utf-8")
+
+    def _timed_route(self, route, request):
+        entry = self._pick(request.method, request.url)
+        if entry is None:
+            route.fallback()
+            return
+        delay_ms = max(0.0, entry.get("time", 0)) * self.time_scale
+        if delay_ms:
+            # wait_for_timeout yields to Playwright instead of blocking other requests
+            try:
+                request.frame.page.wait_for_timeout(delay_ms)
+            except Exception:
+                time.sleep(delay_ms / 1000)
+        response = entry["response"]
+        if response.get("status", 0) <= 0:
+            # Recorded as failed, fail it again
+            route.abort()
+            return
+        headers = {h["name"]: h["value"] for h in response.get("headers", [])
+                   if h["name"].lower() not in ("content-length", "content-encoding", "transfer-encoding")}
+        route.fulfill(status=response["status"], headers=headers, body=self._body(response.get("content", {})))
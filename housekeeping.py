@@ -0,0 +1,311 @@
+
+import logging
+import os
+import re
+import shutil
+import tempfile
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+import psutil
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "suno_automation.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+# Rotated files are kept until the logs quota or age limit removes them
+LOG_BACKUPS = 50
+
+# Browser temp dirs are named after the process that owns them, so the ones
+# left by a crashed process can be told apart from a live one's
+BROWSER_TEMP_PREFIX = "suno_browser_"
+BROWSER_TEMP_RE = re.compile(rf"^{BROWSER_TEMP_PREFIX}(\d+)_")
+
+# Staged files written to this recently are downloads still in progress
+ACTIVE_SECONDS = 300
+
+
+def log_file_handler(path=LOG_FILE):
+    """File handler for the application log that rolls over at LOG_MAX_BYTES"""
+    # Opened on the first record, so a handler basicConfig ignores holds no file open
+    return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8", delay=True)
+
+
+def configure_logging(stream=sys.stdout):
+    """Log to the rotating application log and to stream.
+
+    Call it from the entry point of the main process only: spawned workers
+    re-import that module, and several processes rolling over the same file
+    would rename it under each other. force replaces the bare basicConfig
+    that importing api_server runs.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[log_file_handler(), logging.StreamHandler(stream)],
+        force=True,
+    )
+
+
+def browser_temp_dir():
+    """A new temp dir for the browser's downloads, named after this process"""
+    return tempfile.mkdtemp(prefix=f"{BROWSER_TEMP_PREFIX}{os.getpid()}_")
+
+
+def _tree_size(path):
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                pass
+    return total
+
+
+def _files(root, skip=()):
+    """(path, stat) of every file under root, skipping the given suffixes"""
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(skip):
+                continue
+            path = os.path.join(folder, name)
+            try:
+                yield path, os.stat(path)
+            except OSError:
+                pass
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class Category:
+    """One kind of file on disk and the limits it must stay within.
+
+    scan() returns items as dicts with path, size, last_used (epoch seconds)
+    and pinned; remove(item) deletes one. max_bytes and max_age (seconds) of
+    0 mean no limit.
+    """
+
+    def __init__(self, name, scan, remove=None, max_bytes=0, max_age=0):
+        self.name = name
+        self.scan = scan
+        self.remove = remove or (lambda item: _remove(item["path"]))
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+
+class Housekeeper:
+    """Keeps the disk usage of audio, debug captures, temp files and logs in bounds.
+
+    Every `interval` seconds each category is scanned: items older than its
+    age limit go first, then the least recently used until it fits its size
+    quota. Pinned items (pinned songs, the live log, files in use) are never
+    evicted, so a category can stay over quota when everything left is
+    pinned. Temp dirs left by browsers of processes that no longer run are
+    removed at startup and on every pass.
+    """
+
+    def __init__(self, categories, interval=600, temp_dir=None):
+        self.categories = {category.name: category for category in categories}
+        self.interval = interval
+        self.temp_dir = temp_dir or tempfile.gettempdir()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    @classmethod
+    def from_config(cls, config, store=None, library=None):
+        """Build a housekeeper from get_config values"""
+        mb, day = 1024 * 1024, 86400
+        categories = []
+        if store:
+            categories.append(Category(
+                "audio", lambda: _audio_items(store, library), lambda item: _remove_audio(store, library, item),
+                max_bytes=config.get("AUDIO_QUOTA_MB", 0) * mb, max_age=config.get("AUDIO_MAX_AGE_DAYS", 0) * day,
+            ))
+        capture_dirs = [path for path in (config.get("DEBUG_DIR"), config.get("TRACE_DIR")) if path]
+        categories.append(Category(
+            "captures", lambda: [_file_item(path, st) for root in capture_dirs for path, st in _files(root)],
+            max_bytes=config.get("CAPTURES_QUOTA_MB", 200) * mb, max_age=config.get("CAPTURES_MAX_AGE_DAYS", 7) * day,
+        ))
+        staging_dir = store.staging_dir if store else None
+        categories.append(Category(
+            "temp", lambda: _temp_items(staging_dir),
+            max_bytes=config.get("TEMP_QUOTA_MB", 0) * mb, max_age=config.get("TEMP_MAX_AGE_HOURS", 24) * 3600,
+        ))
+        log_path = os.path.abspath(LOG_FILE)
+        categories.append(Category(
+            "logs", lambda: _log_items(log_path),
+            max_bytes=config.get("LOGS_QUOTA_MB", 100) * mb, max_age=config.get("LOGS_MAX_AGE_DAYS", 30) * day,
+        ))
+        return cls(categories, interval=config.get("HOUSEKEEPING_INTERVAL", 600))
+
+    def usage(self):
+        """Files, bytes and limits of every category"""
+        report = {}
+        for name, category in self.categories.items():
+            items = category.scan()
+            report[name] = {
+                "files": len(items),
+                "bytes": sum(item["size"] for item in items),
+                "pinned_bytes": sum(item["size"] for item in items if item["pinned"]),
+                "max_bytes": category.max_bytes,
+                "max_age": category.max_age,
+            }
+            metrics.set_disk_usage(name, report[name]["bytes"])
+        return report
+
+    def run(self):
+        """One pass over every category; returns what each holds and what was evicted"""
+        with self._lock:
+            report = {"orphans_removed": self.remove_orphans()}
+            for name, category in self.categories.items():
+                try:
+                    report[name] = self._enforce(category)
+                except Exception as e:
+                    logger.error(f"Housekeeping of {name} failed: {str(e)}")
+                    report[name] = {"error": str(e)}
+            self.last_run = time.time()
+            return report
+
+    def _enforce(self, category):
+        items = category.scan()
+        now = time.time()
+        total = sum(item["size"] for item in items)
+        evicted, freed = 0, 0
+        # Oldest use first: expired items, then the least recently used until under quota
+        for item in sorted(items, key=lambda item: item["last_used"]):
+            if item["pinned"]:
+                continue
+            expired = category.max_age and now - item["last_used"] > category.max_age
+            if not expired and not (category.max_bytes and total > category.max_bytes):
+                break
+            try:
+                category.remove(item)
+            except OSError as e:
+                logger.warning(f"Could not evict {item['path']}: {str(e)}")
+                continue
+            total -= item["size"]
+            evicted += 1
+            freed += item["size"]
+        if evicted:
+            logger.info(f"Housekeeping evicted {evicted} {category.name} files, {freed / 1024 / 1024:.1f} MB freed")
+            metrics.observe_eviction(category.name, evicted, freed)
+        if category.max_bytes and total > category.max_bytes:
+            logger.warning(f"{category.name} still uses {total / 1024 / 1024:.1f} MB of its "
+                           f"{category.max_bytes / 1024 / 1024:.0f} MB quota: the rest is pinned")
+        metrics.set_disk_usage(category.name, total)
+        return {"files": len(items) - evicted, "bytes": total, "evicted": evicted, "freed_bytes": freed}
+
+    def remove_orphans(self):
+        """Delete browser temp dirs whose process has exited; returns how many"""
+        removed = 0
+        try:
+            names = os.listdir(self.temp_dir)
+        except OSError:
+            return 0
+        for name in names:
+            match = BROWSER_TEMP_RE.match(name)
+            if not match or psutil.pid_exists(int(match.group(1))):
+                continue
+            path = os.path.join(self.temp_dir, name)
+            size = _tree_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+            logger.info(f"Removed orphaned browser temp dir {path} ({size / 1024 / 1024:.1f} MB)")
+        return removed
+
+    def start(self):
+        """Clean up after earlier runs now, then keep enforcing the quotas in the background"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="housekeeping", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run()
+            self._stop.wait(self.interval)
+
+
+def _file_item(path, st, pinned=False):
+    return {"path": path, "size": st.st_size, "last_used": st.st_mtime, "pinned": pinned}
+
+
+def _audio_items(store, library):
+    """Stored songs, last used when last played, with their frame index sidecars counted in"""
+    usage = library.file_usage() if library else {}
+    items = []
+    for path, st in _files(store.objects_dir, skip=(".idx", ".tmp")):
+        item = _file_item(path, st)
+        try:
+            item["size"] += os.path.getsize(f"{path}.idx")
+        except OSError:
+            pass
+        if path in usage:
+            item["last_used"] = max(item["last_used"], usage[path]["last_used"] or 0)
+            item["pinned"] = usage[path]["pinned"]
+        items.append(item)
+    return items
+
+
+def _remove_audio(store, library, item):
+    store.remove(item["path"])
+    if library:
+        # The song stays in the library; with an audio URL it is fetched again when played
+        library.clear_file(item["path"])
+
+
+def _temp_items(staging_dir):
+    """This process's browser temp dirs (in use) and partial downloads in the store's staging folder"""
+    items = []
+    temp_dir = tempfile.gettempdir()
+    try:
+        names = os.listdir(temp_dir)
+    except OSError:
+        names = []
+    for name in names:
+        match = BROWSER_TEMP_RE.match(name)
+        if match:
+            path = os.path.join(temp_dir, name)
+            items.append({"path": path, "size": _tree_size(path), "last_used": time.time(), "pinned": True})
+    if staging_dir:
+        for path, st in _files(staging_dir):
+            # Still being written: leave it to the download
+            items.append(_file_item(path, st, pinned=time.time() - st.st_mtime < ACTIVE_SECONDS))
+    return items
+
+
+def _log_items(log_path):
+    """The live log (pinned) and its rotated files"""
+    folder, base = os.path.split(log_path)
+    items = []
+    try:
+        names = os.listdir(folder or ".")
+    except OSError:
+        return items
+    for name in names:
+        if name == base or name.startswith(f"{base}."):
+            path = os.path.join(folder, name)
+            try:
+                items.append(_file_item(path, os.stat(path), pinned=name == base))
+            except OSError:
+                pass
+    return items
@@ -0,0 +1,759 @@
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from circuit_breaker import BreakerRegistry, CircuitOpenError
+from credits import CreditTracker, InsufficientCreditsError
+from downloader import IntegrityError
+import metrics
+from tracing import Tracer, trace_of, now_us
+from eta import PhaseHistory
+from library import SongLibrary
+from postprocess import PostProcessor
+
+logger = logging.getLogger(__name__)
+
+# Ordered stages of a song job. The download stage is only run when requested.
+STAGES = ["login", "fill", "submit", "await", "harvest", "download"]
+
+# Stages whose checkpoints survive a replay from the dead-letter queue.
+# Everything before "harvest" is tied to a live page and has to be redone.
+DURABLE_STAGES = ["harvest", "download"]
+
+# Error fragments that usually go away on their own
+TRANSIENT_ERROR_MARKERS = [
+    "timeout",
+    "timed out",
+    "net::",
+    "target closed",
+    "navigation",
+    "connection",
+    "econnreset",
+    "503",
+    "502",
+    "429",
+]
+
+
+class StageError(Exception):
+    """Error raised by a job stage, tagged as transient or permanent"""
+
+    def __init__(self, message, transient=True):
+        super().__init__(message)
+        self.transient = transient
+
+
+class TransientStageError(StageError):
+    """Stage failure that is worth retrying"""
+
+    def __init__(self, message):
+        super().__init__(message, transient=True)
+
+
+class PermanentStageError(StageError):
+    """Stage failure that will not go away by retrying"""
+
+    def __init__(self, message):
+        super().__init__(message, transient=False)
+
+
+class JobCancelled(PermanentStageError):
+    """Raised inside a stage when the job has been cancelled"""
+
+    def __init__(self, message="Job cancelled"):
+        super().__init__(message)
+
+
+class DeadlineExceeded(PermanentStageError):
+    """Raised inside a stage when the job has run out of time budget"""
+
+    def __init__(self, message="Job deadline exceeded"):
+        super().__init__(message)
+
+
+def is_transient(error):
+    """Classify an exception raised by a stage as transient or permanent"""
+    if isinstance(error, StageError):
+        return error.transient
+    message = str(error).lower()
+    return any(marker in message for marker in TRANSIENT_ERROR_MARKERS)
+
+
+class RetryPolicy:
+    """Per-stage retry budget with jittered exponential backoff"""
+
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=60.0):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a retry policy from the values returned by get_config"""
+        return cls(
+            max_attempts=config.get("JOB_MAX_ATTEMPTS", 3),
+            base_delay=config.get("JOB_BACKOFF_BASE", 2.0),
+            max_delay=config.get("JOB_BACKOFF_MAX", 60.0),
+        )
+
+    def delay(self, attempt):
+        """Delay before the given retry (1-based), using full jitter"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class Job:
+    """A song request split into checkpointed stages"""
+
+    def __init__(self, prompt, style=None, title=None, instrumental=True, download=True, job_id=None, timeout=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.params = {
+            "prompt": prompt,
+            "style": style,
+            "title": title,
+            "instrumental": instrumental,
+            "download": download,
+        }
+        self.stages = [stage for stage in STAGES if download or stage != "download"]
+        self.checkpoints = {}
+        self.attempts = {}
+        self.status = "queued"
+        self.current_stage = None
+        self.error = None
+        self.error_stage = None
+        self.created_at = datetime.now().isoformat()
+        self.updated_at = self.created_at
+        # Overall time budget in seconds, turned into an absolute deadline
+        self.timeout = timeout
+        self.deadline = time.time() + timeout if timeout else None
+        self.done = threading.Event()
+        self._cancel_event = threading.Event()
+        # Span recorder, set by Tracer.begin; NULL_TRACE when not sampled
+        self.trace = None
+        self.trace_path = None
+        # Timing used for ETA estimates and the phase history
+        self.started_at = None
+        self.stage_started_at = None
+        self.stage_durations = {}
+        # Called with the stage name whenever a stage checkpoints
+        self.on_checkpoint = None
+        # Row id of the song in the library, once recorded there
+        self.song_id = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Ask the job to stop at the next wait or stage boundary"""
+        self._cancel_event.set()
+
+    def remaining(self):
+        """Seconds left before the deadline, or None when there is no deadline"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def check(self):
+        """Raise if the job has been cancelled or has run out of time"""
+        if self.cancelled:
+            raise JobCancelled()
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded()
+
+    def budget_ms(self, timeout_ms):
+        """Clamp a per-call timeout (ms) to the remaining job budget"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout_ms
+        return max(1, min(timeout_ms, int(remaining * 1000)))
+
+    def sleep(self, seconds):
+        """Sleep within the job budget, waking up immediately on cancellation"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        if self._cancel_event.wait(max(0, seconds)):
+            raise JobCancelled()
+        self.check()
+
+    def checkpoint(self, stage, data=None):
+        """Record a completed stage along with the data it produced"""
+        self.checkpoints[stage] = data or {}
+        self.updated_at = datetime.now().isoformat()
+        if self.on_checkpoint:
+            self.on_checkpoint(stage)
+
+    def is_done(self, stage):
+        """Check whether a stage has already been checkpointed"""
+        return stage in self.checkpoints
+
+    def reset_for_replay(self):
+        """Prepare a dead-lettered job to run again"""
+        if "harvest" not in self.checkpoints:
+            self.checkpoints = {}
+        else:
+            self.checkpoints = {stage: data for stage, data in self.checkpoints.items() if stage in DURABLE_STAGES}
+        self.attempts = {}
+        self.stage_durations = {}
+        self.started_at = None
+        self.stage_started_at = None
+        self.status = "queued"
+        self.current_stage = None
+        self.error = None
+        self.error_stage = None
+        self.deadline = time.time() + self.timeout if self.timeout else None
+        self.done = threading.Event()
+        self._cancel_event = threading.Event()
+        self.trace = None
+        self.updated_at = datetime.now().isoformat()
+
+    def result(self):
+        """Build the result dictionary returned to API and GUI callers"""
+        # A failed download does not undo a generated song
+        download_failed = self.error_stage == "download" and "harvest" in self.checkpoints
+        if self.status != "succeeded" and not download_failed:
+            return {
+                "success": False,
+                "job_id": self.id,
+                "error": self.error or "Job did not complete",
+                "stage": self.error_stage,
+            }
+
+        result = {
+            "success": True,
+            "job_id": self.id,
+            "id": self.song_id,
+            "url": self.checkpoints.get("harvest", {}).get("url"),
+            "audio_url": self.checkpoints.get("harvest", {}).get("audio_url"),
+            "prompt": self.params["prompt"],
+            "style": self.params["style"],
+            "title": self.params["title"],
+        }
+        download = self.checkpoints.get("download")
+        if download and download.get("file_path"):
+            result["file_path"] = download["file_path"]
+        if download_failed:
+            result["download_error"] = self.error
+        return result
+
+    def to_dict(self):
+        """Serialize the job to a JSON-compatible dictionary"""
+        return {
+            "id": self.id,
+            "params": self.params,
+            "stages": self.stages,
+            "checkpoints": self.checkpoints,
+            "attempts": self.attempts,
+            "stage_durations": self.stage_durations,
+            "status": self.status,
+            "current_stage": self.current_stage,
+            "error": self.error,
+            "error_stage": self.error_stage,
+            "timeout": self.timeout,
+            "deadline": self.deadline,
+            "trace_path": self.trace_path,
+            "song_id": self.song_id,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a job from the output of to_dict"""
+        job = cls(job_id=data["id"], **data["params"])
+        job.stages = data.get("stages", job.stages)
+        job.checkpoints = data.get("checkpoints", {})
+        job.attempts = data.get("attempts", {})
+        job.stage_durations = data.get("stage_durations", {})
+        job.status = data.get("status", "queued")
+        job.current_stage = data.get("current_stage")
+        job.error = data.get("error")
+        job.error_stage = data.get("error_stage")
+        job.timeout = data.get("timeout")
+        job.deadline = data.get("deadline")
+        job.trace_path = data.get("trace_path")
+        job.song_id = data.get("song_id")
+        job.created_at = data.get("created_at", job.created_at)
+        job.updated_at = data.get("updated_at", job.updated_at)
+        return job
+
+
+class DeadLetterQueue:
+    """Jobs that exhausted their retries, persisted to a JSON file for replay"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for data in json.load(f):
+                    job = Job.from_dict(data)
+                    self._jobs[job.id] = job
+            logger.info(f"Loaded {len(self._jobs)} dead-lettered jobs from {self.path}")
+        except Exception as e:
+            logger.error(f"Could not load dead-letter queue from {self.path}: {str(e)}")
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump([job.to_dict() for job in self._jobs.values()], f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Could not save dead-letter queue to {self.path}: {str(e)}")
+
+    def add(self, job):
+        """Park a failed job"""
+        with self._lock:
+            self._jobs[job.id] = job
+            self._save()
+        logger.warning(f"Job {job.id} moved to dead-letter queue after failing stage '{job.error_stage}': {job.error}")
+
+    def list(self):
+        """Return all dead-lettered jobs, oldest first"""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.updated_at)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id):
+        """Remove a job from the queue and return it, or None if unknown"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job:
+                self._save()
+            return job
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+class JobRunner:
+    """Run a job's stages in order, retrying only the stage that failed"""
+
+    def __init__(self, retry_policy=None, dead_letter=None, tracer=None, history=None, library=None,
+                 postprocessor=None, store=None):
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.dead_letter = dead_letter if dead_letter is not None else DeadLetterQueue()
+        self.tracer = tracer or Tracer()
+        self.history = history or PhaseHistory()
+        # Song library the finished jobs are recorded in, if any
+        self.library = library
+        # Pipeline the downloaded files go through after the job, if any
+        self.postprocessor = postprocessor
+        # Song store the downloads live in, so a rejected file can be dropped
+        self.store = store
+
+    @classmethod
+    def from_config(cls, config, store=None):
+        """Build a runner and its dead-letter queue from get_config values"""
+        return cls(
+            retry_policy=RetryPolicy.from_config(config),
+            dead_letter=DeadLetterQueue(config.get("DEAD_LETTER_PATH")),
+            tracer=Tracer.from_config(config),
+            history=PhaseHistory(config.get("PHASE_HISTORY_PATH")),
+            library=SongLibrary.from_config(config),
+            postprocessor=PostProcessor.from_config(config),
+            store=store,
+        )
+
+    def run(self, job, handlers):
+        """Run every pending stage of the job with the given stage handlers.
+
+        Each handler receives the job and returns a dictionary that is stored
+        as the stage checkpoint. Stages that are already checkpointed are skipped.
+        """
+        # A trace begun at submission time shows how long the job was queued
+        queued = job.trace is not None
+        trace = self.tracer.begin(job)
+        started_us = now_us()
+        if queued and trace.enabled:
+            trace.complete("queued", trace.started_us, started_us, cat="job")
+        try:
+            return self._run(job, handlers)
+        finally:
+            error = job.error if job.status != "succeeded" else None
+            trace.complete("job", started_us, now_us(), cat="job", status=job.status, error=error)
+            self.tracer.finish(job)
+
+    def _run(self, job, handlers):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            for stage in job.stages:
+                if job.is_done(stage):
+                    logger.info(f"Job {job.id}: stage '{stage}' already checkpointed, skipping")
+                    continue
+                if not self._run_stage(job, stage, handlers[stage]):
+                    job.status = "dead"
+                    self.dead_letter.add(job)
+                    if stage == "download" and "harvest" in job.checkpoints:
+                        # The song was generated; it can still be streamed from its audio URL
+                        self._record(job)
+                    return job
+        except JobCancelled:
+            logger.info(f"Job {job.id} cancelled during stage '{job.current_stage}'")
+            job.status = "cancelled"
+            job.error = "Job cancelled"
+            job.error_stage = job.current_stage
+            return job
+
+        job.status = "succeeded"
+        job.current_stage = None
+        job.stage_started_at = None
+        self.history.record(job)
+        self._record(job)
+        logger.info(f"Job {job.id} completed")
+        if self.postprocessor:
+            self._postprocess(job)
+        return job
+
+    def _record(self, job):
+        if self.library:
+            job.song_id = self.library.record_job(job)
+
+    def _postprocess(self, job):
+        """Hand the downloaded file to the pipeline; waits only while the pipeline is full"""
+        download = job.checkpoints.get("download") or {}
+        if not download.get("file_path"):
+            return
+        song = {"job_id": job.id, "sha256": download.get("sha256")}
+        self.postprocessor.submit(
+            download["file_path"], song,
+            on_done=self._postprocessed,
+            on_error=lambda song, error: self._postprocess_failed(download["file_path"], song, error),
+        )
+
+    def _postprocessed(self, song):
+        if self.library:
+            self.library.update(song["job_id"], sha256=song.get("sha256"), duration=song.get("duration"))
+
+    def _postprocess_failed(self, file_path, song, error):
+        if not isinstance(error, IntegrityError):
+            return
+        # The job has finished and been reported; only the file is bad. Dropping it
+        # leaves the song with its audio URL, so it is downloaded again when played
+        logger.warning(f"Downloaded file of job {song['job_id']} rejected, removing it: {str(error)}")
+        if self.library:
+            self.library.clear_file(file_path)
+        if self.store:
+            self.store.remove(file_path)
+
+    def _run_stage(self, job, stage, handler):
+        job.current_stage = stage
+        job.stage_started_at = time.time()
+        while True:
+            attempt = job.attempts.get(stage, 0) + 1
+            job.attempts[stage] = attempt
+            started = time.monotonic()
+            try:
+                job.check()
+                logger.info(f"Job {job.id}: running stage '{stage}' (attempt {attempt}/{self.retry_policy.max_attempts})")
+                with trace_of(job).span(f"stage:{stage}", cat="stage", attempt=attempt):
+                    data = handler(job)
+                job.checkpoint(stage, data)
+                # Includes retries and backoff, which is what the user waits for
+                job.stage_durations[stage] = time.time() - job.stage_started_at
+                metrics.observe_stage(stage, "ok", time.monotonic() - started)
+                return True
+            except JobCancelled:
+                metrics.observe_stage(stage, "cancelled", time.monotonic() - started)
+                raise
+            except Exception as e:
+                # A cancellation can surface as a Playwright error from an interrupted wait
+                if job.cancelled:
+                    metrics.observe_stage(stage, "cancelled", time.monotonic() - started)
+                    raise JobCancelled()
+                transient = is_transient(e)
+                metrics.observe_stage(stage, "transient" if transient else "permanent", time.monotonic() - started)
+                job.error = str(e)
+                job.error_stage = stage
+                logger.warning(f"Job {job.id}: stage '{stage}' failed ({'transient' if transient else 'permanent'}): {str(e)}")
+                if not transient or attempt >= self.retry_policy.max_attempts:
+                    return False
+                delay = self.retry_policy.delay(attempt)
+                logger.info(f"Job {job.id}: retrying stage '{stage}' in {delay:.1f}s")
+                try:
+                    with trace_of(job).span("backoff", cat="stage", stage=stage, delay=round(delay, 2)):
+                        job.sleep(delay)
+                except DeadlineExceeded as deadline_error:
+                    job.error = str(deadline_error)
+                    return False
+
+
+class WorkerCall:
+    """A function to run once on a worker thread, with that worker's automation"""
+
+    cancelled = False
+
+    def __init__(self, func):
+        self.func = func
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def run(self, automation):
+        try:
+            self.result = self.func(automation)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def wait(self, timeout=None):
+        """The function's return value; re-raises what it raised"""
+        if not self.done.wait(timeout):
+            raise TimeoutError("No worker picked up the call in time")
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class JobManager:
+    """Queue of jobs executed by the thread that owns the browser automation.
+
+    Playwright's sync API must be driven from the thread that started it, so
+    the API server only submits jobs here and the owning thread calls serve().
+    """
+
+    def __init__(self, default_timeout=None, max_history=500, breakers=None, credits=None, lazy_download=False):
+        self.default_timeout = default_timeout
+        # Stop jobs after harvesting; the audio is fetched when first played
+        self.lazy_download = lazy_download
+        self.max_history = max_history
+        self.breakers = breakers or BreakerRegistry()
+        self.credits = credits or CreditTracker()
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._active = {}
+        self._slots = 0
+        # Account of every serving worker, by worker name
+        self._accounts = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a job manager from get_config values"""
+        return cls(
+            default_timeout=config.get("JOB_DEADLINE"),
+            breakers=BreakerRegistry.from_config(config),
+            credits=CreditTracker.from_config(config),
+            lazy_download=config.get("DOWNLOAD_MODE") == "lazy",
+        )
+
+    def submit(self, job):
+        """Register a job and queue it for execution.
+
+        Raises CircuitOpenError when every account's breaker is open and the
+        breakers are configured to fail fast, and InsufficientCreditsError when
+        the queue already needs more credits than are left and credits are
+        configured to reject.
+        """
+        if self.breakers.mode == "fail" and not self.breakers.any_available():
+            raise CircuitOpenError(None, self.breakers.shortest_retry_after())
+        if self.credits.mode == "reject":
+            self.credits.check_projected(self.queue_depth() + 1)
+        return self._enqueue(job)
+
+    def submit_batch(self, jobs):
+        """Queue several jobs at once, or none if they cannot all be paid for"""
+        if self.breakers.mode == "fail" and not self.breakers.any_available():
+            raise CircuitOpenError(None, self.breakers.shortest_retry_after())
+        self.credits.check_projected(self.queue_depth() + len(jobs))
+        return [self._enqueue(job) for job in jobs]
+
+    def _enqueue(self, job):
+        if self.lazy_download and "download" in job.stages:
+            job.params["download"] = False
+            job.stages = [stage for stage in job.stages if stage != "download"]
+        if job.timeout is None and self.default_timeout:
+            job.timeout = self.default_timeout
+            job.deadline = time.time() + job.timeout
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_history:
+                self._jobs.popitem(last=False)
+        self._queue.put(job)
+        logger.info(f"Job {job.id} queued (queue depth: {self.queue_depth()})")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns the job, or None if unknown"""
+        job = self.get(job_id)
+        if not job:
+            return None
+        if job.done.is_set():
+            return job
+        job.cancel()
+        if job.status == "queued":
+            # The worker will drop it when it reaches the front of the queue
+            job.status = "cancelled"
+            job.error = "Job cancelled"
+            job.done.set()
+        logger.info(f"Cancellation requested for job {job_id}")
+        return job
+
+    def call(self, func, timeout=60):
+        """Run func(automation) on the next free worker thread and return its result.
+
+        For quick reads of browser state (cookies, user agent) from other
+        threads; the call goes ahead of the queued jobs.
+        """
+        call = WorkerCall(func)
+        with self._queue.mutex:
+            self._queue.queue.appendleft(call)
+            self._queue.unfinished_tasks += 1
+            self._queue.not_empty.notify()
+        return call.wait(timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def queue_position(self, job):
+        """Number of live jobs queued ahead of the given one"""
+        with self._queue.mutex:
+            pending = list(self._queue.queue)
+        ahead = 0
+        for queued in pending:
+            if queued is job:
+                return ahead
+            if not queued.cancelled:
+                ahead += 1
+        return 0
+
+    def pool_status(self):
+        """Worker slot usage, keyed by worker name"""
+        with self._lock:
+            return {
+                "slots": self._slots,
+                "busy": len(self._active),
+                "active_jobs": dict(self._active),
+            }
+
+    def serve(self, automation, name="default", stop_event=None):
+        """Execute queued jobs on the calling thread until stop_event is set"""
+        with self._lock:
+            self._slots += 1
+            self._accounts[name] = getattr(automation, "account", name)
+        if getattr(automation, "context", None):
+            self.credits.watch(automation.context, getattr(automation, "account", name))
+        logger.info(f"Worker '{name}' serving jobs")
+        try:
+            while not (stop_event and stop_event.is_set()):
+                try:
+                    job = self._queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if isinstance(job, WorkerCall):
+                    job.run(automation)
+                    continue
+                if job.cancelled:
+                    job.done.set()
+                    continue
+                self._execute(automation, name, job)
+        finally:
+            with self._lock:
+                self._slots -= 1
+                self._accounts.pop(name, None)
+
+    def _reject(self, job, error, status="failed"):
+        job.status = status
+        job.error = str(error)
+        metrics.observe_job(job)
+        job.done.set()
+
+    def _requeue(self, job, delay):
+        """Put a job that cannot run yet back in the queue, unless it is out of time"""
+        try:
+            job.check()
+        except JobCancelled as e:
+            self._reject(job, e, status="cancelled")
+            return
+        except DeadlineExceeded as e:
+            logger.warning(f"Job {job.id} reached its deadline while held in the queue")
+            self._reject(job, e)
+            return
+        self._queue.put(job)
+        time.sleep(delay)
+
+    def _submitted(self, job, account, stage):
+        """Charge the account as soon as the submission is done, not when the job ends"""
+        if stage == "submit":
+            # A balance read from the generate response already includes this job
+            self.credits.consume(account, unless_updated_since=job.stage_started_at)
+
+    def _execute(self, automation, name, job):
+        account = getattr(automation, "account", name)
+
+        # Pre-flight quota check, before any browser work
+        if "submit" not in job.checkpoints and not self.credits.can_afford(account):
+            with self._lock:
+                others = [other for worker, other in self._accounts.items() if worker != name and other != account]
+            # Hold the job, or leave it for a worker whose account can pay
+            if self.credits.mode == "hold" or any(self.credits.can_afford(other) for other in others):
+                self._requeue(job, 1.0)
+                return
+            error = InsufficientCreditsError(self.credits.cost_per_job, self.credits.remaining(account))
+            logger.warning(f"Job {job.id} rejected for account '{account}': {str(error)}")
+            self._reject(job, error)
+            return
+
+        breaker = self.breakers.get(account)
+        if not breaker.allow():
+            if self.breakers.mode == "hold":
+                # Park the job until the breaker lets a probe through
+                self._requeue(job, min(1.0, max(0.1, breaker.retry_after())))
+                return
+            error = CircuitOpenError(account, breaker.retry_after())
+            logger.warning(f"Job {job.id} rejected: {str(error)}")
+            self._reject(job, error)
+            return
+
+        with self._lock:
+            self._active[name] = job.id
+        job.on_checkpoint = lambda stage: self._submitted(job, account, stage)
+        try:
+            automation.run_job(job)
+        except Exception as e:
+            logger.error(f"Worker '{name}' failed on job {job.id}: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.on_checkpoint = None
+            if job.error and job.error.startswith("Out of credits"):
+                self.credits.update(account, 0)
+            self.breakers.record(account, job)
+            metrics.observe_job(job)
+            if job.status != "succeeded":
+                # Leave the browser clean for the next job after an interrupted run
+                automation.reset_page()
+            with self._lock:
+                self._active.pop(name, None)
+            job.done.set()
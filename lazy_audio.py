@@ -0,0 +1,186 @@
+
+import logging
+import os
+import queue
+import threading
+import time
+from urllib.parse import urljoin, urlparse
+
+from downloader import BandwidthLimiter, Downloader, DownloadError
+from utils import safe_filename
+
+logger = logging.getLogger(__name__)
+
+
+class AudioFetcher:
+    """Downloads library songs that only have an audio URL, when they are wanted.
+
+    With DOWNLOAD_MODE=lazy the jobs stop after harvesting, so generation
+    never waits on the network for files nobody plays. fetch() downloads a
+    song on first access (concurrent requests for the same song share one
+    download); a background thread warms the songs most likely to be played
+    next, recently created or often played ones, through its own downloader
+    with a bandwidth cap so it never competes with playback or generation.
+    A request that joins a prefetch still in flight lifts that cap, since
+    someone is now waiting on the file.
+    """
+
+    def __init__(self, library, store, downloader=None, base_url=None, postprocessor=None,
+                 prefetch_downloader=None, prefetch_bandwidth=0, interval=60, recent_hours=24, min_plays=2, batch=5):
+        self.library = library
+        self.store = store
+        self.downloader = downloader or Downloader()
+        self.prefetch_downloader = prefetch_downloader or self.downloader
+        # Bytes per second of each prefetch, 0 for unlimited
+        self.prefetch_bandwidth = prefetch_bandwidth
+        self.base_url = base_url
+        self.postprocessor = postprocessor
+        self.interval = interval
+        self.recent_hours = recent_hours
+        self.min_plays = min_plays
+        self.batch = batch
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._wanted = queue.Queue()
+        self._failed = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config, library, store, postprocessor=None):
+        """Build a fetcher from get_config values"""
+        return cls(
+            library, store,
+            downloader=Downloader.from_config(config),
+            base_url=config.get("SUNO_BASE_URL"),
+            postprocessor=postprocessor,
+            prefetch_downloader=Downloader(
+                max_connections=2,
+                connections_per_download=1,
+                timeout=config.get("DOWNLOAD_TIMEOUT", 30),
+                retries=config.get("DOWNLOAD_RETRIES", 3),
+            ),
+            prefetch_bandwidth=config.get("PREFETCH_BANDWIDTH_KBPS", 512) * 1024,
+            interval=config.get("PREFETCH_INTERVAL", 60),
+            recent_hours=config.get("PREFETCH_RECENT_HOURS", 24),
+            min_plays=config.get("PREFETCH_MIN_PLAYS", 2),
+            batch=config.get("PREFETCH_BATCH", 5),
+        )
+
+    def fetch(self, song, prefetch=False):
+        """Path of the song's audio, downloading it first if needed.
+
+        Raises DownloadError when the song has no audio URL or the download
+        fails.
+        """
+        if song.get("file_path") and os.path.exists(song["file_path"]):
+            return song["file_path"]
+        if not song.get("audio_url"):
+            raise DownloadError(f"Song {song['id']} has no audio URL")
+
+        with self._lock:
+            pending = self._inflight.get(song["id"])
+            owner = pending is None
+            if owner:
+                # A prefetch gets a cap of its own, so a waiting request can lift it alone
+                limiter = BandwidthLimiter(self.prefetch_bandwidth) if prefetch else None
+                pending = self._inflight[song["id"]] = {
+                    "done": threading.Event(), "path": None, "error": None, "limiter": limiter,
+                }
+            elif not prefetch and pending["limiter"]:
+                logger.info(f"Song {song['id']} is wanted now, lifting the prefetch bandwidth cap")
+                pending["limiter"].lift()
+        if not owner:
+            pending["done"].wait()
+            if pending["error"]:
+                raise pending["error"]
+            return pending["path"]
+
+        try:
+            # Another request may have fetched it since this copy of the row was read
+            current = self.library.get(song["id"]) or song
+            if current.get("file_path") and os.path.exists(current["file_path"]):
+                pending["path"] = current["file_path"]
+                return pending["path"]
+            downloader = self.prefetch_downloader if prefetch else self.downloader
+            pending["path"] = self._download(current, downloader, pending["limiter"])
+            return pending["path"]
+        except Exception as e:
+            # Waiters re-raise whatever stopped the download, not just DownloadError
+            pending["error"] = e
+            raise
+        finally:
+            pending["done"].set()
+            with self._lock:
+                self._inflight.pop(song["id"], None)
+
+    def _download(self, song, downloader, limiter=None):
+        audio_url = urljoin(self.base_url or "", song["audio_url"])
+        name = safe_filename(song.get("title") or song.get("prompt"))
+        extension = os.path.splitext(urlparse(audio_url).path)[1] or ".mp3"
+        clip_id = song.get("clip_id")
+        # Keyed by clip like the eager download, so a partial file it left is resumed
+        save_path = self.store.staging_path(f"{name}-{clip_id[:8]}{extension}" if clip_id else f"{name}-{song['id']}{extension}")
+
+        started = time.monotonic()
+        result = downloader.download(audio_url, save_path, limiter=limiter)
+        entry = self.store.put(save_path, name=name, sha256=result["sha256"], metadata={
+            "job_id": song.get("job_id"),
+            "prompt": song.get("prompt"),
+            "style": song.get("style"),
+            "clip_id": clip_id,
+            "url": song.get("url"),
+        })
+        self.library.update(song["job_id"], file_path=entry["path"], sha256=entry["sha256"], size=entry["size"])
+        logger.info(f"Fetched audio of song {song['id']} in {time.monotonic() - started:.1f}s")
+        if self.postprocessor:
+            self.postprocessor.submit(
+                entry["path"], {"job_id": song["job_id"], "sha256": entry["sha256"]},
+                on_done=lambda done: self.library.update(done["job_id"], duration=done.get("duration")),
+            )
+        return entry["path"]
+
+    def want(self, song):
+        """Fetch a song in the background, ahead of the periodic prefetch"""
+        if not song.get("file_path") and song.get("audio_url"):
+            self._wanted.put(song)
+
+    def start(self):
+        """Start the prefetch thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._prefetch_loop, name="audio-prefetch", daemon=True)
+        self._thread.start()
+        logger.info(f"Audio prefetch started: songs from the last {self.recent_hours}h or played "
+                    f"{self.min_plays}+ times, every {self.interval}s")
+
+    def stop(self):
+        self._stop.set()
+        self._wanted.put(None)
+
+    def _prefetch_loop(self):
+        while not self._stop.is_set():
+            try:
+                song = self._wanted.get(timeout=self.interval)
+            except queue.Empty:
+                song = None
+                candidates = self.library.missing_audio(
+                    limit=self.batch + len(self._failed), created_since=time.time() - self.recent_hours * 3600,
+                    min_plays=self.min_plays)
+                # A URL that failed recently (expired, removed) is left alone for an hour
+                candidates = [song for song in candidates if time.time() - self._failed.get(song["id"], 0) > 3600]
+                for candidate in candidates[:self.batch]:
+                    if self._stop.is_set() or not self._wanted.empty():
+                        break
+                    self._prefetch(candidate)
+            if song is not None:
+                self._prefetch(song)
+
+    def _prefetch(self, song):
+        try:
+            self.fetch(song, prefetch=True)
+            self._failed.pop(song["id"], None)
+        except Exception as e:
+            self._failed[song["id"]] = time.time()
+            logger.warning(f"Prefetch of song {song['id']} failed: {str(e)}")
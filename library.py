@@ -0,0 +1,385 @@
+
+import base64
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from mp3index import frame_index, sidecar_path
+
+logger = logging.getLogger(__name__)
+
+SORTS = {
+    "created": "s.created_at",
+    "duration": "s.duration",
+}
+
+COLUMNS = ["id", "job_id", "clip_id", "prompt", "style", "title", "instrumental", "url", "audio_url",
+           "file_path", "sha256", "size", "duration", "created_at", "finished_at", "generation_seconds",
+           "stage_durations"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT UNIQUE,
+    clip_id TEXT,
+    prompt TEXT NOT NULL DEFAULT '',
+    style TEXT,
+    title TEXT,
+    instrumental INTEGER NOT NULL DEFAULT 0,
+    url TEXT,
+    audio_url TEXT,
+    file_path TEXT,
+    sha256 TEXT,
+    size INTEGER,
+    duration REAL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    generation_seconds REAL,
+    stage_durations TEXT
+);
+CREATE INDEX IF NOT EXISTS songs_created ON songs (created_at, id);
+CREATE INDEX IF NOT EXISTS songs_duration ON songs (duration, id);
+CREATE INDEX IF NOT EXISTS songs_sha256 ON songs (sha256);
+CREATE INDEX IF NOT EXISTS songs_clip ON songs (clip_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+    prompt, style, title, content='songs', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS songs_ai AFTER INSERT ON songs BEGIN
+    INSERT INTO songs_fts (rowid, prompt, style, title) VALUES (new.id, new.prompt, new.style, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_ad AFTER DELETE ON songs BEGIN
+    INSERT INTO songs_fts (songs_fts, rowid, prompt, style, title) VALUES ('delete', old.id, old.prompt, old.style, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_au AFTER UPDATE ON songs BEGIN
+    INSERT INTO songs_fts (songs_fts, rowid, prompt, style, title) VALUES ('delete', old.id, old.prompt, old.style, old.title);
+    INSERT INTO songs_fts (rowid, prompt, style, title) VALUES (new.id, new.prompt, new.style, new.title);
+END;
+-- Kept apart from songs so counting plays does not change the version (and ETags)
+CREATE TABLE IF NOT EXISTS song_access (
+    song_id INTEGER PRIMARY KEY,
+    plays INTEGER NOT NULL DEFAULT 0,
+    last_played REAL
+);
+-- Songs whose audio the disk quota must never evict
+CREATE TABLE IF NOT EXISTS song_pins (song_id INTEGER PRIMARY KEY, pinned_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+CREATE TRIGGER IF NOT EXISTS songs_version_ai AFTER INSERT ON songs BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'version';
+END;
+CREATE TRIGGER IF NOT EXISTS songs_version_ad AFTER DELETE ON songs BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'version';
+END;
+CREATE TRIGGER IF NOT EXISTS songs_version_au AFTER UPDATE ON songs BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'version';
+END;
+"""
+
+
+def fts_query(text):
+    """FTS5 query matching every word, the last one as a prefix (search as you type)"""
+    terms = re.findall(r"\w+", text or "", re.UNICODE)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms[:-1]) + (" " if len(terms) > 1 else "") + f'"{terms[-1]}"*'
+
+
+def encode_cursor(position):
+    """Opaque page cursor for the API"""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Position encoded by encode_cursor; ValueError if it was tampered with"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def _after(column, value, row_id, descending):
+    """Keyset condition for rows after (value, id) in the sort order; NULLs sort lowest, as in SQLite"""
+    if value is None:
+        if descending:
+            return f"({column} IS NULL AND s.id < ?)", [row_id]
+        return f"(({column} IS NULL AND s.id > ?) OR {column} IS NOT NULL)", [row_id]
+    if descending:
+        return f"(({column}, s.id) < (?, ?) OR {column} IS NULL)", [value, row_id]
+    return f"(({column}, s.id) > (?, ?))", [value, row_id]
+
+
+class SongLibrary:
+    """Every generated song in a local SQLite database.
+
+    Text fields are indexed with FTS5 (kept in sync by triggers) and time
+    and duration have their own indexes, so searching and paging stay in
+    the millisecond range with a hundred thousand songs. A single
+    connection is shared by the worker and the API threads behind a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config):
+        """Open the library at LIBRARY_PATH"""
+        return cls(config.get("LIBRARY_PATH"))
+
+    def add(self, song):
+        """Insert or update (by job id) a song and return its row id"""
+        song = dict(song)
+        song.setdefault("created_at", time.time())
+        if isinstance(song.get("stage_durations"), dict):
+            song["stage_durations"] = json.dumps(song["stage_durations"])
+        if "instrumental" in song:
+            song["instrumental"] = int(bool(song["instrumental"]))
+        columns = [column for column in COLUMNS if column != "id" and column in song]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != "job_id")
+        sql = (f"INSERT INTO songs ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+               f"ON CONFLICT(job_id) DO {'UPDATE SET ' + updates if updates else 'NOTHING'}")
+        with self._lock, self._db:
+            cursor = self._db.execute(sql, [song[column] for column in columns])
+            if song.get("job_id"):
+                return self._db.execute("SELECT id FROM songs WHERE job_id = ?", (song["job_id"],)).fetchone()[0]
+            return cursor.lastrowid
+
+    def record_job(self, job):
+        """Store a finished job; failures are logged, never raised"""
+        try:
+            harvest = job.checkpoints.get("harvest", {})
+            download = job.checkpoints.get("download", {})
+            file_path = download.get("file_path")
+            return self.add({
+                "job_id": job.id,
+                "clip_id": harvest.get("clip_id"),
+                "prompt": job.params.get("prompt") or "",
+                "style": job.params.get("style"),
+                "title": job.params.get("title"),
+                "instrumental": job.params.get("instrumental"),
+                "url": harvest.get("url"),
+                "audio_url": harvest.get("audio_url"),
+                "file_path": file_path,
+                "sha256": download.get("sha256"),
+                "size": download.get("size"),
+                "duration": download.get("duration") or self._duration(file_path),
+                "created_at": job.started_at or time.time(),
+                "finished_at": time.time(),
+                "generation_seconds": round(sum(job.stage_durations.values()), 2),
+                "stage_durations": job.stage_durations,
+            })
+        except Exception as e:
+            logger.error(f"Could not record job {job.id} in the library: {str(e)}")
+            return None
+
+    def update(self, job_id, **fields):
+        """Set fields of the song of a job, skipping those that are None"""
+        fields = {column: value for column, value in fields.items() if column in COLUMNS and value is not None}
+        if not fields:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE songs SET {assignments} WHERE job_id = ?", [*fields.values(), job_id])
+
+    @staticmethod
+    def _duration(file_path):
+        """Duration from the file's frame index sidecar, when post-processing has written one already"""
+        if not file_path or not os.path.exists(sidecar_path(file_path)):
+            return None
+        index = frame_index(file_path, save=False)
+        return round(index.duration, 3) if index.frames else None
+
+    @staticmethod
+    def _row(row):
+        song = dict(row)
+        song["instrumental"] = bool(song["instrumental"])
+        if song.get("stage_durations"):
+            song["stage_durations"] = json.loads(song["stage_durations"])
+        return song
+
+    def get(self, song_id):
+        """One song by row id, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM songs WHERE id = ?", (song_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def version(self):
+        """Counter bumped by every change to the songs table, for ETags"""
+        with self._lock:
+            return self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def _where(self, query=None, instrumental=None, min_duration=None, max_duration=None, after=None):
+        """FROM and WHERE clauses of a search, with their parameters"""
+        source, clauses, params = "songs s", [], []
+        match = fts_query(query)
+        if match:
+            # Driving the join from the FTS index beats an IN (...) over every match
+            source = "songs_fts f JOIN songs s ON s.id = f.rowid"
+            clauses.append("songs_fts MATCH ?")
+            params.append(match)
+        if instrumental is not None:
+            clauses.append("s.instrumental = ?")
+            params.append(int(bool(instrumental)))
+        if min_duration is not None:
+            clauses.append("s.duration >= ?")
+            params.append(min_duration)
+        if max_duration is not None:
+            clauses.append("s.duration <= ?")
+            params.append(max_duration)
+        if after:
+            clause, after_params = _after(*after)
+            clauses.append(clause)
+            params.extend(after_params)
+        return source, (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def search(self, query=None, sort="created", descending=True, limit=50, offset=0, after=None, **filters):
+        """Songs matching the words of query, sorted by time, duration or relevance.
+
+        after continues a time or duration sort from a (value, id) pair.
+        """
+        if sort not in SORTS and sort != "relevance":
+            raise ValueError(f"Unknown sort '{sort}', expected one of {list(SORTS) + ['relevance']}")
+        if after is not None:
+            after = (SORTS.get(sort, SORTS["created"]), after[0], after[1], descending)
+        source, where, params = self._where(query, after=after, **filters)
+        direction = "DESC" if descending else "ASC"
+        if sort == "relevance" and source != "songs s":
+            # bm25 is lower for better matches
+            order = f"bm25(songs_fts) {'ASC' if descending else 'DESC'}, s.id DESC"
+        else:
+            order = f"{SORTS.get(sort, SORTS['created'])} {direction}, s.id {direction}"
+        sql = f"SELECT s.* FROM {source}{where} ORDER BY {order} LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._db.execute(sql, params + [limit, offset]).fetchall()
+        return [self._row(row) for row in rows]
+
+    def count(self, query=None, **filters):
+        """Number of songs matching a search"""
+        source, where, params = self._where(query, **filters)
+        if source != "songs s" and not any(value is not None for value in filters.values()):
+            # Text only: the FTS index can count on its own
+            source = "songs_fts"
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM {source}{where}", params).fetchone()[0]
+
+    def page(self, query=None, sort="created", descending=True, limit=50, cursor=None, **filters):
+        """One page of a search and the cursor of the next page (None on the last one).
+
+        Time and duration sorts page by keyset, so deep pages cost the same
+        as the first and rows added meanwhile do not shift them. Relevance
+        has no stable key and pages by offset.
+        """
+        position = decode_cursor(cursor) if cursor else {}
+        if position and (position.get("sort") != sort or position.get("desc") != descending):
+            raise ValueError("Cursor belongs to a different sort order")
+        if sort == "relevance" and fts_query(query):
+            offset = position.get("offset", 0)
+            songs = self.search(query, sort, descending, limit + 1, offset, **filters)
+            next_position = {"offset": offset + limit}
+        else:
+            songs = self.search(query, sort, descending, limit + 1, after=position.get("after"), **filters)
+            key = SORTS.get(sort, SORTS["created"])[2:]
+            next_position = {"after": [songs[limit - 1][key], songs[limit - 1]["id"]]} if len(songs) > limit else None
+        if len(songs) <= limit:
+            return songs, None
+        next_position.update({"sort": sort, "desc": descending})
+        return songs[:limit], encode_cursor(next_position)
+
+    def iter_songs(self, query=None, sort="created", descending=True, batch_size=500, **filters):
+        """Every matching song, fetched a keyset batch at a time"""
+        if sort == "relevance":
+            sort = "created"
+        after = None
+        while True:
+            songs = self.search(query, sort, descending, batch_size, after=after, **filters)
+            yield from songs
+            if len(songs) < batch_size:
+                return
+            after = (songs[-1][SORTS[sort][2:]], songs[-1]["id"])
+
+    def clip_ids(self):
+        """Suno clip ids of every song in the library"""
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT clip_id FROM songs WHERE clip_id IS NOT NULL")}
+
+    def record_play(self, song_id):
+        """Count a playback of a song, for the prefetcher"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO song_access (song_id, plays, last_played) VALUES (?, 1, ?) "
+                "ON CONFLICT(song_id) DO UPDATE SET plays = plays + 1, last_played = excluded.last_played",
+                (song_id, time.time()),
+            )
+
+    def pin(self, song_id, pinned=True):
+        """Keep (or stop keeping) a song's audio on disk whatever the quota"""
+        with self._lock, self._db:
+            if pinned:
+                self._db.execute("INSERT OR IGNORE INTO song_pins (song_id, pinned_at) VALUES (?, ?)", (song_id, time.time()))
+            else:
+                self._db.execute("DELETE FROM song_pins WHERE song_id = ?", (song_id,))
+
+    def pinned(self, song_id):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM song_pins WHERE song_id = ?", (song_id,)).fetchone() is not None
+
+    def file_usage(self):
+        """Last use and pin state of every audio file, keyed by path.
+
+        A file is last used when it was last played, or else when its song
+        finished; files shared by several songs take the latest of them.
+        """
+        sql = ("SELECT s.file_path, MAX(COALESCE(a.last_played, s.finished_at, s.created_at)), MAX(p.song_id IS NOT NULL) "
+               "FROM songs s LEFT JOIN song_access a ON a.song_id = s.id LEFT JOIN song_pins p ON p.song_id = s.id "
+               "WHERE s.file_path IS NOT NULL GROUP BY s.file_path")
+        with self._lock:
+            return {path: {"last_used": last_used, "pinned": bool(pinned)}
+                    for path, last_used, pinned in self._db.execute(sql)}
+
+    def clear_file(self, file_path):
+        """Forget an audio file that was deleted; the songs keep their audio URL"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE songs SET file_path = NULL, size = NULL WHERE file_path = ?", (file_path,))
+
+    def missing_audio(self, limit=10, created_since=None, min_plays=None):
+        """Songs with an audio URL but no file, most played and then newest first.
+
+        With created_since or min_plays only songs created after that time or
+        played at least that often are returned.
+        """
+        clauses, params = ["s.file_path IS NULL", "s.audio_url IS NOT NULL"], []
+        wanted = []
+        if created_since is not None:
+            wanted.append("s.created_at >= ?")
+            params.append(created_since)
+        if min_plays is not None:
+            wanted.append("COALESCE(a.plays, 0) >= ?")
+            params.append(min_plays)
+        if wanted:
+            clauses.append(f"({' OR '.join(wanted)})")
+        sql = (f"SELECT s.* FROM songs s LEFT JOIN song_access a ON a.song_id = s.id WHERE {' AND '.join(clauses)} "
+               f"ORDER BY COALESCE(a.plays, 0) DESC, s.created_at DESC LIMIT ?")
+        with self._lock:
+            return [self._row(row) for row in self._db.execute(sql, [*params, limit])]
+
+    def recent(self, limit=10):
+        """Newest songs first"""
+        return self.search(limit=limit)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
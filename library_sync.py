@@ -0,0 +1,224 @@
+
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from urllib.parse import urlencode, urljoin, urlparse
+
+from downloader import Downloader, DownloadError
+from utils import safe_filename
+
+logger = logging.getLogger(__name__)
+
+
+class SyncError(Exception):
+    """Raised when the account's feed cannot be read"""
+
+
+def _timestamp(value):
+    """Seconds since the epoch of a feed created_at (ISO string or number)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return 0.0
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+class LibrarySync:
+    """Imports the songs of the Suno account that the local library lacks.
+
+    The feed is paged newest first with the browser session's cookies, and
+    clips are matched to the library by clip id, so only missing ones are
+    downloaded, several at a time through the shared downloader. The state
+    file keeps the creation time of the newest clip once a walk has reached
+    the last page: later runs stop at the first page of songs older than
+    that. An interrupted walk starts over, but only lists pages again; the
+    clips it already imported are skipped and partial files resume.
+    """
+
+    def __init__(self, library, store, downloader=None, state_path=None, feed_url=None, base_url=None,
+                 concurrency=4, lazy=False, postprocessor=None):
+        self.library = library
+        self.store = store
+        self.downloader = downloader or Downloader()
+        self.state_path = state_path
+        self.feed_url = feed_url
+        self.base_url = base_url or "https://suno.com"
+        self.concurrency = concurrency
+        self.lazy = lazy
+        self.postprocessor = postprocessor
+        self._lock = threading.Lock()
+        self._thread = None
+        self.status = {"state": "idle"}
+
+    @classmethod
+    def from_config(cls, config, library, store, downloader=None, postprocessor=None):
+        """Build a sync from get_config values"""
+        return cls(
+            library, store,
+            downloader=downloader or Downloader.from_config(config),
+            state_path=config.get("SYNC_STATE_PATH"),
+            feed_url=config.get("SUNO_FEED_URL"),
+            base_url=config.get("SUNO_BASE_URL"),
+            concurrency=config.get("SYNC_CONCURRENCY", 4),
+            lazy=config.get("DOWNLOAD_MODE") == "lazy",
+            postprocessor=postprocessor,
+        )
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError, TypeError):
+            return {}
+
+    def _save_state(self, state):
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def start(self, headers, full=False):
+        """Run a sync in the background with the given session headers; False if one is running"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return False
+            self.status = {"state": "running", "started_at": time.time(), "full": full}
+            self._thread = threading.Thread(target=self._run_safely, args=(headers, full), name="library-sync", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run_safely(self, headers, full):
+        try:
+            self.run(headers, full)
+        except Exception as e:
+            logger.error(f"Library sync failed: {str(e)}")
+            self.status.update(state="failed", error=str(e), finished_at=time.time())
+
+    def run(self, headers, full=False):
+        """Walk the feed and import the missing clips; returns the run's counts.
+
+        full ignores the saved cursor and walks every page again (clips
+        already in the library are still skipped).
+        """
+        state = {} if full else self._load_state()
+        # Until a walk has reached the last page once, every run walks all of them
+        synced_until = state.get("newest_created_at") if state.get("complete") else None
+        newest = state.get("newest_created_at") or 0.0
+        known = self.library.clip_ids()
+        counts = {"pages": 0, "seen": 0, "new": 0, "downloaded": 0, "failed": 0}
+        self.status["counts"] = counts
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            # Clips recorded by an earlier run whose download failed
+            futures = [] if self.lazy else [pool.submit(self._download, song) for song in self.library.missing_audio(limit=1000)
+                                            if song["job_id"].startswith("suno-")]
+            unfinished = []
+            page = 0
+            while True:
+                clips = self._feed_page(page, headers)
+                counts["pages"] += 1
+                if not clips:
+                    state["complete"] = True
+                    break
+                created = [_timestamp(clip.get("created_at")) for clip in clips]
+                newest = max([newest] + created)
+                # Songs still rendering are skipped now, so the cursor must not pass them
+                unfinished += [stamp for clip, stamp in zip(clips, created) if clip.get("status") not in ("complete", "error")]
+                futures += self._import(clips, known, counts, pool)
+                if synced_until is not None and min(created) <= synced_until:
+                    # The feed reached songs an earlier run already saw; older pages hold nothing new
+                    break
+                page += 1
+
+            for future in as_completed(futures):
+                counts["downloaded" if future.result() else "failed"] += 1
+
+        if unfinished:
+            newest = min(newest, min(unfinished) - 0.001)
+        state.update(newest_created_at=newest, last_run=time.time())
+        self._save_state(state)
+        self.status.update(state="finished", finished_at=time.time())
+        logger.info(f"Library sync finished: {counts['new']} new of {counts['seen']} clips in {counts['pages']} pages, "
+                    f"{counts['downloaded']} downloaded, {counts['failed']} failed")
+        return counts
+
+    def _feed_page(self, page, headers):
+        """Clips on one page of the account's feed, newest first"""
+        url = f"{self.feed_url}{'&' if '?' in self.feed_url else '?'}{urlencode({'page': page})}"
+        request = urllib.request.Request(url, headers={**headers, "Accept": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.downloader.timeout) as response:
+                data = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise SyncError(f"Feed page {page} returned HTTP {e.code}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise SyncError(f"Could not read feed page {page}: {str(e)}")
+        # The v1 feed is a bare list, v2 wraps it
+        return data.get("clips", []) if isinstance(data, dict) else data
+
+    def _import(self, clips, known, counts, pool):
+        """Record the clips missing from the library and queue their downloads"""
+        futures = []
+        for clip in clips:
+            counts["seen"] += 1
+            if clip.get("id") in known or clip.get("status") != "complete" or not clip.get("audio_url"):
+                continue
+            known.add(clip["id"])
+            counts["new"] += 1
+            song = self._song(clip)
+            self.library.add(song)
+            if not self.lazy:
+                futures.append(pool.submit(self._download, song))
+        return futures
+
+    def _song(self, clip):
+        metadata = clip.get("metadata") or {}
+        return {
+            # Songs made outside this tool have no job; the clip id stands in for it
+            "job_id": f"suno-{clip['id']}",
+            "clip_id": clip["id"],
+            "prompt": metadata.get("prompt") or metadata.get("gpt_description_prompt") or "",
+            "style": metadata.get("tags"),
+            "title": clip.get("title"),
+            "instrumental": metadata.get("make_instrumental"),
+            "url": urljoin(self.base_url, f"/song/{clip['id']}"),
+            "audio_url": urljoin(self.base_url, clip["audio_url"]),
+            "created_at": _timestamp(clip.get("created_at")) or time.time(),
+        }
+
+    def _download(self, song):
+        name = safe_filename(song.get("title"))
+        extension = os.path.splitext(urlparse(song["audio_url"]).path)[1] or ".mp3"
+        save_path = self.store.staging_path(f"{name}-{song['clip_id'][:8]}{extension}")
+        try:
+            result = self.downloader.download(song["audio_url"], save_path)
+            entry = self.store.put(save_path, name=name, sha256=result["sha256"], metadata={
+                "job_id": song["job_id"], "prompt": song["prompt"], "style": song["style"],
+                "clip_id": song["clip_id"], "url": song["url"],
+            })
+            self.library.update(song["job_id"], file_path=entry["path"], sha256=entry["sha256"], size=entry["size"])
+            if self.postprocessor:
+                self.postprocessor.submit(
+                    entry["path"], {"job_id": song["job_id"], "sha256": entry["sha256"]},
+                    on_done=lambda done: self.library.update(done["job_id"], duration=done.get("duration")),
+                )
+        except DownloadError as e:
+            logger.warning(f"Sync could not download clip {song['clip_id']}: {str(e)}")
+            return False
+        except Exception as e:
+            # Anything else (disk full, library locked) fails this clip, not the whole sync
+            logger.error(f"Sync could not store clip {song['clip_id']}: {str(e)}")
+            return False
+        return True
@@ -0,0 +1,333 @@
+
+import argparse
+import json
+import logging
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import psutil
+
+from eta import quantile
+
+logger = logging.getLogger(__name__)
+
+MODES = ["generate", "jobs", "batch"]
+
+
+def summarize(values):
+    """Percentiles of a list of durations in seconds"""
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(quantile(values, 0.5), 3),
+        "p95": round(quantile(values, 0.95), 3),
+        "p99": round(quantile(values, 0.99), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def _request(method, url, body=None, timeout=30):
+    """Send a JSON request and return (status, parsed body)"""
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        try:
+            return e.code, json.loads(e.read() or b"null")
+        except ValueError:
+            return e.code, None
+
+
+class ResourceSampler:
+    """Samples RSS, CPU and Chromium process count of the server under test"""
+
+    def __init__(self, pid=None, interval=1.0):
+        self.interval = interval
+        self.process = psutil.Process(pid) if pid else None
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _processes(self):
+        if self.process:
+            try:
+                return [self.process] + self.process.children(recursive=True)
+            except psutil.Error:
+                return []
+        return [p for p in psutil.process_iter() if self._is_chromium(p)]
+
+    @staticmethod
+    def _is_chromium(process):
+        try:
+            return "chrom" in process.name().lower()
+        except psutil.Error:
+            return False
+
+    def _run(self):
+        # The first cpu_percent call only primes the counters
+        for process in self._processes():
+            try:
+                process.cpu_percent(None)
+            except psutil.Error:
+                pass
+        while not self._stop.wait(self.interval):
+            rss = cpu = 0
+            chromium = 0
+            for process in self._processes():
+                try:
+                    rss += process.memory_info().rss
+                    cpu += process.cpu_percent(None)
+                    chromium += self._is_chromium(process)
+                except psutil.Error:
+                    continue
+            self.samples.append({"t": time.time(), "rss_mb": rss / 1048576, "cpu_percent": cpu, "chromium": chromium})
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self):
+        if not self.samples:
+            return None
+        rss = [s["rss_mb"] for s in self.samples]
+        cpu = [s["cpu_percent"] for s in self.samples]
+        return {
+            "scope": f"pid {self.process.pid} and children" if self.process else "all chromium processes",
+            "rss_mb": {"mean": round(sum(rss) / len(rss), 1), "max": round(max(rss), 1)},
+            "cpu_percent": {"mean": round(sum(cpu) / len(cpu), 1), "max": round(max(cpu), 1)},
+            "chromium_processes": {"max": max(s["chromium"] for s in self.samples)},
+            "samples": len(self.samples),
+        }
+
+
+class LoadTest:
+    """Drive the API at a fixed arrival rate (open model) or concurrency (closed model)"""
+
+    def __init__(self, base_url, mode="jobs", rate=None, concurrency=None, duration=60, max_requests=None,
+                 batch_size=2, poll_interval=1.0, timeout=900, payload=None, poisson=True):
+        self.base_url = base_url.rstrip("/")
+        self.mode = mode
+        self.rate = rate
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.payload = payload or {"prompt": "load test song", "style": "ambient", "instrumental": True, "download": True}
+        self.poisson = poisson
+        self.results = []
+        self._lock = threading.Lock()
+        self._issued = 0
+
+    def _payload(self, index):
+        payload = dict(self.payload)
+        payload["title"] = f"loadtest-{index}"
+        return payload
+
+    def _record(self, result):
+        with self._lock:
+            self.results.append(result)
+
+    def _poll(self, job_id, started):
+        """Wait for a queued job and return its final state"""
+        while time.monotonic() - started < self.timeout:
+            status, job = _request("GET", f"{self.base_url}/jobs/{job_id}")
+            if status == 200 and job.get("result"):
+                return job
+            time.sleep(self.poll_interval)
+        return None
+
+    def _finish(self, job_id, submit_latency, started, job=None):
+        job = job or self._poll(job_id, started)
+        total = time.monotonic() - started
+        if job is None:
+            return {"ok": False, "error": "client timeout", "submit": submit_latency, "total": total}
+        result = job.get("result") or {}
+        phases = dict(job.get("stage_durations") or {})
+        phases["queue"] = max(0.0, total - sum(phases.values()))
+        return {
+            "ok": bool(result.get("success")),
+            "error": None if result.get("success") else (result.get("error") or job.get("status")),
+            "submit": submit_latency,
+            "total": total,
+            "phases": phases,
+        }
+
+    def _one(self, index, started):
+        """Issue one arrival and return the results it produced.
+
+        Latencies count from started, the time the arrival was due, so a
+        request that waited for a free thread is not reported as fast.
+        """
+        if self.mode == "generate":
+            status, body = _request("POST", f"{self.base_url}/generate", self._payload(index), timeout=self.timeout)
+            latency = time.monotonic() - started
+            if status != 200:
+                return [{"ok": False, "error": f"HTTP {status}: {(body or {}).get('detail')}", "submit": latency, "total": latency}]
+            _, job = _request("GET", f"{self.base_url}/jobs/{body['job_id']}")
+            return [self._finish(body["job_id"], latency, started, job)]
+
+        if self.mode == "batch":
+            songs = [self._payload(f"{index}-{n}") for n in range(self.batch_size)]
+            status, body = _request("POST", f"{self.base_url}/jobs/batch", {"songs": songs})
+            latency = time.monotonic() - started
+            if status != 202:
+                error = f"HTTP {status}: {(body or {}).get('detail')}"
+                return [{"ok": False, "error": error, "submit": latency, "total": latency}] * len(songs)
+            return [self._finish(job["job_id"], latency, started) for job in body["jobs"]]
+
+        status, body = _request("POST", f"{self.base_url}/jobs", self._payload(index))
+        latency = time.monotonic() - started
+        if status != 202:
+            return [{"ok": False, "error": f"HTTP {status}: {(body or {}).get('detail')}", "submit": latency, "total": latency}]
+        return [self._finish(body["job_id"], latency, started)]
+
+    def _run_one(self, index, started):
+        try:
+            for result in self._one(index, started):
+                self._record(result)
+        except Exception as e:
+            self._record({"ok": False, "error": f"{type(e).__name__}: {str(e)}", "submit": None, "total": None})
+
+    def _more(self, deadline):
+        if self.max_requests is not None and self._issued >= self.max_requests:
+            return False
+        return time.monotonic() < deadline
+
+    def run(self):
+        """Run the test and return the elapsed wall time"""
+        started = time.monotonic()
+        deadline = started + self.duration
+        if self.rate:
+            # Open model: arrivals do not wait for earlier requests to finish
+            with ThreadPoolExecutor(max_workers=256) as pool:
+                next_at = started
+                while True:
+                    with self._lock:
+                        if not self._more(deadline):
+                            break
+                        index = self._issued
+                        self._issued += 1
+                    pool.submit(self._run_one, index, next_at)
+                    gap = random.expovariate(self.rate) if self.poisson else 1 / self.rate
+                    next_at += gap
+                    time.sleep(max(0, next_at - time.monotonic()))
+        else:
+            # Closed model: each worker sends its next request when the last one finished
+            def worker():
+                while True:
+                    with self._lock:
+                        if not self._more(deadline):
+                            return
+                        index = self._issued
+                        self._issued += 1
+                    self._run_one(index, time.monotonic())
+            threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency or 1)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return time.monotonic() - started
+
+    def report(self, elapsed):
+        results = list(self.results)
+        succeeded = [r for r in results if r["ok"]]
+        errors = {}
+        for result in results:
+            if not result["ok"]:
+                errors[result["error"]] = errors.get(result["error"], 0) + 1
+        phases = {}
+        for result in succeeded:
+            for phase, seconds in result.get("phases", {}).items():
+                phases.setdefault(phase, []).append(seconds)
+        return {
+            "requests": len(results),
+            "succeeded": len(succeeded),
+            "failed": len(results) - len(succeeded),
+            "error_rate": round((len(results) - len(succeeded)) / len(results), 4) if results else 0.0,
+            "errors": errors,
+            "elapsed_seconds": round(elapsed, 1),
+            "throughput_per_minute": round(len(succeeded) / elapsed * 60, 3) if elapsed else 0.0,
+            "latency": {
+                "submit": summarize([r["submit"] for r in results if r.get("submit") is not None]),
+                "total": summarize([r["total"] for r in succeeded]),
+                "phases": {phase: summarize(values) for phase, values in sorted(phases.items())},
+            },
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Suno automation API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="API server to drive")
+    parser.add_argument("--mode", choices=MODES, default="jobs", help="endpoint to exercise")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--rate", type=float, help="arrivals per second (open model)")
+    load.add_argument("--concurrency", type=int, default=1, help="requests in flight (closed model)")
+    parser.add_argument("--duration", type=float, default=300, help="seconds to keep issuing requests")
+    parser.add_argument("--requests", type=int, help="stop after this many arrivals")
+    parser.add_argument("--batch-size", type=int, default=2, help="songs per batch in batch mode")
+    parser.add_argument("--constant", action="store_true", help="evenly spaced instead of Poisson arrivals")
+    parser.add_argument("--timeout", type=float, default=900, help="give up on a job after this many seconds")
+    parser.add_argument("--server-pid", type=int, help="pid of main.py, to sample its RSS, CPU and Chromium children")
+    parser.add_argument("--output", default=f"loadtest_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    test = LoadTest(
+        args.base_url, mode=args.mode, rate=args.rate,
+        concurrency=None if args.rate else args.concurrency,
+        duration=args.duration, max_requests=args.requests, batch_size=args.batch_size,
+        timeout=args.timeout, poisson=not args.constant,
+    )
+    sampler = ResourceSampler(args.server_pid)
+    logger.info(f"Load testing {args.base_url} ({args.mode}, {'rate ' + str(args.rate) + '/s' if args.rate else 'concurrency ' + str(args.concurrency)})")
+    sampler.start()
+    try:
+        elapsed = test.run()
+    finally:
+        sampler.stop()
+
+    report = {
+        "started_at": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": test.report(elapsed),
+        "resources": sampler.report(),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    results = report["results"]
+    print(f"{results['succeeded']}/{results['requests']} succeeded, error rate {results['error_rate']:.1%}, "
+          f"{results['throughput_per_minute']} songs/min")
+    if results["latency"]["total"]:
+        total = results["latency"]["total"]
+        print(f"Latency p50 {total['p50']}s  p95 {total['p95']}s  p99 {total['p99']}s")
+    print(f"Report written to {args.output}")
+    return 0 if results["succeeded"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,19 +5,20 @@ import logging
 import threading
 import time
 import uvicorn
-from api_server import app
+from api_server import app, heap_tracker
 from playwright_automation import SunoAutomation
+from jobs import JobManager, JobRunner
+from eta import EtaEstimator
+from adaptive_timeouts import AdaptiveTimeouts
+from har_session import HarSession
+from downloader import Downloader
+from storage import SongStore
+from lazy_audio import AudioFetcher
+from library_sync import LibrarySync
+from housekeeping import Housekeeper, configure_logging
+import metrics
 from config import get_config
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("suno_automation.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
 def start_api_server():
@@ -31,11 +32,22 @@ def start_api_server():
         print(f"Error starting API server: {str(e)}")
 
 if __name__ == "__main__":
+    # Only here: post-processing workers re-import this module and must not open the log file
+    configure_logging(sys.stdout)
     logger.info("Starting Suno.ai Automation with Playwright")
     
     # Load configuration
     config = get_config()
     
+    # Shared stage runner with retry policy and dead-letter queue
+    store = SongStore.from_config(config)
+    job_runner = JobRunner.from_config(config, store)
+    job_manager = JobManager.from_config(config)
+    metrics.register_job_manager(job_manager)
+    timeouts = AdaptiveTimeouts.from_config(config)
+    har = HarSession.from_config(config)
+    downloader = Downloader.from_config(config)
+    
     # Create automation instance
     try:
         if config.get("USE_CHROME_PROFILE", True):
@@ -52,27 +64,55 @@ if __name__ == "__main__":
                     automation = SunoAutomation(
                         email=config.get("EMAIL"),
                         password=config.get("PASSWORD"),
-                        headless=config.get("HEADLESS", "False").lower() == "true"
+                        headless=config.get("HEADLESS", "False").lower() == "true",
+                        job_runner=job_runner,
+                        timeouts=timeouts,
+                        base_url=config.get("SUNO_BASE_URL"),
+                        har=har,
+                        downloader=downloader,
+                        store=store,
+                        debug_dir=config.get("DEBUG_DIR")
                     )
                 else:
                     # Try with Chrome profile anyway (might be a new profile)
                     automation = SunoAutomation(
                         headless=config.get("HEADLESS", "False").lower() == "true",
                         use_chrome_profile=True,
-                        chrome_user_data_dir=chrome_user_data_dir
+                        chrome_user_data_dir=chrome_user_data_dir,
+                        job_runner=job_runner,
+                        timeouts=timeouts,
+                        base_url=config.get("SUNO_BASE_URL"),
+                        har=har,
+                        downloader=downloader,
+                        store=store,
+                        debug_dir=config.get("DEBUG_DIR")
                     )
             else:
                 automation = SunoAutomation(
                     headless=config.get("HEADLESS", "False").lower() == "true",
                     use_chrome_profile=True,
-                    chrome_user_data_dir=chrome_user_data_dir
+                    chrome_user_data_dir=chrome_user_data_dir,
+                    job_runner=job_runner,
+                    timeouts=timeouts,
+                    base_url=config.get("SUNO_BASE_URL"),
+                    har=har,
+                    downloader=downloader,
+                    store=store,
+                    debug_dir=config.get("DEBUG_DIR")
                 )
         elif config.get("EMAIL") and config.get("PASSWORD"):
             logger.info("Using email/password for authentication")
             automation = SunoAutomation(
                 email=config.get("EMAIL"),
                 password=config.get("PASSWORD"),
-                headless=config.get("HEADLESS", "False").lower() == "true"
+                headless=config.get("HEADLESS", "False").lower() == "true",
+                job_runner=job_runner,
+                timeouts=timeouts,
+                base_url=config.get("SUNO_BASE_URL"),
+                har=har,
+                downloader=downloader,
+                store=store,
+                debug_dir=config.get("DEBUG_DIR")
             )
         else:
             logger.error("Neither Chrome profile nor email/password authentication information provided")
@@ -87,7 +127,14 @@ if __name__ == "__main__":
             automation = SunoAutomation(
                 headless=config.get("HEADLESS", "False").lower() == "true",
                 use_chrome_profile=True,
-                chrome_user_data_dir=config.get("CHROME_USER_DATA_DIR")
+                chrome_user_data_dir=config.get("CHROME_USER_DATA_DIR"),
+                job_runner=job_runner,
+                timeouts=timeouts,
+                base_url=config.get("SUNO_BASE_URL"),
+                har=har,
+                downloader=downloader,
+                store=store,
+                debug_dir=config.get("DEBUG_DIR")
             )
     
         # Check if automation initialized correctly
@@ -98,8 +145,24 @@ if __name__ == "__main__":
         else:
             logger.info("Playwright automation initialized successfully")
     
-        # Store automation instance in app state for API access
+        # Store automation instance and job queue in app state for API access
         app.state.automation = automation
+        app.state.job_manager = job_manager
+        app.state.tracer = job_runner.tracer
+        app.state.eta = EtaEstimator(job_runner.history)
+        app.state.library = job_runner.library
+        if job_runner.library:
+            app.state.fetcher = AudioFetcher.from_config(config, job_runner.library, store, job_runner.postprocessor)
+            if job_manager.lazy_download:
+                app.state.fetcher.start()
+            app.state.sync = LibrarySync.from_config(config, job_runner.library, store, downloader, job_runner.postprocessor)
+        app.state.housekeeper = Housekeeper.from_config(config, store, job_runner.library)
+        app.state.housekeeper.start()
+        app.state.debug_token = config.get("DEBUG_TOKEN")
+        if config.get("DEBUG_TRACEMALLOC"):
+            # Trace from startup so /debug/heap also sees early allocations
+            heap_tracker.frames = config.get("DEBUG_TRACEMALLOC_FRAMES", 1)
+            heap_tracker.start()
         
         # Start API server in a separate thread
         server_thread = threading.Thread(target=start_api_server, daemon=True)
@@ -111,12 +174,14 @@ if __name__ == "__main__":
         print("Press Ctrl+C to exit")
         
         try:
-            # Keep main thread alive
-            while True:
-                time.sleep(1)
+            # Playwright's sync API is bound to the thread that started it,
+            # so the main thread executes the queued jobs
+            job_manager.serve(automation)
         except KeyboardInterrupt:
             logger.info("Shutting down...")
             automation.close()
+            if job_runner.postprocessor:
+                job_runner.postprocessor.close()
             sys.exit(0)
     except Exception as e:
         logger.error(f"Failed to initialize automation: {str(e)}")
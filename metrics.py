@@ -0,0 +1,187 @@
+
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-second selector work up to multi-minute renders
+PHASE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 240, 300, 450, 600)
+
+PHASES = ["login", "navigation", "form_fill", "generation_start", "generation_complete", "download"]
+
+PHASE_DURATION = Histogram(
+    "suno_phase_duration_seconds",
+    "Wall time spent in each phase of a song job",
+    ["phase"],
+    buckets=PHASE_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "suno_stage_duration_seconds",
+    "Wall time of each job stage attempt",
+    ["stage", "outcome"],
+    buckets=PHASE_BUCKETS,
+)
+JOB_OUTCOMES = Counter(
+    "suno_jobs_total",
+    "Finished jobs by outcome",
+    ["outcome"],
+)
+JOB_FAILURES = Counter(
+    "suno_job_failures_total",
+    "Failed jobs by stage and failure reason",
+    ["stage", "reason"],
+)
+POSTPROCESS_DURATION = Histogram(
+    "suno_postprocess_duration_seconds",
+    "Time of each post-processing stage attempt on a downloaded song",
+    ["stage", "outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+POSTPROCESS_PENDING = Gauge(
+    "suno_postprocess_pending",
+    "Downloaded songs queued or running in the post-processing pipeline",
+)
+DISK_USAGE = Gauge(
+    "suno_disk_usage_bytes",
+    "Bytes on disk per housekeeping category",
+    ["category"],
+)
+DISK_EVICTED = Counter(
+    "suno_disk_evicted_files_total",
+    "Files deleted by housekeeping to stay within quota or age limits",
+    ["category"],
+)
+DISK_FREED = Counter(
+    "suno_disk_freed_bytes_total",
+    "Bytes freed by housekeeping",
+    ["category"],
+)
+DOWNLOADED_BYTES = Counter(
+    "suno_downloaded_bytes_total",
+    "Bytes of audio written to disk",
+)
+
+# Ordered: the first matching fragment decides the reason label
+FAILURE_REASONS = [
+    ("cancelled", "cancelled"),
+    ("deadline", "deadline"),
+    ("captcha", "captcha"),
+    ("credits", "credits"),
+    ("circuit breaker", "circuit_open"),
+    ("disabled", "create_disabled"),
+    ("could not find", "selector_missing"),
+    ("not found", "selector_missing"),
+    ("timeout", "timeout"),
+    ("timed out", "timeout"),
+    ("login", "login"),
+    ("suno error", "suno_error"),
+    ("net::", "network"),
+]
+
+
+def failure_reason(error):
+    """Map an error message to a low-cardinality reason label"""
+    message = (error or "").lower()
+    for fragment, reason in FAILURE_REASONS:
+        if fragment in message:
+            return reason
+    return "other"
+
+
+@contextmanager
+def phase_timer(phase):
+    """Time a block of code into the phase histogram"""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        PHASE_DURATION.labels(phase=phase).observe(time.monotonic() - start)
+
+
+def observe_phase(phase, seconds):
+    PHASE_DURATION.labels(phase=phase).observe(seconds)
+
+
+def observe_stage(stage, outcome, seconds):
+    STAGE_DURATION.labels(stage=stage, outcome=outcome).observe(seconds)
+
+
+def observe_job(job):
+    """Count a finished job by outcome and, for failures, by reason"""
+    JOB_OUTCOMES.labels(outcome=job.status).inc()
+    if job.status != "succeeded":
+        JOB_FAILURES.labels(stage=job.error_stage or "admission", reason=failure_reason(job.error)).inc()
+
+
+def observe_download(num_bytes):
+    DOWNLOADED_BYTES.inc(num_bytes)
+
+
+def observe_postprocess(stage, outcome, seconds):
+    POSTPROCESS_DURATION.labels(stage=stage, outcome=outcome).observe(seconds)
+
+
+def set_postprocess_pending(count):
+    POSTPROCESS_PENDING.set(count)
+
+
+class JobManagerCollector:
+    """Exports queue, pool, circuit breaker and credit state at scrape time"""
+
+    BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, job_manager):
+        self.job_manager = job_manager
+
+    def collect(self):
+        pool = self.job_manager.pool_status()
+        yield GaugeMetricFamily("suno_queue_depth", "Jobs waiting for a browser slot", value=self.job_manager.queue_depth())
+        yield GaugeMetricFamily("suno_pool_slots", "Browser worker slots", value=pool["slots"])
+        yield GaugeMetricFamily("suno_pool_busy", "Browser worker slots running a job", value=pool["busy"])
+        utilization = pool["busy"] / pool["slots"] if pool["slots"] else 0
+        yield GaugeMetricFamily("suno_pool_utilization", "Fraction of busy browser slots", value=utilization)
+
+        breaker_state = GaugeMetricFamily(
+            "suno_circuit_breaker_state",
+            "Circuit breaker state per account (0=closed, 1=half_open, 2=open)",
+            labels=["account"],
+        )
+        breaker_failure_rate = GaugeMetricFamily(
+            "suno_circuit_breaker_failure_rate",
+            "Failure rate over the breaker window per account",
+            labels=["account"],
+        )
+        for account, status in self.job_manager.breakers.status().items():
+            breaker_state.add_metric([account], self.BREAKER_STATES.get(status["state"], 0))
+            breaker_failure_rate.add_metric([account], status["failure_rate"])
+        yield breaker_state
+        yield breaker_failure_rate
+
+        credits = GaugeMetricFamily("suno_credits_remaining", "Cached remaining credits per account", labels=["account"])
+        for account, remaining in self.job_manager.credits.status()["accounts"].items():
+            if remaining is not None:
+                credits.add_metric([account], remaining)
+        yield credits
+
+
+def set_disk_usage(category, num_bytes):
+    DISK_USAGE.labels(category=category).set(num_bytes)
+
+
+def observe_eviction(category, files, num_bytes):
+    DISK_EVICTED.labels(category=category).inc(files)
+    DISK_FREED.labels(category=category).inc(num_bytes)
+
+
+def register_job_manager(job_manager):
+    """Expose a job manager's live state on /metrics"""
+    REGISTRY.register(JobManagerCollector(job_manager))
+
+
+def render():
+    """Return the metrics payload and its content type"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
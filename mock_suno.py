@@ -0,0 +1,371 @@
+
+import argparse
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# One silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, no padding.
+# 144 * 128000 / 44100 = 417 bytes, about 26 ms of audio.
+MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC4])
+MP3_FRAME_SIZE = 417
+MP3_FRAMES_PER_SECOND = 44100 / 1152
+
+
+def silent_mp3(seconds):
+    """A valid, silent MP3 of roughly the given duration"""
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    return frame * max(1, int(seconds * MP3_FRAMES_PER_SECOND))
+
+
+class MockSettings:
+    """Behaviour of the mock site, adjustable at runtime through /mock/settings"""
+
+    FIELDS = ["render_seconds", "render_jitter", "latency_ms", "error_rate", "captcha_rate",
+              "credits", "cost_per_job", "audio_seconds"]
+
+    def __init__(self, render_seconds=20.0, render_jitter=0.25, latency_ms=0, error_rate=0.0,
+                 captcha_rate=0.0, credits=500, cost_per_job=10, audio_seconds=10):
+        self.render_seconds = render_seconds
+        self.render_jitter = render_jitter
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.captcha_rate = captcha_rate
+        self.credits = credits
+        self.cost_per_job = cost_per_job
+        self.audio_seconds = audio_seconds
+
+    @classmethod
+    def from_config(cls, config):
+        """Build settings from get_config values"""
+        return cls(
+            render_seconds=config.get("MOCK_RENDER_SECONDS", 20.0),
+            latency_ms=config.get("MOCK_LATENCY_MS", 0),
+            error_rate=config.get("MOCK_ERROR_RATE", 0.0),
+            captcha_rate=config.get("MOCK_CAPTCHA_RATE", 0.0),
+            credits=config.get("MOCK_CREDITS", 500),
+        )
+
+    def update(self, values):
+        for field in self.FIELDS:
+            if field in values:
+                setattr(self, field, type(getattr(self, field))(values[field]))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+CREATE_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<title>Suno (mock)</title>
+<style>
+  body { font-family: sans-serif; margin: 2em; max-width: 900px; }
+  textarea { display: block; width: 100%; margin-bottom: 1em; }
+  .switch { display: inline-block; width: 36px; height: 20px; background: #ccc; border-radius: 10px; cursor: pointer; }
+  .switch span { display: block; width: 16px; height: 16px; margin: 2px; background: #fff; border-radius: 8px; transition: transform .1s; }
+  .translate-x-4 { transform: translateX(16px); }
+  .clip { border: 1px solid #ddd; padding: .5em; margin: .5em 0; }
+  [role=alert] { background: #fdd; padding: .5em; margin: .5em 0; }
+</style>
+</head>
+<body>
+  <h1>Create</h1>
+  <div id="credits"></div>
+  <textarea placeholder="Enter your lyrics or a song description" rows="4"></textarea>
+  <textarea placeholder="Enter style of music" rows="2"></textarea>
+  <textarea placeholder="Enter a title" rows="1"></textarea>
+  <label>Instrumental
+    <div aria-label="Instrumental" role="switch" class="switch"><span class="translate-x-0"></span></div>
+  </label>
+  <p><button class="buttonAnimate" id="create">Create</button></p>
+  <div id="toasts"></div>
+  <div id="feed"></div>
+<script>
+  const $ = (selector) => document.querySelector(selector);
+  const toggle = $('[aria-label="Instrumental"]');
+  toggle.addEventListener('click', () => {
+    const knob = toggle.querySelector('span');
+    knob.className = knob.className.includes('translate-x-4') ? 'translate-x-0' : 'translate-x-4';
+  });
+
+  const toast = (text) => {
+    const el = document.createElement('div');
+    el.setAttribute('role', 'alert');
+    el.textContent = text;
+    $('#toasts').appendChild(el);
+    setTimeout(() => el.remove(), 8000);
+  };
+
+  const showCredits = (credits, cost) => {
+    $('#credits').textContent = credits + ' credits left';
+    if (credits < cost) $('#create').setAttribute('disabled', 'disabled');
+  };
+
+  const rendered = {};
+  const download = (clip) => {
+    const link = document.createElement('a');
+    link.href = clip.audio_url;
+    link.download = (clip.title || clip.id) + '.mp3';
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+  };
+  const renderClip = (clip) => {
+    let card = document.querySelector('[data-clip-id="' + clip.id + '"]');
+    if (!card) {
+      card = document.createElement('div');
+      card.className = 'clip';
+      card.setAttribute('data-clip-id', clip.id);
+      const link = document.createElement('a');
+      link.href = '/song/' + clip.id;
+      link.textContent = clip.title || clip.id;
+      card.appendChild(link);
+      const state = document.createElement('span');
+      state.className = 'state';
+      state.textContent = ' Generating...';
+      card.appendChild(state);
+      $('#feed').prepend(card);
+    }
+    if (clip.status === 'complete' && rendered[clip.id] !== 'complete') {
+      card.querySelector('.state').textContent = ' Ready';
+      const audio = document.createElement('audio');
+      audio.src = clip.audio_url;
+      card.appendChild(audio);
+      const play = document.createElement('button');
+      play.setAttribute('aria-label', 'Play');
+      play.textContent = 'Play';
+      play.addEventListener('click', () => audio.play());
+      card.appendChild(play);
+      const button = document.createElement('button');
+      button.textContent = 'Download';
+      button.addEventListener('click', () => download(clip));
+      card.appendChild(button);
+    }
+    rendered[clip.id] = clip.status;
+  };
+
+  const poll = async () => {
+    try {
+      const response = await fetch('/api/feed');
+      const feed = await response.json();
+      feed.clips.forEach(renderClip);
+    } catch (e) {}
+    setTimeout(poll, 1000);
+  };
+
+  $('#create').addEventListener('click', async () => {
+    const textareas = document.querySelectorAll('textarea');
+    const body = {
+      prompt: textareas[0].value,
+      tags: textareas[1].value,
+      title: textareas[2].value,
+      make_instrumental: toggle.querySelector('span').className.includes('translate-x-4'),
+    };
+    const response = await fetch('/api/generate', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify(body),
+    });
+    const data = await response.json();
+    if (response.status === 403 && data.captcha) {
+      const captcha = document.createElement('div');
+      captcha.className = 'h-captcha';
+      captcha.textContent = 'Please verify you are human';
+      document.body.appendChild(captcha);
+      return;
+    }
+    if (!response.ok) {
+      toast(data.detail || 'Something went wrong');
+      return;
+    }
+    showCredits(data.total_credits_left, data.cost_per_job);
+    data.clips.forEach(renderClip);
+  });
+
+  fetch('/api/billing/info').then((r) => r.json()).then((data) => showCredits(data.total_credits_left, data.cost_per_job));
+  poll();
+</script>
+</body>
+</html>
+"""
+
+SONG_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>%(title)s</title></head>
+<body>
+  <div data-clip-id="%(id)s">
+    <h1>%(title)s</h1>
+    <audio src="%(audio_url)s" controls></audio>
+    <button aria-label="Play" onclick="document.querySelector('audio').play()">Play</button>
+    <a href="%(audio_url)s" download="%(filename)s"><button>Download</button></a>
+  </div>
+</body>
+</html>
+"""
+
+
+def create_app(settings=None):
+    """Build the mock Suno application"""
+    settings = settings or MockSettings()
+    app = FastAPI(title="Mock Suno")
+    app.state.settings = settings
+    app.state.clips = {}
+    app.state.lock = threading.Lock()
+
+    @app.middleware("http")
+    async def inject_latency(request: Request, call_next):
+        if settings.latency_ms:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * settings.latency_ms / 1000)
+        return await call_next(request)
+
+    def clip_view(clip):
+        complete = time.time() >= clip["ready_at"]
+        return {
+            "id": clip["id"],
+            "title": clip["title"],
+            "status": "complete" if complete else "streaming",
+            "audio_url": f"/api/audio/{clip['id']}.mp3" if complete else None,
+            "created_at": clip["created_at"],
+            "metadata": {"prompt": clip["prompt"], "tags": clip["tags"], "make_instrumental": clip["instrumental"]},
+        }
+
+    @app.get("/")
+    async def root():
+        return RedirectResponse("/create?wid=default")
+
+    @app.get("/create", response_class=HTMLResponse)
+    async def create_page():
+        return CREATE_PAGE
+
+    @app.get("/song/{clip_id}", response_class=HTMLResponse)
+    async def song_page(clip_id: str):
+        clip = app.state.clips.get(clip_id)
+        if not clip:
+            raise HTTPException(status_code=404, detail="Song not found")
+        view = clip_view(clip)
+        return SONG_PAGE % {
+            "id": clip_id,
+            "title": view["title"] or clip_id,
+            "audio_url": view["audio_url"] or "",
+            "filename": f"{view['title'] or clip_id}.mp3",
+        }
+
+    @app.get("/api/billing/info")
+    async def billing_info():
+        return {"total_credits_left": settings.credits, "cost_per_job": settings.cost_per_job}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        if random.random() < settings.captcha_rate:
+            return JSONResponse(status_code=403, content={"captcha": True, "detail": "Captcha required"})
+        if settings.credits < settings.cost_per_job:
+            return JSONResponse(status_code=402, content={"detail": "Out of credits", "total_credits_left": settings.credits})
+        if random.random() < settings.error_rate:
+            return JSONResponse(status_code=500, content={"detail": "Something went wrong, please try again"})
+
+        now = time.time()
+        clips = []
+        with app.state.lock:
+            settings.credits -= settings.cost_per_job
+            # Like Suno, every request renders two variations
+            for variation in range(2):
+                render = settings.render_seconds * random.uniform(1 - settings.render_jitter, 1 + settings.render_jitter)
+                clip = {
+                    "id": uuid.uuid4().hex,
+                    "title": body.get("title") or "Untitled",
+                    "prompt": body.get("prompt", ""),
+                    "tags": body.get("tags", ""),
+                    "instrumental": bool(body.get("make_instrumental")),
+                    "created_at": now,
+                    "ready_at": now + render,
+                }
+                app.state.clips[clip["id"]] = clip
+                clips.append(clip_view(clip))
+        logger.info(f"Mock generation started: {[clip['id'] for clip in clips]}")
+        return {"clips": clips, "total_credits_left": settings.credits, "cost_per_job": settings.cost_per_job}
+
+    @app.get("/api/feed")
+    async def feed(page: int = None):
+        clips = sorted(app.state.clips.values(), key=lambda clip: clip["created_at"])
+        if page is None:
+            # What the create page polls: the latest clips, oldest first
+            return {"clips": [clip_view(clip) for clip in clips[-20:]]}
+        # The account library: pages of 20, newest first
+        clips = clips[::-1][page * 20:(page + 1) * 20]
+        return {"clips": [clip_view(clip) for clip in clips], "has_more": len(app.state.clips) > (page + 1) * 20}
+
+    @app.get("/api/audio/{clip_id}.mp3")
+    async def audio(clip_id: str, request: Request):
+        clip = app.state.clips.get(clip_id)
+        if not clip or time.time() < clip["ready_at"]:
+            raise HTTPException(status_code=404, detail="Audio not ready")
+        content = silent_mp3(settings.audio_seconds)
+        headers = {
+            "Content-Disposition": f'attachment; filename="{clip["title"]}.mp3"',
+            "Accept-Ranges": "bytes",
+            "ETag": f'"{clip_id}-{len(content)}"',
+        }
+        # Single byte ranges, like the CDN serving the real audio
+        match = re.match(r"bytes=(\d+)-(\d*)$", request.headers.get("range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(content) - 1, len(content) - 1)
+            if start > end:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{len(content)}"})
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+            return Response(content=content[start:end + 1], status_code=206, media_type="audio/mpeg", headers=headers)
+        return Response(content=content, media_type="audio/mpeg", headers=headers)
+
+    @app.get("/mock/settings")
+    async def get_settings():
+        return settings.to_dict()
+
+    @app.post("/mock/settings")
+    async def update_settings(request: Request):
+        settings.update(await request.json())
+        logger.info(f"Mock settings updated: {settings.to_dict()}")
+        return settings.to_dict()
+
+    @app.post("/mock/reset")
+    async def reset():
+        with app.state.lock:
+            app.state.clips.clear()
+        return {"clips": 0}
+
+    return app
+
+
+def start_in_thread(settings=None, host="127.0.0.1", port=8100):
+    """Serve the mock site from a daemon thread and return the uvicorn server"""
+    server = uvicorn.Server(uvicorn.Config(create_app(settings), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    logger.info(f"Mock Suno site running at http://{host}:{port}")
+    return server
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Local stand-in for suno.com")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    settings = MockSettings.from_config(get_config())
+    print(f"Mock Suno site at http://{args.host}:{args.port} - set SUNO_BASE_URL to use it")
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="info")
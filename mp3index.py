@@ -0,0 +1,267 @@
+
+import bisect
+import logging
+import os
+import struct
+from array import array
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+# Sidecar layout: this header, then one little-endian uint32 byte offset per seek step
+SIDECAR_MAGIC = b"MP3I"
+SIDECAR_VERSION = 1
+SIDECAR_HEADER = struct.Struct("<4sBBHQIIIdIII")
+FLAG_TRUNCATED = 1
+FLAG_VBR = 2
+
+# Seconds between seek table entries: a 4 minute song needs under 1 KB
+SEEK_STEP = 1.0
+
+# Trailing tags that are not audio and not corruption either
+TAIL_TAGS = (b"TAG", b"APETAGEX", b"LYRICSBEGIN")
+
+
+def parse_frame_header(header):
+    """(version, sample_rate, frame_bytes, samples, bitrate) of an MPEG Layer III frame header, or None"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    value = int.from_bytes(header[:4], "big")
+    version = {3: 1, 2: 2, 0: 2.5}.get((value >> 19) & 3)
+    layer = (value >> 17) & 3
+    bitrate_index = (value >> 12) & 15
+    rate_index = (value >> 10) & 3
+    if version is None or layer != 1 or bitrate_index in (0, 15) or rate_index == 3 or value & 3 == 2:
+        return None
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    bitrate = MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    padding = (value >> 9) & 1
+    if version == 1:
+        return version, sample_rate, 144 * bitrate // sample_rate + padding, 1152, bitrate
+    return version, sample_rate, 72 * bitrate // sample_rate + padding, 576, bitrate
+
+
+def _xing_frames(frame, version):
+    """Frame count from a Xing/Info header in the first frame, or None"""
+    mono = (frame[3] >> 6) & 3 == 3
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    tag = frame[4 + side_info:4 + side_info + 12]
+    if tag[:4] in (b"Xing", b"Info") and len(tag) == 12 and int.from_bytes(tag[4:8], "big") & 1:
+        return int.from_bytes(tag[8:12], "big")
+    return None
+
+
+def _id3v2_size(head):
+    if head[:3] != b"ID3" or len(head) < 10:
+        return 0
+    # Size is stored as four 7-bit bytes; a footer adds another 10
+    size = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+    return size + 10 if head[5] & 0x10 else size
+
+
+class FrameIndex:
+    """What a streaming pass over the MP3 frame headers tells about a file.
+
+    Exact duration and average bitrate, where the audio starts and ends, and
+    whether the file is truncated (the last frame or the Xing frame count
+    runs past the end) or has junk between frames. The seek table holds the
+    byte offset of the first frame at every SEEK_STEP seconds, which turns a
+    time into a Range request without touching the file. Nothing is decoded.
+    """
+
+    def __init__(self, file_size=0, sample_rate=0, frames=0, bitrate=0, duration=0.0, audio_start=0,
+                 audio_end=0, corrupt_bytes=0, truncated=False, vbr=False, offsets=None, seek_step=SEEK_STEP):
+        self.file_size = file_size
+        self.sample_rate = sample_rate
+        self.frames = frames
+        self.bitrate = bitrate
+        self.duration = duration
+        self.audio_start = audio_start
+        self.audio_end = audio_end
+        self.corrupt_bytes = corrupt_bytes
+        self.truncated = truncated
+        self.vbr = vbr
+        self.offsets = offsets if offsets is not None else array("I")
+        self.seek_step = seek_step
+
+    @property
+    def valid(self):
+        """Complete, in sync from start to end, and actually MP3"""
+        return self.frames > 0 and not self.truncated and self.corrupt_bytes == 0
+
+    @classmethod
+    def scan(cls, path, seek_step=SEEK_STEP):
+        """Walk the frame headers of path from one to the next, reading it once in blocks"""
+        index = cls(seek_step=seek_step)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            start = _id3v2_size(f.read(10))
+            end = size
+            if size >= 128:
+                f.seek(size - 128)
+                if f.read(3) == b"TAG":
+                    end -= 128
+            index.file_size = size
+            index.audio_start = start
+
+            f.seek(start)
+            buffer = b""
+            buffer_start = start
+            position = start
+            stream = None  # (version, sample_rate) of the first frame; later frames must match
+            samples_total = 0
+            bitrates = set()
+            bits = 0
+            expected_frames = None
+
+            while position + 4 <= end:
+                if position + 4 > buffer_start + len(buffer):
+                    if position > buffer_start + len(buffer):
+                        # The last frame ended past the block: continue reading from there
+                        f.seek(position)
+                        buffer = b""
+                    buffer = buffer[position - buffer_start:] + f.read(BLOCK_SIZE)
+                    buffer_start = position
+                    if position + 4 > buffer_start + len(buffer):
+                        break
+                local = position - buffer_start
+                frame = parse_frame_header(buffer[local:local + 4])
+                if frame is None or (stream and frame[:2] != stream):
+                    if any(buffer[local:local + len(tag)] == tag for tag in TAIL_TAGS):
+                        break
+                    # Lost sync: skip to the next byte that can start a frame
+                    following = buffer.find(b"\xff", local + 1)
+                    skip = (following if following >= 0 else len(buffer)) - local
+                    index.corrupt_bytes += skip
+                    position += skip
+                    continue
+
+                version, sample_rate, frame_bytes, samples, bitrate = frame
+                if position + frame_bytes > end:
+                    index.truncated = True
+                    break
+                if stream is None:
+                    stream = (version, sample_rate)
+                    index.sample_rate = sample_rate
+                    if local + frame_bytes > len(buffer):
+                        buffer = buffer[local:] + f.read(BLOCK_SIZE)
+                        buffer_start = position
+                        local = 0
+                    expected_frames = _xing_frames(buffer[local:local + frame_bytes], version)
+                    if expected_frames is not None:
+                        # The Xing frame describes the stream and holds no audio
+                        position += frame_bytes
+                        index.audio_start = position
+                        continue
+                    index.audio_start = position
+
+                while samples_total >= len(index.offsets) * seek_step * sample_rate:
+                    index.offsets.append(position)
+                samples_total += samples
+                bits += frame_bytes * 8
+                bitrates.add(bitrate)
+                index.frames += 1
+                position += frame_bytes
+
+        index.audio_end = position
+        if index.corrupt_bytes and index.frames:
+            logger.warning(f"{path}: {index.corrupt_bytes} bytes outside of MP3 frames")
+        if expected_frames is not None and index.frames < expected_frames:
+            index.truncated = True
+        if index.frames:
+            index.duration = samples_total / index.sample_rate
+            index.bitrate = int(bits / index.duration)
+            index.vbr = len(bitrates) > 1
+        return index
+
+    def offset_at(self, seconds):
+        """Byte offset of the frame playing at the given time, to the seek step"""
+        if not self.offsets:
+            return self.audio_start
+        return self.offsets[max(0, min(int(seconds / self.seek_step), len(self.offsets) - 1))]
+
+    def time_at(self, offset):
+        """Time of the seek step containing a byte offset"""
+        return max(0, bisect.bisect_right(self.offsets, offset) - 1) * self.seek_step
+
+    def byte_range(self, start_seconds, end_seconds=None):
+        """Inclusive byte range covering the audio between two times"""
+        start = self.offset_at(start_seconds)
+        if end_seconds is None or int(end_seconds / self.seek_step) + 1 >= len(self.offsets):
+            return start, self.audio_end - 1
+        return start, self.offsets[int(end_seconds / self.seek_step) + 1] - 1
+
+    def as_dict(self):
+        return {
+            "duration": round(self.duration, 3),
+            "bitrate": self.bitrate,
+            "sample_rate": self.sample_rate,
+            "frames": self.frames,
+            "vbr": self.vbr,
+            "truncated": self.truncated,
+            "corrupt_bytes": self.corrupt_bytes,
+            "valid": self.valid,
+        }
+
+    def save(self, path):
+        """Write the compact sidecar, atomically"""
+        flags = (FLAG_TRUNCATED if self.truncated else 0) | (FLAG_VBR if self.vbr else 0)
+        header = SIDECAR_HEADER.pack(
+            SIDECAR_MAGIC, SIDECAR_VERSION, flags, int(self.seek_step * 1000), self.file_size, self.sample_rate,
+            self.frames, self.bitrate, self.duration, self.audio_start, self.audio_end, self.corrupt_bytes,
+        )
+        offsets = array("I", self.offsets)
+        if struct.pack("=I", 1) != struct.pack("<I", 1):
+            offsets.byteswap()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(offsets.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a sidecar; ValueError if it is not one"""
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < SIDECAR_HEADER.size:
+            raise ValueError(f"{path} is not a frame index")
+        (magic, version, flags, step_ms, file_size, sample_rate, frames, bitrate, duration,
+         audio_start, audio_end, corrupt_bytes) = SIDECAR_HEADER.unpack_from(data)
+        if magic != SIDECAR_MAGIC or version != SIDECAR_VERSION:
+            raise ValueError(f"{path} is not a frame index")
+        offsets = array("I")
+        offsets.frombytes(data[SIDECAR_HEADER.size:])
+        if struct.pack("=I", 1) != struct.pack("<I", 1):
+            offsets.byteswap()
+        return cls(file_size, sample_rate, frames, bitrate, duration, audio_start, audio_end, corrupt_bytes,
+                   bool(flags & FLAG_TRUNCATED), bool(flags & FLAG_VBR), offsets, step_ms / 1000)
+
+
+def sidecar_path(audio_path):
+    return f"{audio_path}.idx"
+
+
+def frame_index(audio_path, save=True):
+    """Index of an audio file from its sidecar, scanning (and saving) it when missing or stale"""
+    index_path = sidecar_path(audio_path)
+    try:
+        index = FrameIndex.load(index_path)
+        if index.file_size == os.path.getsize(audio_path):
+            return index
+    except (OSError, ValueError):
+        pass
+    index = FrameIndex.scan(audio_path)
+    if save and index.frames:
+        try:
+            index.save(index_path)
+        except OSError as e:
+            logger.warning(f"Could not write frame index {index_path}: {str(e)}")
+    return index
@@ -0,0 +1,167 @@
+
+import logging
+import threading
+import time
+
+from jobs import PermanentStageError, TransientStageError
+
+logger = logging.getLogger(__name__)
+
+ERROR_TOAST = "error_toast"
+CAPTCHA = "captcha"
+CREDITS_EXHAUSTED = "credits_exhausted"
+CLIP_APPEARED = "clip_appeared"
+CLIP_READY = "clip_ready"
+
+BINDING_NAME = "__sunoEmit"
+
+# Injected into every document before Suno's own scripts run. Mutations are
+# batched per animation frame and only added nodes are inspected, so the
+# observer stays cheap on a busy page. Each distinct event is emitted once.
+OBSERVER_SCRIPT = """
+(() => {
+  if (window.__sunoObserverInstalled) return;
+  window.__sunoObserverInstalled = true;
+  window.__sunoEventSeq = 0;
+
+  const seen = new Set();
+  const emit = (type, detail) => {
+    const key = type + ':' + (detail.key || '');
+    if (seen.has(key)) return;
+    seen.add(key);
+    window.__sunoEventSeq += 1;
+    const binding = window.%(binding)s;
+    if (binding) binding(type, detail).catch(() => {});
+  };
+
+  const textOf = (el) => ((el.innerText || el.textContent || '') + '').trim().slice(0, 300);
+  const ERROR_TEXT = /error|failed|something went wrong|try again/i;
+  const CREDITS_TEXT = /out of credits|not enough credits|insufficient credits|no credits left/i;
+  const TOAST = '[role="alert"], [data-sonner-toast][data-type="error"], .toast-error';
+  const CAPTCHA = 'iframe[src*="captcha"], iframe[src*="challenges.cloudflare.com"], .h-captcha, .g-recaptcha, #challenge-form';
+  const CLIP = '[data-clip-id], a[href*="/song/"]';
+  const READY = 'audio[src], [data-clip-id] [aria-label="Play"]';
+
+  const clipId = (el) => {
+    const holder = el.closest('[data-clip-id]');
+    if (holder) return holder.getAttribute('data-clip-id');
+    const href = el.getAttribute('href') || '';
+    const match = href.match(/\\/song\\/([^/?#]+)/);
+    return match ? match[1] : '';
+  };
+
+  const inspect = (root) => {
+    if (!root || root.nodeType !== 1) return;
+    const all = (selector) => {
+      const found = Array.from(root.querySelectorAll(selector));
+      if (root.matches(selector)) found.push(root);
+      return found;
+    };
+    all(TOAST).forEach((el) => {
+      const text = textOf(el);
+      if (CREDITS_TEXT.test(text)) emit('credits_exhausted', {key: text, text});
+      else if (text && (ERROR_TEXT.test(text) || el.matches('[data-type="error"], .toast-error'))) emit('error_toast', {key: text, text});
+    });
+    if (all(CAPTCHA).length) emit('captcha', {key: location.pathname, url: location.href});
+    const text = textOf(root);
+    if (CREDITS_TEXT.test(text)) emit('credits_exhausted', {key: text.slice(0, 80), text});
+    all(CLIP).forEach((el) => {
+      const id = clipId(el);
+      if (id) emit('clip_appeared', {key: id, clip_id: id});
+    });
+    all(READY).forEach((el) => {
+      const src = el.getAttribute('src') || '';
+      const id = clipId(el);
+      emit('clip_ready', {key: id || src, clip_id: id, audio_url: src});
+    });
+  };
+
+  let pending = [];
+  let scheduled = false;
+  const flush = () => {
+    scheduled = false;
+    const nodes = pending;
+    pending = [];
+    nodes.forEach(inspect);
+  };
+  const observer = new MutationObserver((records) => {
+    records.forEach((record) => {
+      if (record.type === 'attributes') pending.push(record.target);
+      else record.addedNodes.forEach((node) => pending.push(node));
+    });
+    if (!scheduled) {
+      scheduled = true;
+      requestAnimationFrame(flush);
+    }
+  });
+
+  const start = () => {
+    inspect(document.body);
+    observer.observe(document.body, {childList: true, subtree: true, attributes: true, attributeFilter: ['src', 'data-type', 'disabled']});
+  };
+  if (document.body) start();
+  else document.addEventListener('DOMContentLoaded', start);
+})();
+""" % {"binding": BINDING_NAME}
+
+
+class PageEvent:
+    """A typed event pushed from the page by the injected observer"""
+
+    def __init__(self, event_type, detail, seq):
+        self.type = event_type
+        self.detail = detail or {}
+        self.seq = seq
+        self.timestamp = time.time()
+
+    def to_dict(self):
+        return {"type": self.type, "detail": self.detail, "seq": self.seq, "timestamp": self.timestamp}
+
+
+class PageEventBridge:
+    """Receives DOM events from the injected MutationObserver.
+
+    Events are delivered through a Playwright binding while the automation
+    thread is inside any Playwright call, so they are seen during waits
+    without polling the DOM from Python.
+    """
+
+    def __init__(self, max_events=1000):
+        self.max_events = max_events
+        self._events = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def install(self, context):
+        """Expose the binding and register the observer on a browser context"""
+        context.expose_binding(BINDING_NAME, self._on_event)
+        context.add_init_script(script=OBSERVER_SCRIPT)
+
+    def _on_event(self, source, event_type, detail=None):
+        with self._lock:
+            self._seq += 1
+            event = PageEvent(event_type, detail, self._seq)
+            self._events.append(event)
+            if len(self._events) > self.max_events:
+                self._events = self._events[-self.max_events:]
+        logger.info(f"Page event: {event_type} {detail or ''}")
+
+    def mark(self):
+        """Sequence number to read new events from"""
+        with self._lock:
+            return self._seq
+
+    def since(self, mark, types=None):
+        """Events received after the given mark, optionally filtered by type"""
+        with self._lock:
+            return [event for event in self._events
+                    if event.seq > mark and (types is None or event.type in types)]
+
+    def raise_for_failure(self, mark):
+        """Turn failure events received after the mark into stage errors"""
+        for event in self.since(mark, [CAPTCHA, CREDITS_EXHAUSTED, ERROR_TOAST]):
+            if event.type == CAPTCHA:
+                raise PermanentStageError("Captcha challenge shown, manual action required")
+            if event.type == CREDITS_EXHAUSTED:
+                raise PermanentStageError(f"Out of credits: {event.detail.get('text', '')}")
+            raise TransientStageError(f"Suno error: {event.detail.get('text', '')}")
@@ -4,32 +4,78 @@ import logging
 import os
 import platform
 import random
-import tempfile
+import shutil
 import time
+import uuid
+from urllib.parse import urljoin, urlparse
 from typing import Dict, Any, Optional, List
 
 from playwright.sync_api import sync_playwright, Page, Browser, BrowserContext, ElementHandle
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from datetime import datetime
 
+from jobs import Job, JobRunner, StageError, TransientStageError, PermanentStageError
+from page_events import PageEventBridge, PageEvent, CLIP_APPEARED, CLIP_READY
+import metrics
+from tracing import NULL_TRACE, trace_of
+from adaptive_timeouts import AdaptiveTimeouts
+from downloader import Downloader, DownloadError
+from housekeeping import browser_temp_dir
+from storage import SongStore
+from utils import safe_filename
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
 class SunoAutomation:
     """Class to automate interactions with Suno.com using Playwright"""
     
-    def __init__(self, email=None, password=None, headless=False, use_chrome_profile=False, chrome_user_data_dir=None):
+    # Long waits are split into slices of this size (ms) so that a cancelled
+    # job or an expired deadline interrupts them promptly
+    WAIT_SLICE_MS = 500
+    
+    # Fallback selectors, used alongside the page events in case the observer
+    # does not recognise a changed Suno UI
+    GENERATION_STARTED_SELECTOR = ':text("Creating"), :text("Generating"), .loading, .spinner, :text("Please wait")'
+    GENERATION_COMPLETED_SELECTOR = '[aria-label="Play"], .player, audio, [aria-label="Download"], button:has-text("Download"), button:has-text("Share")'
+    
+    DEFAULT_BASE_URL = "https://suno.com"
+    
+    def __init__(self, email=None, password=None, headless=False, use_chrome_profile=False, chrome_user_data_dir=None, job_runner=None, timeouts=None, base_url=None, har=None, downloader=None, store=None, debug_dir=None):
         self.email = email
         self.password = password
         self.logged_in = False
         self.headless = headless
         self.use_chrome_profile = use_chrome_profile
         self.chrome_user_data_dir = chrome_user_data_dir
+        # Overridable so the automation can run against the local mock site
+        self.base_url = (base_url or self.DEFAULT_BASE_URL).rstrip("/")
+        self.create_url = f"{self.base_url}/create?wid=default"
+        # Optional HAR recording or offline replay of the browser session
+        self.har = har
         self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
         self.connected = False
         self.connection_error = None
+        self.job_runner = job_runner or JobRunner()
+        # Per-site wait timeouts learned from observed latencies
+        self.timeouts = timeouts or AdaptiveTimeouts()
+        # Ranged, resumable audio downloads; share one instance to share its budget
+        self.downloader = downloader or Downloader()
+        # Content-addressed song files under the download directory
+        self.store = store or SongStore(os.path.join(os.path.expanduser("~"), "Downloads", "suno"))
+        # Debug screenshots, kept within a quota by the housekeeper
+        self.debug_dir = debug_dir or os.path.join(os.path.expanduser("~"), ".suno_automation", "debug")
+        self.download_dir = None
+        # Name used to key per-account state such as circuit breakers
+        self.account = email or "default"
+        # DOM events pushed from the page, read from this mark onwards
+        self.events = PageEventBridge()
+        self._event_mark = 0
+        # Trace of the job being run, fed with the browser's network timings
+        self._trace = NULL_TRACE
         
         try:
             # Connect to browser using sync API instead of async
@@ -57,6 +103,11 @@ class SunoAutomation:
                 logger.info(f"Using Chrome profile from: {self.chrome_user_data_dir}")
                 browser_kwargs["user_data_dir"] = self.chrome_user_data_dir
             
+            # Browser downloads go to a dir named after this process, removed on
+            # close, or by the housekeeper of a later run if this one crashes
+            self.download_dir = browser_temp_dir()
+            browser_kwargs["downloads_path"] = self.download_dir
+            
             # Launch browser - using chromium for better compatibility
             self.browser = self.playwright.chromium.launch(**browser_kwargs)
             
@@ -67,11 +118,20 @@ class SunoAutomation:
                 "ignore_https_errors": True
             }
             
-            # Create download directory
-            download_dir = tempfile.mkdtemp()
             context_options["accept_downloads"] = True
+            if self.har:
+                context_options.update(self.har.context_options())
             
             self.context = self.browser.new_context(**context_options)
+            if self.har:
+                self.har.install(self.context)
+            
+            # Watch the DOM for error toasts, captchas and new clips
+            self.events.install(self.context)
+            
+            # Network timings for traced jobs
+            self.context.on("requestfinished", lambda request: self._trace.network(request))
+            self.context.on("requestfailed", lambda request: self._trace.network(request, failure=request.failure))
             
             # Create a new page
             self.page = self.context.new_page()
@@ -102,20 +162,172 @@ class SunoAutomation:
                 self.playwright.stop()
         except Exception as e:
             logger.error(f"Error during cleanup: {str(e)}")
+        if self.download_dir:
+            shutil.rmtree(self.download_dir, ignore_errors=True)
+            self.download_dir = None
+    
+    def _screenshot(self, name):
+        """Save a debug screenshot of the page under debug_dir and return its path"""
+        os.makedirs(self.debug_dir, exist_ok=True)
+        path = os.path.join(self.debug_dir, name)
+        self.page.screenshot(path=path)
+        return path
     
-    def _random_wait(self, min_seconds=0.5, max_seconds=2.0):
+    def _random_wait(self, min_seconds=0.5, max_seconds=2.0, job=None):
         """Wait for a random amount of time to simulate human behavior"""
         delay = random.uniform(min_seconds, max_seconds)
-        time.sleep(delay)
+        with trace_of(job).span("random_wait", seconds=round(delay, 2)):
+            if job:
+                job.sleep(delay)
+            else:
+                time.sleep(delay)
     
-    def _human_type(self, element, text):
+    def _human_type(self, element, text, job=None):
         """Type text like a human with random delays"""
         if not text:
             return
             
-        for char in text:
-            element.type(char, delay=random.uniform(50, 150))
-            # Random pause between characters (50-150ms)
+        with trace_of(job).span("human_type", chars=len(text)):
+            for char in text:
+                if job:
+                    job.check()
+                element.type(char, delay=random.uniform(50, 150))
+                # Random pause between characters (50-150ms)
+    
+    def _goto(self, url, job=None, timeout=30000):
+        """Navigate within the remaining job budget"""
+        timeout = self.timeouts.get("navigation", timeout)
+        clamped = self._clamped(job, timeout)
+        if job:
+            timeout = job.budget_ms(timeout)
+        started = time.monotonic()
+        try:
+            with metrics.phase_timer("navigation"), trace_of(job).span("goto", url=url):
+                response = self.page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+        except PlaywrightTimeoutError:
+            if not clamped:
+                self.timeouts.observe_timeout("navigation", (time.monotonic() - started) * 1000)
+            raise
+        self.timeouts.observe("navigation", (time.monotonic() - started) * 1000)
+        return response
+    
+    @staticmethod
+    def _clamped(job, timeout):
+        """Whether the job budget cuts a wait short of its timeout.
+
+        A wait that times out early says nothing about the site, so it is
+        not fed to the adaptive timeouts.
+        """
+        return bool(job) and job.budget_ms(timeout) < timeout
+
+    def _wait_for_selector(self, selector, timeout, job=None, site=None, **kwargs):
+        """Wait for a selector, honouring the job deadline and cancellation.
+
+        When a site name is given the timeout adapts to the latencies
+        observed at that site.
+        """
+        if site:
+            timeout = self.timeouts.get(site, timeout)
+        clamped = self._clamped(job, timeout)
+        started = time.monotonic()
+        try:
+            if not job:
+                element = self.page.wait_for_selector(selector, timeout=timeout, **kwargs)
+            else:
+                with trace_of(job).span("wait_for_selector", selector=selector, timeout_ms=timeout):
+                    element = self._wait_for_selector_sliced(selector, timeout, job, **kwargs)
+        except PlaywrightTimeoutError:
+            if site and not clamped:
+                self.timeouts.observe_timeout(site, (time.monotonic() - started) * 1000)
+            raise
+        if site:
+            self.timeouts.observe(site, (time.monotonic() - started) * 1000)
+        return element
+    
+    def _wait_for_selector_sliced(self, selector, timeout, job, **kwargs):
+        # Never wait past the job deadline, and re-check for cancellation
+        # between short slices instead of blocking for the whole timeout
+        end = time.monotonic() + job.budget_ms(timeout) / 1000
+        while True:
+            remaining_ms = int((end - time.monotonic()) * 1000)
+            slice_ms = max(1, min(self.WAIT_SLICE_MS, remaining_ms))
+            try:
+                return self.page.wait_for_selector(selector, timeout=slice_ms, **kwargs)
+            except PlaywrightTimeoutError:
+                job.check()
+                self.events.raise_for_failure(self._event_mark)
+                if time.monotonic() >= end:
+                    raise
+    
+    def _wait_for_page_event(self, event_types, timeout, job=None, fallback_selector=None, site=None):
+        """Wait for one of the given page events, or for the fallback selector.
+
+        Returns the event, True if only the fallback selector matched, or None
+        on timeout. Failure events (captcha, out of credits, error toasts)
+        abort the wait as soon as they are pushed by the page.
+        """
+        if site:
+            timeout = self.timeouts.get(site, timeout)
+        clamped = self._clamped(job, timeout)
+        trace = trace_of(job)
+        started = time.monotonic()
+        with trace.span("wait_for_page_event", types=list(event_types), timeout_ms=timeout):
+            result = self._wait_for_page_event_sliced(event_types, timeout, job, fallback_selector)
+        if site:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            if result:
+                self.timeouts.observe(site, elapsed_ms)
+            elif not clamped:
+                self.timeouts.observe_timeout(site, elapsed_ms)
+        if isinstance(result, PageEvent):
+            trace.instant(result.type, detail=result.detail)
+        elif result:
+            trace.instant("fallback_selector", selector=fallback_selector)
+        return result
+    
+    def _wait_for_page_event_sliced(self, event_types, timeout, job, fallback_selector):
+        if job:
+            timeout = job.budget_ms(timeout)
+        end = time.monotonic() + timeout / 1000
+        while True:
+            self.events.raise_for_failure(self._event_mark)
+            events = self.events.since(self._event_mark, event_types)
+            if events:
+                return events[0]
+            if fallback_selector and self.page.query_selector(fallback_selector):
+                return True
+            remaining_ms = int((end - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                return None
+            
+            # Sleep in the page until the observer emits something new
+            seq = self.page.evaluate("() => window.__sunoEventSeq || 0")
+            try:
+                self.page.wait_for_function(
+                    "(seq) => (window.__sunoEventSeq || 0) > seq",
+                    arg=seq,
+                    timeout=max(1, min(self.WAIT_SLICE_MS, remaining_ms))
+                )
+            except PlaywrightTimeoutError:
+                pass
+            if job:
+                job.check()
+    
+    def reset_page(self):
+        """Return the page to a clean state after an interrupted or failed job"""
+        try:
+            self.page.goto("about:blank")
+        except Exception as e:
+            logger.warning(f"Could not reset page, opening a new one: {str(e)}")
+            try:
+                self.page.close()
+            except Exception:
+                pass
+            try:
+                self.page = self.context.new_page()
+                self.page.set_default_timeout(30000)
+            except Exception as ex:
+                logger.error(f"Could not open a new page: {str(ex)}")
     
     def is_connected(self):
         """Check if browser is connected and working"""
@@ -129,7 +341,7 @@ class SunoAutomation:
             "error": self.connection_error
         }
     
-    def login(self):
+    def login(self, job=None):
         """Login to Suno.com"""
         if not self.connected:
             logger.error("Browser not connected, can't login")
@@ -139,22 +351,25 @@ class SunoAutomation:
             logger.info("Already logged in")
             return True
         
-        return self._login_sync()
+        with metrics.phase_timer("login"):
+            return self._login_sync(job)
     
-    def _login_sync(self):
+    def _login_sync(self, job=None):
         """Synchronous implementation of login"""
         logger.info("Navigating to Suno.com")
         try:
             # Navigate to Suno.com
-            self.page.goto("https://suno.com/create?wid=default", wait_until="domcontentloaded")
+            self._goto(self.create_url, job)
             
             # Check if already logged in by looking for the prompt textarea
             try:
-                textarea = self.page.wait_for_selector('textarea[placeholder="Enter style of music"]', timeout=5000)
+                textarea = self._wait_for_selector('textarea[placeholder="Enter style of music"]', 5000, job)
                 if textarea:
                     logger.info("Already logged in via Chrome profile")
                     self.logged_in = True
                     return True
+            except StageError:
+                raise
             except Exception:
                 logger.info("Not logged in yet, proceeding with authentication")
             
@@ -167,10 +382,10 @@ class SunoAutomation:
                     if login_button:
                         logger.info("Clicking Log in button")
                         login_button.click()
-                        self._random_wait(1, 2)
+                        self._random_wait(1, 2, job)
                     
                     # Look for Google login button
-                    google_login = self.page.wait_for_selector('button:has-text("Google"), button:has-text("Continue with Google")', timeout=10000)
+                    google_login = self._wait_for_selector('button:has-text("Google"), button:has-text("Continue with Google")', 10000, job)
                     if google_login:
                         logger.info("Clicking Google login button")
                         google_login.click()
@@ -178,7 +393,9 @@ class SunoAutomation:
                         # Since we're using Chrome profile, Google might auto-login
                         # Give it time to process the Google authentication
                         logger.info("Waiting for Google authentication to complete...")
-                        self._random_wait(5, 10)
+                        self._random_wait(5, 10, job)
+                except StageError:
+                    raise
                 except Exception as e:
                     logger.error(f"Google login failed: {str(e)}")
             
@@ -191,57 +408,63 @@ class SunoAutomation:
                     if login_button:
                         logger.info("Clicking Log in button")
                         login_button.click()
-                        self._random_wait(1, 2)
+                        self._random_wait(1, 2, job)
                     
                     # Try to find the email login option
                     email_option = self.page.query_selector('button:has-text("Email")')
                     if email_option:
                         logger.info("Clicking Email login option")
                         email_option.click()
-                        self._random_wait(1, 2)
+                        self._random_wait(1, 2, job)
                     
                     # Wait for email field and enter email
-                    email_field = self.page.wait_for_selector('input[type="email"], input[name="email"]', timeout=10000)
+                    email_field = self._wait_for_selector('input[type="email"], input[name="email"]', 10000, job)
                     if email_field:
                         logger.info("Entering email")
-                        self._human_type(email_field, self.email)
+                        self._human_type(email_field, self.email, job)
                         
                         # Find continue button and click it
                         continue_button = self.page.query_selector('button:has-text("Continue")')
                         if continue_button:
                             logger.info("Clicking Continue button")
                             continue_button.click()
-                            self._random_wait(1, 2)
+                            self._random_wait(1, 2, job)
                     
                     # Wait for password field and enter password
-                    password_field = self.page.wait_for_selector('input[type="password"], input[name="password"]', timeout=10000)
+                    password_field = self._wait_for_selector('input[type="password"], input[name="password"]', 10000, job)
                     if password_field:
                         logger.info("Entering password")
-                        self._human_type(password_field, self.password)
+                        self._human_type(password_field, self.password, job)
                         
                         # Click submit/login button
                         submit_button = self.page.query_selector('button:has-text("Log in"), button:has-text("Sign in")')
                         if submit_button:
                             logger.info("Clicking final login button")
                             submit_button.click()
-                            self._random_wait(3, 5)
+                            self._random_wait(3, 5, job)
+                except StageError:
+                    raise
                 except Exception as e:
                     logger.error(f"Email/password login steps failed: {str(e)}")
             else:
                 # Give user time to complete login if needed
                 logger.info("Waiting for user to complete login manually...")
-                self._random_wait(10, 15)
+                self._random_wait(10, 15, job)
             
             # Final check - wait for the presence of textarea to confirm login
             try:
-                self.page.wait_for_selector('textarea', timeout=20000)
+                self._wait_for_selector('textarea', 20000, job)
                 logger.info("Successfully logged in")
                 self.logged_in = True
                 return True
+            except StageError:
+                raise
             except Exception as e:
                 logger.error(f"Login verification failed: {str(e)}")
                 return False
                 
+        except StageError:
+            raise
         except Exception as e:
             logger.error(f"Login failed: {str(e)}")
             self.connection_error = f"Login failed: {str(e)}"
@@ -253,257 +476,368 @@ class SunoAutomation:
         if not self.connected:
             logger.error("Browser not connected, can't generate song")
             return {"success": False, "error": "Browser not connected"}
-            
+
         logger.info(f"Generating song with prompt: {prompt}, style: {style}, title: {title}, instrumental: {instrumental}")
-        
-        if not self.logged_in:
-            if not self.login():
-                return {"success": False, "error": "Login failed"}
-        
-        return self._generate_song_sync(prompt, style, title, instrumental)
+
+        job = Job(prompt, style=style, title=title, instrumental=instrumental, download=False)
+        return self.run_job(job).result()
+
+    def run_job(self, job):
+        """Run a job through its stages, resuming after the last checkpoint"""
+        if not self.connected:
+            logger.error("Browser not connected, can't run job")
+            job.status = "failed"
+            job.error = "Browser not connected"
+            return job
+
+        return self.job_runner.run(job, self.stage_handlers())
+
+    def stage_handlers(self):
+        """Map each job stage to the method implementing it"""
+        handlers = {
+            "login": self._stage_login,
+            "fill": self._stage_fill,
+            "submit": self._stage_submit,
+            "await": self._stage_await,
+            "harvest": self._stage_harvest,
+            "download": self._stage_download,
+        }
+        return {stage: self._watch_page_events(handler) for stage, handler in handlers.items()}
     
-    def _generate_song_sync(self, prompt, style=None, title=None, instrumental=True):
-        """Synchronous implementation of song generation"""
-        try:
-            # Navigate to create page if not already there
-            if "create" not in self.page.url:
-                self.page.goto("https://suno.com/create?wid=default", wait_until="domcontentloaded")
-                self._random_wait(2, 3)
-                logger.info("Navigated to the create page")
-            
-            # Take a screenshot for debugging
-            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-            screenshot_path = os.path.join(os.path.expanduser("~"), f"suno_debug_create_{timestamp}.png")
-            self.page.screenshot(path=screenshot_path)
-            logger.info(f"Create page screenshot saved to {screenshot_path}")
-            
-            # Set the style (if provided)
-            if style:
-                try:
-                    # Look for style textarea using the selector provided
-                    style_textarea = self.page.wait_for_selector('textarea[placeholder="Enter style of music"]', timeout=5000)
-                    if style_textarea:
-                        logger.info(f"Found style textarea, entering: {style}")
-                        style_textarea.click()
-                        style_textarea.fill("")  # Clear existing text
-                        self._human_type(style_textarea, style)
-                except Exception as e:
-                    logger.warning(f"Could not set style: {str(e)}")
-            
-            # Set the title (if provided)
-            if title:
-                try:
-                    # Look for title textarea using the selector provided
-                    title_textarea = self.page.wait_for_selector('textarea[placeholder="Enter a title"]', timeout=5000)
-                    if title_textarea:
-                        logger.info(f"Found title textarea, entering: {title}")
-                        title_textarea.click()
-                        title_textarea.fill("")  # Clear existing text
-                        self._human_type(title_textarea, title)
-                except Exception as e:
-                    logger.warning(f"Could not set title: {str(e)}")
-            
-            # Set instrumental mode
+    def _watch_page_events(self, handler):
+        """Scope page events and network tracing to the current stage attempt"""
+        def run(job):
+            self._event_mark = self.events.mark()
+            self._trace = trace_of(job)
             try:
-                # Find the instrumental toggle
-                toggle_container = self.page.wait_for_selector('div[aria-label="Instrumental"]', timeout=5000)
-                if toggle_container:
-                    # Check if it's already in the correct state
-                    toggle_span = toggle_container.query_selector("span")
-                    is_active = False
-                    
-                    if toggle_span:
-                        class_attr = toggle_span.get_attribute("class")
-                        is_active = class_attr and "translate-x-4" in class_attr
-                    
-                    logger.info(f"Instrumental toggle current state: {'active' if is_active else 'inactive'}")
-                    
-                    # Click only if we need to change the state
-                    if is_active != instrumental:
-                        logger.info(f"Clicking instrumental toggle to change from {is_active} to {instrumental}")
-                        toggle_container.click()
-                        self._random_wait(1, 2)
-                    else:
-                        logger.info(f"Instrumental toggle already in desired state: {instrumental}")
-            except Exception as e:
-                logger.warning(f"Could not set instrumental mode: {str(e)}")
-            
-            # Find and enter the main prompt
+                return handler(job)
+            finally:
+                self._trace = NULL_TRACE
+        return run
+
+    def _stage_login(self, job):
+        """Make sure the session is authenticated"""
+        if not self.login(job):
+            raise TransientStageError(self.connection_error or "Login failed")
+        return {}
+
+    def _stage_fill(self, job):
+        """Open the create page and fill in the song parameters"""
+        prompt = job.params["prompt"]
+        style = job.params["style"]
+        title = job.params["title"]
+        instrumental = job.params["instrumental"]
+
+        # Navigate to create page if not already there
+        if "create" not in self.page.url:
+            self._goto(self.create_url, job)
+            self._random_wait(2, 3, job)
+            logger.info("Navigated to the create page")
+
+        fill_started = time.monotonic()
+
+        # Take a screenshot for debugging
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        screenshot_path = self._screenshot(f"suno_debug_create_{timestamp}.png")
+        logger.info(f"Create page screenshot saved to {screenshot_path}")
+
+        # Set the style (if provided)
+        if style:
             try:
-                # Focus on the main textarea (using the sibling relationship with the Create button)
-                main_textarea = self.page.wait_for_selector('textarea', timeout=5000)
-                if main_textarea:
-                    logger.info("Found main prompt textarea")
-                    main_textarea.click()
-                    main_textarea.fill("")  # Clear existing text
-                    self._human_type(main_textarea, prompt)
-                    logger.info("Entered prompt text")
-                else:
-                    logger.error("Could not find main prompt textarea")
-                    return {"success": False, "error": "Could not find prompt textarea"}
+                # Look for style textarea using the selector provided
+                style_textarea = self._wait_for_selector('textarea[placeholder="Enter style of music"]', 5000, job, site="style_textarea")
+                if style_textarea:
+                    logger.info(f"Found style textarea, entering: {style}")
+                    style_textarea.click()
+                    style_textarea.fill("")  # Clear existing text
+                    self._human_type(style_textarea, style, job)
+            except StageError:
+                raise
             except Exception as e:
-                logger.error(f"Failed to enter prompt: {str(e)}")
-                return {"success": False, "error": f"Failed to enter prompt: {str(e)}"}
-            
-            # Take screenshot before clicking Create button
-            self.page.screenshot(path=os.path.join(os.path.expanduser("~"), "suno_debug_before_click.png"))
-            
-            # Find and click the create button
+                logger.warning(f"Could not set style: {str(e)}")
+
+        # Set the title (if provided)
+        if title:
             try:
-                # Try different selectors for the Create button
-                create_button = None
-                
-                # Try to find by class name and text
-                button_with_text = self.page.query_selector('.buttonAnimate >> text=Create')
-                if button_with_text:
-                    create_button = button_with_text
-                
-                # If not found, try by role
-                if not create_button:
-                    create_button = self.page.query_selector('button:has-text("Create")')
-                
-                if not create_button:
-                    logger.error("Could not find the Create button")
-                    return {"success": False, "error": "Could not find the Create button"}
-                
-                # Check if the button is disabled
-                is_disabled = create_button.get_attribute("disabled")
-                if is_disabled:
-                    logger.warning("Create button is disabled. This could be due to input errors or account limitations.")
-                    return {"success": False, "error": "Create button is disabled. You may need to check inputs or account limitations."}
-                
-                logger.info("Clicking Create button")
-                create_button.click()
-                
-                # Wait for generation to start and complete
-                logger.info("Waiting for song generation to begin...")
-                
-                # Wait for indicators that generation has started
-                generation_started = False
-                for indicator in ["text=Creating", "text=Generating", ".loading", ".spinner", "text=Please wait"]:
-                    try:
-                        self.page.wait_for_selector(indicator, timeout=10000, state="visible")
-                        generation_started = True
-                        logger.info(f"Song generation started (detected indicator: {indicator})")
-                        break
-                    except Exception:
-                        continue
-                
-                if not generation_started:
-                    logger.warning("Did not detect generation start indicators - continuing anyway")
-                
-                # Wait for indicators that generation is complete
-                completion_indicators = [
-                    '[aria-label="Play"]',
-                    '.player',
-                    'audio',
-                    '[aria-label="Download"]',
-                    'button:has-text("Download")',
-                    'button:has-text("Share")'
-                ]
-                
-                generation_completed = False
-                for indicator in completion_indicators:
-                    try:
-                        self.page.wait_for_selector(indicator, timeout=300000)  # 5 minutes timeout
-                        generation_completed = True
-                        logger.info(f"Song generation completed (detected indicator: {indicator})")
-                        break
-                    except Exception:
-                        continue
-                
-                if not generation_completed:
-                    logger.error("Song generation timed out or failed")
-                    return {"success": False, "error": "Song generation timed out"}
-                
-                # Take a final screenshot
-                self.page.screenshot(path=os.path.join(os.path.expanduser("~"), "suno_debug_complete.png"))
-                
-                # Get the song URL
-                song_url = self.page.url
-                logger.info(f"Generated song URL: {song_url}")
-                
-                return {
-                    "success": True, 
-                    "url": song_url, 
-                    "prompt": prompt, 
-                    "style": style, 
-                    "title": title
-                }
-                
+                # Look for title textarea using the selector provided
+                title_textarea = self._wait_for_selector('textarea[placeholder="Enter a title"]', 5000, job, site="title_textarea")
+                if title_textarea:
+                    logger.info(f"Found title textarea, entering: {title}")
+                    title_textarea.click()
+                    title_textarea.fill("")  # Clear existing text
+                    self._human_type(title_textarea, title, job)
+            except StageError:
+                raise
             except Exception as e:
-                logger.error(f"Failed to generate song: {str(e)}")
-                return {"success": False, "error": str(e)}
-                
+                logger.warning(f"Could not set title: {str(e)}")
+
+        # Set instrumental mode
+        try:
+            # Find the instrumental toggle
+            toggle_container = self._wait_for_selector('div[aria-label="Instrumental"]', 5000, job, site="instrumental_toggle")
+            if toggle_container:
+                # Check if it's already in the correct state
+                toggle_span = toggle_container.query_selector("span")
+                is_active = False
+
+                if toggle_span:
+                    class_attr = toggle_span.get_attribute("class")
+                    is_active = class_attr and "translate-x-4" in class_attr
+
+                logger.info(f"Instrumental toggle current state: {'active' if is_active else 'inactive'}")
+
+                # Click only if we need to change the state
+                if is_active != instrumental:
+                    logger.info(f"Clicking instrumental toggle to change from {is_active} to {instrumental}")
+                    toggle_container.click()
+                    self._random_wait(1, 2, job)
+                else:
+                    logger.info(f"Instrumental toggle already in desired state: {instrumental}")
+        except StageError:
+            raise
         except Exception as e:
-            logger.error(f"Song generation failed: {str(e)}")
-            return {"success": False, "error": str(e)}
-    
+            logger.warning(f"Could not set instrumental mode: {str(e)}")
+
+        # Find and enter the main prompt
+        try:
+            # Focus on the main textarea (using the sibling relationship with the Create button)
+            main_textarea = self._wait_for_selector('textarea', 5000, job, site="prompt_textarea")
+        except StageError:
+            raise
+        except Exception as e:
+            raise TransientStageError(f"Failed to enter prompt: {str(e)}")
+
+        if not main_textarea:
+            logger.error("Could not find main prompt textarea")
+            raise TransientStageError("Could not find prompt textarea")
+
+        logger.info("Found main prompt textarea")
+        main_textarea.click()
+        main_textarea.fill("")  # Clear existing text
+        self._human_type(main_textarea, prompt, job)
+        logger.info("Entered prompt text")
+
+        metrics.observe_phase("form_fill", time.monotonic() - fill_started)
+        return {}
+
+    def _stage_submit(self, job):
+        """Click the Create button"""
+        # Take screenshot before clicking Create button
+        self._screenshot("suno_debug_before_click.png")
+
+        # Try different selectors for the Create button
+        create_button = None
+
+        # Try to find by class name and text
+        button_with_text = self.page.query_selector('.buttonAnimate >> text=Create')
+        if button_with_text:
+            create_button = button_with_text
+
+        # If not found, try by role
+        if not create_button:
+            create_button = self.page.query_selector('button:has-text("Create")')
+
+        if not create_button:
+            logger.error("Could not find the Create button")
+            raise PermanentStageError("Could not find the Create button")
+
+        # Check if the button is disabled
+        is_disabled = create_button.get_attribute("disabled")
+        if is_disabled:
+            logger.warning("Create button is disabled. This could be due to input errors or account limitations.")
+            raise PermanentStageError("Create button is disabled. You may need to check inputs or account limitations.")
+
+        logger.info("Clicking Create button")
+        create_button.click()
+
+        return {"submitted_at": datetime.now().isoformat(), "submitted_ts": time.time()}
+
+    def _stage_await(self, job):
+        """Wait for the generation to start and complete"""
+        logger.info("Waiting for song generation to begin...")
+        submitted_ts = job.checkpoints.get("submit", {}).get("submitted_ts", time.time())
+
+        # A new clip card in the feed means the generation has started
+        started = self._wait_for_page_event(
+            [CLIP_APPEARED, CLIP_READY], 10000, job,
+            fallback_selector=self.GENERATION_STARTED_SELECTOR,
+            site="generation_start"
+        )
+        if started:
+            metrics.observe_phase("generation_start", time.time() - submitted_ts)
+            logger.info(f"Song generation started ({started.type if isinstance(started, PageEvent) else 'indicator visible'})")
+        else:
+            logger.warning("Did not detect generation start indicators - continuing anyway")
+
+        # Wait for the clip to become playable
+        completed = self._wait_for_page_event(
+            [CLIP_READY], 300000, job,  # 5 minutes by default, adapted to observed render times
+            fallback_selector=self.GENERATION_COMPLETED_SELECTOR,
+            site="generation_complete"
+        )
+        if not completed:
+            logger.error("Song generation timed out or failed")
+            raise TransientStageError("Song generation timed out")
+
+        metrics.observe_phase("generation_complete", time.time() - submitted_ts)
+        if isinstance(completed, PageEvent):
+            logger.info(f"Song generation completed (clip ready: {completed.detail})")
+            return {
+                "clip_id": completed.detail.get("clip_id"),
+                "audio_url": completed.detail.get("audio_url"),
+            }
+
+        logger.info("Song generation completed (detected completion indicator)")
+        return {}
+
+    def _stage_harvest(self, job):
+        """Collect the URL of the generated song"""
+        # Take a final screenshot
+        self._screenshot("suno_debug_complete.png")
+
+        # Get the song URL
+        song_url = self.page.url
+        logger.info(f"Generated song URL: {song_url}")
+
+        # Keep what the page events told us about the clip
+        clip = job.checkpoints.get("await", {})
+        # Absolute, so the audio can also be fetched later without the page
+        audio_url = urljoin(song_url, clip["audio_url"]) if clip.get("audio_url") else None
+        return {"url": song_url, "clip_id": clip.get("clip_id"), "audio_url": audio_url}
+
+    def _stage_download(self, job):
+        """Download the harvested song"""
+        harvest = job.checkpoints["harvest"]
+        file_path = self._download(harvest["url"], job, audio_url=harvest.get("audio_url"))
+        return {"file_path": file_path, "sha256": self.store.sha256_of(file_path), "size": os.path.getsize(file_path)}
+
     def download_song(self, song_url=None):
         """Download the generated song"""
         logger.info("Attempting to download song")
-        
+
         return self._download_song_sync(song_url)
-    
+
     def _download_song_sync(self, song_url=None):
         """Synchronous implementation of song download"""
         try:
-            if song_url:
-                self.page.goto(song_url, wait_until="domcontentloaded")
-                self._random_wait(2, 3)
-            
-            # Take a screenshot to debug download process
-            self.page.screenshot(path=os.path.join(os.path.expanduser("~"), "suno_debug_download.png"))
-            
-            # Set up download location
-            download_path = os.path.join(os.path.expanduser("~"), "Downloads")
-            if not os.path.exists(download_path):
-                os.makedirs(download_path)
-            
-            # Look for download button
-            download_selectors = [
-                'button:has-text("Download")', 
-                '[aria-label="Download"]',
-                'a[download]'  # Direct download links
-            ]
-            
-            download_element = None
-            for selector in download_selectors:
-                try:
-                    element = self.page.wait_for_selector(selector, timeout=5000)
-                    if element:
-                        download_element = element
-                        break
-                except Exception:
-                    continue
-            
-            if not download_element:
-                logger.error("No download button found")
-                return {"success": False, "error": "Download button not found"}
-                
-            logger.info(f"Found download element, attempting to click")
-            
-            # Start waiting for download
-            with self.page.expect_download() as download_info:
-                download_element.click()
-                download = download_info.value
-                
-                # Wait for download to complete
-                path = download.path()
-                
-                # Save to downloads folder
-                suggested_filename = download.suggested_filename
-                save_path = os.path.join(download_path, suggested_filename)
-                
-                download.save_as(save_path)
-                logger.info(f"File downloaded to: {save_path}")
-                
-                return {"success": True, "file_path": save_path}
-            
+            return {"success": True, "file_path": self._download(song_url)}
         except Exception as e:
             logger.error(f"Download failed: {str(e)}")
             return {"success": False, "error": str(e)}
+
+    def _download(self, song_url=None, job=None, audio_url=None):
+        """Download a song and return the saved file path, raising on failure"""
+        with metrics.phase_timer("download"):
+            save_path = self._download_file(song_url, job, audio_url)
+        metrics.observe_download(os.path.getsize(save_path))
+        return save_path
     
+    def _download_file(self, song_url=None, job=None, audio_url=None):
+        """Fetch the audio directly when its URL is known, else use the page's download button"""
+        if audio_url:
+            try:
+                return self._download_audio(audio_url, job)
+            except DownloadError as e:
+                logger.warning(f"Direct audio download failed ({str(e)}), falling back to the download button")
+
+        if song_url:
+            self._goto(song_url, job)
+            self._random_wait(2, 3, job)
+
+        # Take a screenshot to debug download process
+        self._screenshot("suno_debug_download.png")
+
+        # Look for download button
+        download_selectors = [
+            'button:has-text("Download")',
+            '[aria-label="Download"]',
+            'a[download]'  # Direct download links
+        ]
+
+        download_element = None
+        for selector in download_selectors:
+            try:
+                element = self._wait_for_selector(selector, 5000, job)
+                if element:
+                    download_element = element
+                    break
+            except PlaywrightTimeoutError:
+                continue
+
+        if not download_element:
+            logger.error("No download button found")
+            raise TransientStageError("Download button not found")
+
+        logger.info(f"Found download element, attempting to click")
+
+        # Start waiting for download
+        trace = trace_of(job)
+        with trace.span("expect_download"):
+            with self.page.expect_download(timeout=job.budget_ms(30000) if job else 30000) as download_info:
+                download_element.click()
+            download = download_info.value
+
+        # Save next to the store, then move it in under its content hash
+        suggested_filename = download.suggested_filename
+        save_path = self.store.staging_path(f"{job.id[:8]}-{suggested_filename}" if job else suggested_filename)
+
+        with trace.span("save_download", path=save_path):
+            download.save_as(save_path)
+        logger.info(f"File downloaded to: {save_path}")
+
+        return self._store_song(save_path, os.path.splitext(suggested_filename)[0], job)
+
+    def _store_song(self, path, name, job=None, sha256=None):
+        """Put a downloaded file into the song store and return its stored path"""
+        metadata = {}
+        if job:
+            harvest = job.checkpoints.get("harvest", {})
+            metadata = {
+                "job_id": job.id,
+                "prompt": job.params.get("prompt"),
+                "style": job.params.get("style"),
+                "clip_id": harvest.get("clip_id"),
+                "url": harvest.get("url"),
+            }
+        with trace_of(job).span("store_song"):
+            entry = self.store.put(path, name=name, metadata=metadata, sha256=sha256)
+        return entry["path"]
+
+    def session_headers(self, url, bearer=False):
+        """Headers that make a plain HTTP request to url look like this browser session.
+
+        bearer adds the Clerk session token as Authorization, which the Suno
+        API hosts expect instead of cookies.
+        """
+        headers = {"User-Agent": self.page.evaluate("() => navigator.userAgent")}
+        cookies = self.context.cookies(url)
+        if cookies:
+            headers["Cookie"] = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+        if bearer:
+            token = next((cookie["value"] for cookie in self.context.cookies() if cookie["name"] == "__session"), None)
+            if token:
+                headers["Authorization"] = f"Bearer {token}"
+        return headers
+
+    def _download_audio(self, audio_url, job=None):
+        """Fetch the audio file with ranged, resumable requests carrying the session cookies"""
+        audio_url = urljoin(self.page.url, audio_url)
+        headers = self.session_headers(audio_url)
+
+        harvest = job.checkpoints.get("harvest", {}) if job else {}
+        clip_id = harvest.get("clip_id")
+        name = safe_filename(job.params.get("title") if job else None)
+        extension = os.path.splitext(urlparse(audio_url).path)[1] or ".mp3"
+        # Stable staging name, so a retried job resumes the same partial file; unique
+        # per clip (or job), so two songs with one title never share a .part file
+        unique = clip_id[:8] if clip_id else (job.id if job else uuid.uuid4().hex[:8])
+        save_path = self.store.staging_path(f"{name}-{unique}{extension}")
+
+        with trace_of(job).span("range_download", url=audio_url):
+            result = self.downloader.download(audio_url, save_path, headers=headers, job=job)
+        logger.info(f"Audio downloaded to: {save_path} ({result['size']} bytes, sha256 {result['sha256'][:12]})")
+        return self._store_song(save_path, name, job, sha256=result["sha256"])
+
     def close(self):
         """Close the browser and clean up"""
         logger.info("Closing browser")
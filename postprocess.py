@@ -0,0 +1,212 @@
+
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from downloader import IntegrityError
+from mp3index import FrameIndex, sidecar_path
+from storage import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# No "hash" by default: the downloader already hashes each file while
+# verifying it, because the content-addressed store needs the digest to place
+# the file before it can be handed to the pipeline. The stage stays available
+# to re-check files that were stored some time ago.
+DEFAULT_STAGES = ["frame_index"]
+
+PROCESSORS = {}
+
+
+def processor(name):
+    """Register a post-processing stage under a name usable in POSTPROCESS_STAGES.
+
+    A stage is a module-level function taking the file path and the song
+    dict (the job fields plus what earlier stages returned) and returning a
+    dict of new fields. It runs in a worker process, so it must be picklable
+    by name and must not touch the browser or the library. Raising
+    IntegrityError marks the file itself as bad and is not retried.
+    """
+    def register(func):
+        PROCESSORS[name] = func
+        return func
+    return register
+
+
+@processor("hash")
+def verify_hash(path, song):
+    """Check the file still matches the digest it was stored under"""
+    digest = file_sha256(path)
+    if song.get("sha256") and digest != song["sha256"]:
+        raise IntegrityError(f"{path} changed on disk: sha256 {digest[:12]}, stored as {song['sha256'][:12]}")
+    return {"sha256": digest}
+
+
+@processor("frame_index")
+def index_frames(path, song):
+    """Validate the MP3 frames and write the seek index sidecar"""
+    if not path.lower().endswith(".mp3"):
+        return {}
+    index = FrameIndex.scan(path)
+    if not index.valid:
+        raise IntegrityError(f"Corrupt MP3: {index.frames} frames, "
+                             f"{'truncated, ' if index.truncated else ''}{index.corrupt_bytes} bytes out of sync")
+    index_path = sidecar_path(path)
+    if not os.path.exists(index_path):
+        index.save(index_path)
+    return {"duration": round(index.duration, 3), "bitrate": index.bitrate}
+
+
+def resolve(name):
+    """A registered stage, or a "module:function" path to one"""
+    if name in PROCESSORS:
+        return PROCESSORS[name]
+    if ":" not in name:
+        raise ValueError(f"Unknown post-processing stage '{name}', expected one of {sorted(PROCESSORS)} "
+                         f"or module:function")
+    module, function = name.split(":", 1)
+    return getattr(importlib.import_module(module), function)
+
+
+def _run_stage(name, path, song):
+    """Worker-side entry point: run one stage and time it where it ran"""
+    started = time.monotonic()
+    result = resolve(name)(path, song) or {}
+    return result, time.monotonic() - started
+
+
+class PostProcessor:
+    """Runs finished downloads through the configured stages in a process pool.
+
+    Stages of one song run in order; different songs run in parallel on up
+    to `workers` processes, so hashing and parsing never hold a browser
+    worker. submit() blocks while `max_pending` songs are in flight, which
+    pushes back on the download stage instead of letting work pile up.
+    Failed stages are retried with a backoff, except for IntegrityError.
+    """
+
+    def __init__(self, stages=None, workers=2, max_pending=8, retries=2):
+        self.stages = list(stages or DEFAULT_STAGES)
+        for name in self.stages:
+            resolve(name)
+        self.workers = workers
+        self.retries = retries
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"processed": 0, "failed": 0, "retried": 0, "blocked_seconds": 0.0}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a pipeline from get_config values, or None when disabled"""
+        stages = config.get("POSTPROCESS_STAGES", DEFAULT_STAGES)
+        if not stages:
+            return None
+        return cls(
+            stages=stages,
+            workers=config.get("POSTPROCESS_WORKERS", 2),
+            max_pending=config.get("POSTPROCESS_MAX_PENDING", 8),
+            retries=config.get("POSTPROCESS_RETRIES", 2),
+        )
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: the parent has browser and event loop threads
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def submit(self, path, song, on_done=None, on_error=None):
+        """Queue a file; blocks while the pipeline is full.
+
+        on_done(song) gets the song with every stage's fields merged in;
+        on_error(song, error) is called once a stage has failed for good.
+        Both run on a pipeline thread.
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            logger.info(f"Post-processing full ({self._pending} songs), waiting for room")
+            self._slots.acquire()
+        with self._lock:
+            self._pending += 1
+            self._stats["blocked_seconds"] += time.monotonic() - started
+        metrics.set_postprocess_pending(self._pending)
+        self._next(path, dict(song), 0, 1, on_done, on_error)
+
+    def _next(self, path, song, stage_index, attempt, on_done, on_error):
+        if stage_index == len(self.stages):
+            self._finish(song, None, on_done, on_error)
+            return
+        name = self.stages[stage_index]
+        queued = time.monotonic()
+        try:
+            future = self._pool().submit(_run_stage, name, path, song)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._failed(path, song, stage_index, attempt, e, 0.0, on_done, on_error)
+            return
+
+        def done(future):
+            try:
+                result, seconds = future.result()
+            except BaseException as e:
+                self._failed(path, song, stage_index, attempt, e, time.monotonic() - queued, on_done, on_error)
+                return
+            metrics.observe_postprocess(name, "success", seconds)
+            song.update(result)
+            self._next(path, song, stage_index + 1, 1, on_done, on_error)
+
+        future.add_done_callback(done)
+
+    def _failed(self, path, song, stage_index, attempt, error, seconds, on_done, on_error):
+        name = self.stages[stage_index]
+        retry = not isinstance(error, IntegrityError) and attempt <= self.retries
+        metrics.observe_postprocess(name, "retry" if retry else "failure", seconds)
+        if isinstance(error, BrokenProcessPool):
+            # A worker died (OOM, segfault in a native library): start a fresh pool
+            with self._lock:
+                self._executor = None
+        if not retry:
+            logger.error(f"Post-processing stage '{name}' failed for {path}: {str(error)}")
+            self._finish(song, error, on_done, on_error)
+            return
+        with self._lock:
+            self._stats["retried"] += 1
+        delay = min(30, 2 ** attempt)
+        logger.warning(f"Post-processing stage '{name}' failed for {path} ({str(error)}), retry {attempt}/{self.retries} in {delay}s")
+        timer = threading.Timer(delay, self._next, (path, song, stage_index, attempt + 1, on_done, on_error))
+        timer.daemon = True
+        timer.start()
+
+    def _finish(self, song, error, on_done, on_error):
+        with self._lock:
+            self._pending -= 1
+            self._stats["failed" if error else "processed"] += 1
+        self._slots.release()
+        metrics.set_postprocess_pending(self._pending)
+        callback, args = (on_error, (song, error)) if error else (on_done, (song,))
+        if callback:
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error(f"Post-processing callback failed: {str(e)}")
+
+    def status(self):
+        """Stages, songs in flight and running totals"""
+        with self._lock:
+            return {"stages": self.stages, "workers": self.workers, "pending": self._pending,
+                    **{key: round(value, 2) if isinstance(value, float) else value for key, value in self._stats.items()}}
+
+    def close(self, wait=True):
+        """Shut the worker processes down, by default after the songs in flight"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,134 @@
+
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """In-process wall-clock sampling profiler for every Python thread.
+
+    A background thread reads sys._current_frames() at a fixed interval and
+    counts the stacks it sees, so the profiled threads are never paused or
+    instrumented. Output is in collapsed-stack format, one line per stack,
+    which flamegraph.pl, speedscope and most flamegraph viewers read directly.
+    """
+
+    def __init__(self, interval=0.005, max_seconds=60):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    def profile(self, seconds):
+        """Sample all threads for the given time and return collapsed stacks"""
+        seconds = max(0.1, min(float(seconds), self.max_seconds))
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            logger.info(f"Profiling all threads for {seconds:.1f}s")
+            stacks, samples = self._sample(seconds)
+        finally:
+            self._lock.release()
+        lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        logger.info(f"Profile finished: {samples} samples, {len(lines)} distinct stacks")
+        return "\n".join(lines) + "\n"
+
+    def _sample(self, seconds):
+        own_ident = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            samples += 1
+            time.sleep(self.interval)
+        return stacks, samples
+
+
+class HeapTracker:
+    """tracemalloc top allocations, with the diff since the previous call"""
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self._last = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start tracing allocations. Has a memory and CPU cost while running"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info(f"tracemalloc started with {self.frames} frame(s) per allocation")
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+        with self._lock:
+            self._last = None
+
+    def report(self, limit=25, group_by="lineno"):
+        """Top allocations now and the change since the last report"""
+        if not tracemalloc.is_tracing():
+            self.start()
+            return {
+                "tracing": True,
+                "message": "tracemalloc was not running and has been started; call again to see allocations",
+            }
+
+        # Leave out the tracer's own bookkeeping
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+        with self._lock:
+            previous, self._last = self._last, snapshot
+
+        current, peak = tracemalloc.get_traced_memory()
+        report = {
+            "tracing": True,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {
+                    "location": str(stat.traceback),
+                    "size_bytes": stat.size,
+                    "count": stat.count,
+                }
+                for stat in snapshot.statistics(group_by)[:limit]
+            ],
+        }
+        if previous is not None:
+            report["diff"] = [
+                {
+                    "location": str(stat.traceback),
+                    "size_bytes": stat.size,
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in snapshot.compare_to(previous, group_by)[:limit]
+            ]
+        return report
@@ -1,19 +1,11 @@
 
 import tkinter as tk
 from tkinter_interface import SunoAutomationGUI
+from housekeeping import configure_logging
 import logging
 import os
 import sys
 
-# Configure logging with timestamps and both file and console output
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("suno_automation.log"),
-        logging.StreamHandler()
-    ]
-)
 
 # Create a simple splash screen to indicate the app is loading
 def show_splash_screen():
@@ -46,6 +38,8 @@ def show_splash_screen():
     return splash
 
 if __name__ == "__main__":
+    # Logging with timestamps to file and console, set up in the main process only
+    configure_logging(sys.stderr)
     try:
         # Display splash screen while initializing
         splash = show_splash_screen()
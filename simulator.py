@@ -0,0 +1,255 @@
+
+import argparse
+import heapq
+import json
+import logging
+import math
+import random
+import sys
+import time
+
+from config import get_config
+from eta import DEFAULT_STAGE_SECONDS, MIN_SAMPLES, PhaseHistory, quantile
+from jobs import STAGES
+
+logger = logging.getLogger(__name__)
+
+PATTERNS = ["steady", "bursty", "batch"]
+
+# Spread of the made-up distribution used for stages without recorded history
+DEFAULT_SIGMA = 0.35
+
+
+class StageDistributions:
+    """Per-stage duration distributions: recorded samples, else a lognormal around the default"""
+
+    def __init__(self, samples=None, stages=None):
+        self.stages = stages or list(STAGES)
+        self.samples = {stage: list(values) for stage, values in (samples or {}).items() if len(values) >= MIN_SAMPLES}
+
+    @classmethod
+    def from_history(cls, history, tag=None, stages=None, limit=5000):
+        """Distributions from the phase history the job runner records"""
+        stages = stages or list(STAGES)
+        return cls({stage: history.samples(stage, tag=tag, limit=limit) for stage in stages}, stages)
+
+    def source(self, stage):
+        return f"{len(self.samples[stage])} samples" if stage in self.samples else "default"
+
+    def draw(self, rng, count):
+        """Run time of count jobs, all stages sampled in one pass per stage"""
+        totals = [0.0] * count
+        for stage in self.stages:
+            if stage in self.samples:
+                # Bootstrap from what was actually observed
+                values = rng.choices(self.samples[stage], k=count)
+            else:
+                median = DEFAULT_STAGE_SECONDS.get(stage, 10)
+                values = [median * math.exp(rng.gauss(0, DEFAULT_SIGMA)) for _ in range(count)]
+            totals = [total + value for total, value in zip(totals, values)]
+        return totals
+
+
+def arrivals(pattern, count, rate, rng, burst_size=10):
+    """Arrival times in seconds of count jobs; rate is jobs per hour"""
+    if pattern == "batch":
+        return [0.0] * count
+    per_second = rate / 3600
+    times = []
+    now = 0.0
+    if pattern == "steady":
+        for _ in range(count):
+            times.append(now)
+            now += rng.expovariate(per_second)
+        return times
+    # Bursty: groups of burst_size at once, with the same average rate
+    while len(times) < count:
+        times.extend([now] * min(burst_size, count - len(times)))
+        now += rng.expovariate(per_second / burst_size)
+    return times
+
+
+def simulate_run(durations, arrival_times, pool_size, accounts, credits, cost_per_job,
+                 failure_rate=0.0, rng=None):
+    """One discrete-event run of the worker pool.
+
+    Workers are spread round-robin over the accounts, as when one automation
+    per account serves the shared queue. A worker only takes a job while its
+    account can pay for it; credits are spent when the job submits, failed
+    generations included. Jobs left when no account with a worker can pay
+    are rejected; accounts beyond the pool size have no worker and never
+    pay for anything.
+    """
+    rng = rng or random.Random()
+    balances = [credits] * accounts
+    worker_account = [i % accounts for i in range(pool_size)]
+    served = set(worker_account)
+    idle = list(range(pool_size))
+    waiting = []
+    waits = []
+    finishes = []
+    busy_seconds = 0.0
+    failed = rejected = 0
+
+    events = [(t, 0, index) for index, t in enumerate(arrival_times)]
+    heapq.heapify(events)
+    now = 0.0
+
+    while events:
+        now, kind, payload = heapq.heappop(events)
+        if kind == 0:
+            waiting.append(payload)
+        else:
+            idle.append(payload)
+
+        # Hand queued jobs to idle workers whose account can still pay
+        while waiting and idle:
+            worker = next((w for w in idle if balances[worker_account[w]] >= cost_per_job), None)
+            if worker is None:
+                break
+            idle.remove(worker)
+            job = waiting.pop(0)
+            balances[worker_account[worker]] -= cost_per_job
+            waits.append(now - arrival_times[job])
+            run_time = durations[job]
+            if failure_rate and rng.random() < failure_rate:
+                failed += 1
+            else:
+                finishes.append(now + run_time)
+            busy_seconds += run_time
+            heapq.heappush(events, (now + run_time, 1, worker))
+
+        if waiting and not any(balances[account] >= cost_per_job for account in served):
+            rejected += len(waiting)
+            waiting = []
+
+    # Whatever no worker ever took counts as rejected too
+    rejected += len(waiting)
+
+    # The last event is the last worker going idle
+    makespan = now
+    span = makespan - (arrival_times[0] if arrival_times else 0.0)
+    return {
+        "completed": len(finishes),
+        "failed": failed,
+        "rejected": rejected,
+        "waits": waits,
+        "makespan": makespan,
+        "throughput_per_hour": len(finishes) / span * 3600 if span > 0 else 0.0,
+        "utilization": busy_seconds / (pool_size * makespan) if makespan > 0 else 0.0,
+        "credits_used": accounts * credits - sum(balances),
+    }
+
+
+def _stats(values, digits=1):
+    if not values:
+        return None
+    return {
+        "mean": round(sum(values) / len(values), digits),
+        "p50": round(quantile(values, 0.5), digits),
+        "p90": round(quantile(values, 0.9), digits),
+        "p99": round(quantile(values, 0.99), digits),
+    }
+
+
+def simulate(distributions, pattern="batch", jobs=100, rate=20.0, burst_size=10, pool_size=1,
+             accounts=1, credits=500, cost_per_job=10, failure_rate=0.0, runs=200, seed=None):
+    """Monte Carlo over many runs; returns predicted queue wait, throughput and credit burn"""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    # All job durations up front, one sampling pass for every run together
+    durations = distributions.draw(rng, jobs * runs)
+    waits, throughput, makespans, credits_used, utilization = [], [], [], [], []
+    completed = failed = rejected = short = 0
+    for run in range(runs):
+        result = simulate_run(
+            durations[run * jobs:(run + 1) * jobs],
+            arrivals(pattern, jobs, rate, rng, burst_size),
+            pool_size, accounts, credits, cost_per_job, failure_rate, rng,
+        )
+        waits.extend(result["waits"])
+        throughput.append(result["throughput_per_hour"])
+        makespans.append(result["makespan"] / 60)
+        credits_used.append(result["credits_used"])
+        utilization.append(result["utilization"])
+        completed += result["completed"]
+        failed += result["failed"]
+        rejected += result["rejected"]
+        short += result["rejected"] > 0
+    return {
+        "config": {
+            "pattern": pattern, "jobs": jobs, "rate_per_hour": rate, "burst_size": burst_size,
+            "pool_size": pool_size, "accounts": accounts, "credits_per_account": credits,
+            "cost_per_job": cost_per_job, "failure_rate": failure_rate, "runs": runs,
+        },
+        "distributions": {stage: distributions.source(stage) for stage in distributions.stages},
+        "queue_wait_seconds": _stats(waits),
+        "throughput_per_hour": _stats(throughput, 2),
+        "makespan_minutes": _stats(makespans),
+        "utilization": _stats(utilization, 3),
+        "credits_used": _stats(credits_used, 0),
+        "completed_per_run": round(completed / runs, 1),
+        "failed_per_run": round(failed / runs, 1),
+        "rejected_per_run": round(rejected / runs, 1),
+        "runs_out_of_credits": round(short / runs, 3),
+        "simulation_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict queue wait, throughput and credit burn of a campaign")
+    parser.add_argument("--pattern", choices=PATTERNS, default="batch", help="how jobs arrive")
+    parser.add_argument("--jobs", type=int, default=100, help="songs in the campaign")
+    parser.add_argument("--rate", type=float, default=20.0, help="arrivals per hour (steady and bursty)")
+    parser.add_argument("--burst-size", type=int, default=10, help="jobs per burst (bursty)")
+    parser.add_argument("--pool", type=_int_list, default=[1], help="workers, or a comma-separated list to compare")
+    parser.add_argument("--accounts", type=_int_list, default=[1], help="accounts, or a comma-separated list")
+    parser.add_argument("--credits", type=int, default=500, help="credits available per account")
+    parser.add_argument("--cost", type=int, help="credits per song (default CREDITS_PER_JOB)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of generations that fail after submitting")
+    parser.add_argument("--tag", choices=["instrumental", "vocals"], help="only use durations of this prompt type")
+    parser.add_argument("--no-download", action="store_true", help="jobs that do not download the audio")
+    parser.add_argument("--history", help="phase history CSV (default PHASE_HISTORY_PATH)")
+    parser.add_argument("--runs", type=int, default=200, help="Monte Carlo runs per configuration")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="write the full results as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+    config = get_config()
+    history = PhaseHistory(args.history or config.get("PHASE_HISTORY_PATH"))
+    stages = [stage for stage in STAGES if not args.no_download or stage != "download"]
+    distributions = StageDistributions.from_history(history, tag=args.tag, stages=stages)
+    cost = args.cost or config.get("CREDITS_PER_JOB", 10)
+
+    print("Stage durations: " + ", ".join(f"{stage} ({distributions.source(stage)})" for stage in stages))
+    print(f"{'pool':>4} {'accts':>5} {'wait p50':>9} {'wait p90':>9} {'songs/h':>8} {'done min':>9} "
+          f"{'credits':>8} {'rejected':>8} {'util':>5}")
+    results = []
+    for accounts in args.accounts:
+        for pool_size in args.pool:
+            result = simulate(
+                distributions, pattern=args.pattern, jobs=args.jobs, rate=args.rate, burst_size=args.burst_size,
+                pool_size=pool_size, accounts=accounts, credits=args.credits, cost_per_job=cost,
+                failure_rate=args.failure_rate, runs=args.runs, seed=args.seed,
+            )
+            results.append(result)
+            wait = result["queue_wait_seconds"] or {"p50": 0, "p90": 0}
+            print(f"{pool_size:>4} {accounts:>5} {wait['p50']:>8.0f}s {wait['p90']:>8.0f}s "
+                  f"{result['throughput_per_hour']['p50']:>8.1f} {result['makespan_minutes']['p90']:>9.1f} "
+                  f"{result['credits_used']['p50']:>8.0f} {result['rejected_per_run']:>8.1f} "
+                  f"{result['utilization']['p50']:>5.0%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
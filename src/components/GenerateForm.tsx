@@ -3,6 +3,7 @@ import { useState } from "react";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Textarea } from "@/components/ui/textarea";
+import { Progress } from "@/components/ui/progress";
 import { toast } from "sonner";
 import { Loader2, MusicIcon, DownloadIcon, LinkIcon } from "lucide-react";
 import { useForm } from "react-hook-form";
@@ -26,6 +27,44 @@ export interface SongResult {
   download_error?: string;
 }
 
+export interface JobEta {
+  eta_seconds: number;
+  eta_p90_seconds: number;
+  progress: number;
+  queue_position: number;
+  stage?: string | null;
+}
+
+interface JobEvent {
+  job_id: string;
+  status: string;
+  stage?: string | null;
+  eta?: JobEta | null;
+  result?: SongResult & { error?: string };
+}
+
+// Follow a queued job over server-sent events until it finishes
+const followJob = (jobId: string, onProgress: (event: JobEvent) => void) =>
+  new Promise<SongResult & { error?: string }>((resolve, reject) => {
+    const source = new EventSource(`http://localhost:8000/jobs/${jobId}/events`);
+    source.addEventListener("progress", (message) => {
+      onProgress(JSON.parse((message as MessageEvent).data));
+    });
+    source.addEventListener("done", (message) => {
+      source.close();
+      resolve(JSON.parse((message as MessageEvent).data).result);
+    });
+    source.onerror = () => {
+      source.close();
+      reject(new Error("Lost connection to the job stream"));
+    };
+  });
+
+const formatSeconds = (seconds: number) => {
+  const rounded = Math.max(0, Math.round(seconds));
+  return rounded >= 60 ? `${Math.floor(rounded / 60)}m ${rounded % 60}s` : `${rounded}s`;
+};
+
 interface GenerateFormProps {
   isServerConnected: boolean;
   onGenerate: (song: SongResult) => void;
@@ -34,6 +73,7 @@ interface GenerateFormProps {
 const GenerateForm = ({ isServerConnected, onGenerate }: GenerateFormProps) => {
   const [isGenerating, setIsGenerating] = useState(false);
   const [songResult, setSongResult] = useState<SongResult | null>(null);
+  const [jobEvent, setJobEvent] = useState<JobEvent | null>(null);
 
   const form = useForm<GenerateFormData>({
     defaultValues: {
@@ -53,9 +93,10 @@ const GenerateForm = ({ isServerConnected, onGenerate }: GenerateFormProps) => {
 
     setIsGenerating(true);
     setSongResult(null);
+    setJobEvent(null);
 
     try {
-      const response = await fetch("http://localhost:8000/generate", {
+      const response = await fetch("http://localhost:8000/jobs", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -69,7 +110,13 @@ const GenerateForm = ({ isServerConnected, onGenerate }: GenerateFormProps) => {
         }),
       });
 
-      const result = await response.json();
+      const job = await response.json();
+      if (!response.ok) {
+        toast.error(`Generation failed: ${job.detail}`);
+        return;
+      }
+
+      const result = await followJob(job.job_id, setJobEvent);
       setSongResult(result);
       
       if (result.success) {
@@ -84,6 +131,7 @@ const GenerateForm = ({ isServerConnected, onGenerate }: GenerateFormProps) => {
       console.error(error);
     } finally {
       setIsGenerating(false);
+      setJobEvent(null);
     }
   };
 
@@ -220,6 +268,18 @@ const GenerateForm = ({ isServerConnected, onGenerate }: GenerateFormProps) => {
         </form>
       </Form>
 
+      {isGenerating && jobEvent?.eta && (
+        <div className="mt-4 space-y-1">
+          <Progress value={jobEvent.eta.progress * 100} />
+          <p className="text-sm text-muted-foreground">
+            {jobEvent.eta.queue_position > 0
+              ? `${jobEvent.eta.queue_position} job(s) ahead in the queue. `
+              : jobEvent.stage ? `Stage: ${jobEvent.stage}. ` : ""}
+            About {formatSeconds(jobEvent.eta.eta_seconds)} left (at most ~{formatSeconds(jobEvent.eta.eta_p90_seconds)})
+          </p>
+        </div>
+      )}
+
       {songResult && songResult.success && (
         <div className="mt-6 p-4 bg-green-50 border border-green-200 rounded-md">
           <h3 className="font-medium text-green-800 mb-2">Song Created!</h3>
@@ -22,6 +22,11 @@ const SongHistory: React.FC<SongHistoryProps> = ({ history }) => {
       {history.map((song, index) => (
         <div key={index} className="p-3 border rounded-md hover:bg-gray-50">
           <p className="text-sm font-medium mb-1 line-clamp-2">{song.prompt}</p>
+          {song.id != null && (song.audio_url || song.file_path) && (
+            // Streamed by the backend with Range support, so seeking works without the whole file;
+            // a song that was not downloaded is fetched from its audio URL on first play
+            <audio controls preload="none" src={`http://localhost:8000/songs/${song.id}/audio`} className="w-full h-8 mt-1" />
+          )}
           <div className="flex gap-2 mt-2">
             {song.url && (
               <Button 
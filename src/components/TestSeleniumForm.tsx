@@ -16,8 +16,10 @@ export interface TestFormData {
 }
 
 export interface SongResult {
+  id?: number;
   success: boolean;
   url?: string;
+  audio_url?: string;
   prompt: string;
   style?: string;
   title?: string;
@@ -1,5 +1,5 @@
 
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { Button } from "@/components/ui/button";
 import { Card } from "@/components/ui/card";
 import { HelpCircleIcon, SettingsIcon } from "lucide-react";
@@ -14,6 +14,18 @@ const Index = () => {
   const [helpOpen, setHelpOpen] = useState(false);
   const [settingsOpen, setSettingsOpen] = useState(false);
 
+  useEffect(() => {
+    // Start from the latest songs in the local library, if the backend is running
+    fetch("http://localhost:8000/songs?limit=10")
+      .then(response => (response.ok ? response.json() : null))
+      .then(data => {
+        if (data?.songs) {
+          setHistory(prev => [...prev, ...data.songs].slice(0, 10));
+        }
+      })
+      .catch(() => {});
+  }, []);
+
   const handleSongGenerated = (result: SongResult) => {
     setHistory(prev => [result, ...prev].slice(0, 10)); // Keep only the 10 most recent songs
   };
@@ -0,0 +1,198 @@
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+
+from utils import safe_filename
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SongStore:
+    """Content-addressed audio storage under the download directory.
+
+    Each file is stored once, as objects/ab/cd/<sha256>.<ext>, so identical
+    downloads are deduplicated and no directory grows past a few hundred
+    entries. Titles, prompts and job ids live in index.jsonl, one line per
+    stored song; with links enabled every song also gets a hard link with a
+    readable name under songs/. Files are downloaded into tmp/, on the same
+    filesystem, and renamed into place.
+    """
+
+    def __init__(self, root, links=True):
+        self.root = root
+        self.links = links
+        self.objects_dir = os.path.join(root, "objects")
+        self.staging_dir = os.path.join(root, "tmp")
+        self.songs_dir = os.path.join(root, "songs")
+        self.index_path = os.path.join(root, "index.jsonl")
+        self._entries = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._load()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a store from get_config values"""
+        root = config.get("DOWNLOAD_PATH") or os.path.join(os.path.expanduser("~"), "Downloads", "suno")
+        return cls(os.path.expanduser(root), links=config.get("STORAGE_LINKS", True))
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = json.loads(line)
+                    if entry.get("removed_at"):
+                        self._entries.pop(entry["sha256"], None)
+                        continue
+                    self._entries.setdefault(entry["sha256"], []).append(entry)
+            logger.info(f"Loaded {len(self._entries)} stored songs from {self.index_path}")
+        except Exception as e:
+            logger.error(f"Could not load song index from {self.index_path}: {str(e)}")
+
+    def object_path(self, sha256, extension=".mp3"):
+        """Where the file with this digest lives"""
+        return os.path.join(self.objects_dir, sha256[:2], sha256[2:4], f"{sha256}{extension}")
+
+    def sha256_of(self, path):
+        """Digest of a file, read from the name of stored objects"""
+        if os.path.abspath(path).startswith(os.path.abspath(self.objects_dir) + os.sep):
+            return os.path.splitext(os.path.basename(path))[0]
+        return file_sha256(path)
+
+    def staging_path(self, name):
+        """Temporary download location on the same filesystem as the store"""
+        return os.path.join(self.staging_dir, safe_filename(name))
+
+    def put(self, path, name=None, metadata=None, sha256=None):
+        """Move a finished file into the store and return its entry.
+
+        The digest is computed unless the caller already has it. A file
+        whose content is already stored is dropped and the existing object
+        reused.
+        """
+        sha256 = sha256 or file_sha256(path)
+        extension = os.path.splitext(path)[1].lower() or ".mp3"
+        target = self.object_path(sha256, extension)
+        deduplicated = os.path.exists(target)
+        if deduplicated:
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.replace(path, target)
+            except OSError:
+                # Different filesystem: copy next to the target, then rename
+                tmp_path = f"{target}.tmp"
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, target)
+                os.remove(path)
+
+        entry = {
+            "sha256": sha256,
+            "path": target,
+            "size": os.path.getsize(target),
+            "name": name or os.path.splitext(os.path.basename(path))[0],
+            "stored_at": datetime.now().isoformat(),
+            "deduplicated": deduplicated,
+        }
+        entry.update(metadata or {})
+        if self.links:
+            entry["link"] = self._link(target, entry["name"], extension)
+        with self._lock:
+            self._entries.setdefault(sha256, []).append(entry)
+            self._append(entry)
+        logger.info(f"Stored '{entry['name']}' as {sha256[:12]}{' (duplicate content)' if deduplicated else ''}")
+        return entry
+
+    def _link(self, target, name, extension):
+        """Hard link with a readable name; None where the filesystem refuses"""
+        os.makedirs(self.songs_dir, exist_ok=True)
+        base = safe_filename(name)
+        link = os.path.join(self.songs_dir, base + extension)
+        counter = 2
+        while os.path.exists(link):
+            if os.path.samefile(link, target):
+                return link
+            link = os.path.join(self.songs_dir, f"{base} ({counter}){extension}")
+            counter += 1
+        try:
+            os.link(target, link)
+            return link
+        except OSError as e:
+            logger.debug(f"Could not link {link}: {str(e)}")
+            return None
+
+    def _append(self, entry):
+        try:
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                # One write per line keeps each entry whole if the process dies
+                f.write(json.dumps(entry) + "\n")
+        except Exception as e:
+            logger.error(f"Could not update song index {self.index_path}: {str(e)}")
+
+    def remove(self, path):
+        """Delete a stored file with its readable links and sidecars; returns the bytes freed"""
+        sha256 = os.path.splitext(os.path.basename(path))[0]
+        with self._lock:
+            entries = self._entries.pop(sha256, [])
+            self._append({"sha256": sha256, "removed_at": datetime.now().isoformat()})
+        freed = 0
+        for target in (path, f"{path}.idx"):
+            try:
+                freed += os.path.getsize(target)
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+        # Hard links share the object's blocks: they have to go too for the space to be freed
+        for entry in entries:
+            if entry.get("link"):
+                try:
+                    os.remove(entry["link"])
+                except FileNotFoundError:
+                    pass
+        logger.info(f"Removed stored song {sha256[:12]} ({freed} bytes)")
+        return freed
+
+    def get(self, sha256):
+        """Index entries of a stored file, newest last"""
+        with self._lock:
+            return list(self._entries.get(sha256, []))
+
+    def find(self, name):
+        """Entries whose readable name contains name"""
+        name = name.lower()
+        with self._lock:
+            return [entry for entries in self._entries.values() for entry in entries if name in entry["name"].lower()]
+
+    def stats(self):
+        """Object count, stored bytes and how many puts were deduplicated"""
+        with self._lock:
+            entries = [entry for entries in self._entries.values() for entry in entries]
+            return {
+                "root": self.root,
+                "objects": len(self._entries),
+                "bytes": sum(entries[0]["size"] for entries in self._entries.values()),
+                "songs": len(entries),
+                "deduplicated": sum(1 for entry in entries if entry.get("deduplicated")),
+            }
@@ -0,0 +1,177 @@
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloader import Downloader, DownloadError, IntegrityError
+
+SIZE = 1000
+SENT = 10
+CONTENT = bytes(range(256)) * 40
+SEGMENT = 1024
+
+
+class BrokenHandler(BaseHTTPRequestHandler):
+    """Announces SIZE bytes, sends SENT of them, then stalls or hangs up"""
+
+    def do_GET(self):
+        self.server.requests += 1
+        ranged = self.server.ranges and self.headers.get("Range")
+        if ranged:
+            start, end = (int(value) for value in ranged.split("=")[1].split("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{SIZE}")
+        else:
+            start, end = 0, SIZE - 1
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if end - start + 1 <= SENT:
+            # The probe of a ranged download
+            self.wfile.write(b"x" * (end - start + 1))
+            return
+        self.wfile.write(b"x" * SENT)
+        self.wfile.flush()
+        if self.server.stall:
+            time.sleep(2)
+
+    def log_message(self, *args):
+        pass
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """Serves CONTENT with Range support, recording the ranges asked for"""
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            if self.server.fail_first:
+                # Hang up on the first request without an answer
+                self.server.fail_first -= 1
+                self.close_connection = True
+                return
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            start, end = (int(value) for value in self.headers["Range"].split("=")[1].split("-"))
+            self.server.ranges.append((start, end))
+            # Slow enough for the segments to overlap
+            time.sleep(0.05)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(CONTENT)}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            self.wfile.write(CONTENT[start:end + 1])
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(test, handler, **attributes):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.requests = 0
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server
+
+
+def temp_dir(test):
+    folder = tempfile.TemporaryDirectory()
+    test.addCleanup(folder.cleanup)
+    return folder.name
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = serve(self, FileHandler, lock=threading.Lock(), fail_first=0, active=0, max_active=0, ranges=[])
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/song.mp3"
+        self.path = os.path.join(temp_dir(self), "song.mp3")
+        self.downloader = Downloader(segment_size=SEGMENT, connections_per_download=4, timeout=2, retries=2)
+
+    def test_segments_are_fetched_in_parallel(self):
+        result = self.downloader.download(self.url, self.path, sha256=hashlib.sha256(CONTENT).hexdigest())
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), CONTENT)
+        self.assertEqual(result["size"], len(CONTENT))
+        self.assertGreater(self.server.max_active, 1)
+        self.assertFalse(os.path.exists(f"{self.path}.part"))
+        self.assertFalse(os.path.exists(f"{self.path}.part.json"))
+
+    def test_download_resumes_from_part_state(self):
+        done = [[0, SEGMENT - 1], [SEGMENT, 2 * SEGMENT - 1]]
+        with open(f"{self.path}.part", "wb") as f:
+            f.write(CONTENT[:2 * SEGMENT] + b"\0" * (len(CONTENT) - 2 * SEGMENT))
+        with open(f"{self.path}.part.json", "w", encoding="utf-8") as f:
+            json.dump({"url": self.url, "size": len(CONTENT), "etag": '"v1"', "done": done}, f)
+
+        result = self.downloader.download(self.url, self.path)
+        self.assertEqual(result["resumed_bytes"], 2 * SEGMENT)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), CONTENT)
+        # The probe, then only the segments that were missing
+        fetched = sorted(self.server.ranges[1:])
+        self.assertEqual(fetched[0][0], 2 * SEGMENT)
+        self.assertEqual(len(fetched), -(-len(CONTENT) // SEGMENT) - 2)
+
+    def test_size_mismatch_raises_integrity_error(self):
+        with self.assertRaises(IntegrityError):
+            self.downloader.download(self.url, self.path, expected_size=len(CONTENT) + 1)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_sha256_mismatch_raises_integrity_error_and_drops_the_part(self):
+        with self.assertRaises(IntegrityError):
+            self.downloader.download(self.url, self.path, sha256=hashlib.sha256(b"other").hexdigest())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(f"{self.path}.part"))
+        self.assertFalse(os.path.exists(f"{self.path}.part.json"))
+
+    def test_failed_probe_is_retried(self):
+        self.server.fail_first = 1
+        result = self.downloader.download(self.url, self.path)
+        self.assertEqual(result["size"], len(CONTENT))
+        # The dropped probe, then every ranged request of the retry
+        self.assertEqual(self.server.requests, len(self.server.ranges) + 1)
+
+
+class DownloadFailureTest(unittest.TestCase):
+
+    def serve(self, stall, ranges):
+        return serve(self, BrokenHandler, stall=stall, ranges=ranges)
+
+    def download(self, server):
+        path = os.path.join(temp_dir(self), "song.mp3")
+        downloader = Downloader(timeout=0.3, retries=2, connections_per_download=1)
+        with self.assertRaises(DownloadError):
+            downloader.download(f"http://127.0.0.1:{server.server_address[1]}/song.mp3", path)
+        # The probe, then every attempt of the transfer
+        self.assertEqual(server.requests, 3)
+
+    def test_stalled_stream_is_retried_then_raises_download_error(self):
+        self.download(self.serve(stall=True, ranges=False))
+
+    def test_stalled_segment_is_retried_then_raises_download_error(self):
+        self.download(self.serve(stall=True, ranges=True))
+
+    def test_cut_connection_raises_download_error(self):
+        self.download(self.serve(stall=False, ranges=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,17 +7,15 @@ import logging
 import platform
 import webbrowser
 from playwright_automation import SunoAutomation
+from jobs import Job, JobRunner
+from eta import EtaEstimator
+from adaptive_timeouts import AdaptiveTimeouts
+from har_session import HarSession
+from downloader import Downloader
+from storage import SongStore
 from config import get_config
 
-# Configurazione del logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("suno_automation.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Il logging è configurato da run_tkinter_app, solo nel processo principale
 logger = logging.getLogger(__name__)
 
 class SunoAutomationGUI:
@@ -151,9 +149,14 @@ class SunoAutomationGUI:
         
         # Barra di stato
         self.progress_var = tk.DoubleVar()
-        progress_bar = ttk.Progressbar(left_frame, orient=tk.HORIZONTAL, variable=self.progress_var, mode='indeterminate')
+        progress_bar = ttk.Progressbar(left_frame, orient=tk.HORIZONTAL, variable=self.progress_var, mode='determinate')
         progress_bar.pack(fill=tk.X, pady=5)
         
+        # Tempo stimato, dallo storico delle durate delle fasi
+        self.eta_var = tk.StringVar()
+        eta_label = ttk.Label(left_frame, textvariable=self.eta_var)
+        eta_label.pack(anchor=tk.W)
+        
         # Area log
         log_label = ttk.Label(left_frame, text="Log:")
         log_label.pack(anchor=tk.W, pady=(10, 2))
@@ -203,7 +206,7 @@ class SunoAutomationGUI:
     
     def open_suno_website(self):
         """Open Suno.com in the default browser"""
-        webbrowser.open("https://suno.com/create?wid=default")
+        webbrowser.open(f"{self.config.get('SUNO_BASE_URL', 'https://suno.com').rstrip('/')}/create?wid=default")
         self.log_message("Suno.com opened in the default browser")
     
     def initialize_automation(self):
@@ -224,6 +227,13 @@ class SunoAutomationGUI:
             use_chrome_profile = self.config.get("USE_CHROME_PROFILE", True)
             chrome_user_data_dir = self.config.get("CHROME_USER_DATA_DIR")
             headless = self.config.get("HEADLESS", "False").lower() == "true"
+            store = SongStore.from_config(self.config)
+            job_runner = JobRunner.from_config(self.config, store)
+            if job_runner.library:
+                self.root.after(0, self.load_history, job_runner.library)
+            timeouts = AdaptiveTimeouts.from_config(self.config)
+            har = HarSession.from_config(self.config)
+            downloader = Downloader.from_config(self.config)
             
             self.log_message(f"Chrome profile: {use_chrome_profile}")
             self.log_message(f"Chrome profile dir: {chrome_user_data_dir}")
@@ -235,21 +245,39 @@ class SunoAutomationGUI:
                 self.automation = SunoAutomation(
                     headless=headless,
                     use_chrome_profile=True,
-                    chrome_user_data_dir=chrome_user_data_dir
+                    chrome_user_data_dir=chrome_user_data_dir,
+                    job_runner=job_runner,
+                    timeouts=timeouts,
+                    base_url=self.config.get("SUNO_BASE_URL"),
+                    har=har,
+                    downloader=downloader,
+                    store=store
                 )
             elif self.config.get("EMAIL") and self.config.get("PASSWORD"):
                 self.log_message("Using email/password credentials")
                 self.automation = SunoAutomation(
                     email=self.config.get("EMAIL"),
                     password=self.config.get("PASSWORD"),
-                    headless=headless
+                    headless=headless,
+                    job_runner=job_runner,
+                    timeouts=timeouts,
+                    base_url=self.config.get("SUNO_BASE_URL"),
+                    har=har,
+                    downloader=downloader,
+                    store=store
                 )
             else:
                 self.log_message("Attempting with default Chrome profile")
                 self.automation = SunoAutomation(
                     headless=headless,
                     use_chrome_profile=True,
-                    chrome_user_data_dir=chrome_user_data_dir
+                    chrome_user_data_dir=chrome_user_data_dir,
+                    job_runner=job_runner,
+                    timeouts=timeouts,
+                    base_url=self.config.get("SUNO_BASE_URL"),
+                    har=har,
+                    downloader=downloader,
+                    store=store
                 )
             
             if self.automation.connected:
@@ -461,31 +489,37 @@ class SunoAutomationGUI:
         self.toggle_controls(False)
         self.progress_var.set(0)
         
+        # Generate (and optionally download) the song as one staged job,
+        # so a failed download does not trigger a new generation
+        job = Job(
+            prompt=prompt,
+            style=style if style else None,
+            title=title if title else None,
+            instrumental=instrumental,
+            download=download,
+            timeout=self.config.get("JOB_DEADLINE") or None
+        )
+        
         # Start the progress bar
-        self.animate_progress()
+        self.animate_progress(job)
         
         # Start generation in a separate thread
         gen_thread = threading.Thread(
             target=self._generate_song_thread, 
-            args=(prompt, style, title, instrumental, download)
+            args=(job,)
         )
         gen_thread.daemon = True
         gen_thread.start()
     
-    def _generate_song_thread(self, prompt, style, title, instrumental, download):
+    def _generate_song_thread(self, job):
         """Separate thread for song generation"""
         try:
-            self.log_message(f"Generating song: {title if title else prompt[:30]}...")
-            self.log_message(f"Style: {style if style else 'Not specified'}")
-            self.log_message(f"Instrumental: {'Yes' if instrumental else 'No'}")
+            params = job.params
+            self.log_message(f"Generating song: {params['title'] if params['title'] else params['prompt'][:30]}...")
+            self.log_message(f"Style: {params['style'] if params['style'] else 'Not specified'}")
+            self.log_message(f"Instrumental: {'Yes' if params['instrumental'] else 'No'}")
             
-            # Generate the song - passing the explicit parameters
-            result = self.automation.generate_song(
-                prompt=prompt,
-                style=style if style else None,
-                title=title if title else None,
-                instrumental=instrumental
-            )
+            result = self.automation.run_job(job).result()
             
             self.log_message(f"Generation result: {result}")
             
@@ -493,16 +527,10 @@ class SunoAutomationGUI:
                 self.log_message(f"Song generated successfully!")
                 self.log_message(f"URL: {result['url']}")
                 
-                # Download if requested
-                if download:
-                    self.log_message("Downloading song...")
-                    download_result = self.automation.download_song(result["url"])
-                    
-                    if download_result["success"]:
-                        result["file_path"] = download_result["file_path"]
-                        self.log_message(f"Song downloaded to: {download_result['file_path']}")
-                    else:
-                        self.log_message(f"Error during download: {download_result.get('error', 'Unknown error')}")
+                if result.get("file_path"):
+                    self.log_message(f"Song downloaded to: {result['file_path']}")
+                elif result.get("download_error"):
+                    self.log_message(f"Error during download: {result['download_error']}")
                 
                 # Add to history
                 self.root.after(0, self.add_to_history, result)
@@ -515,29 +543,29 @@ class SunoAutomationGUI:
             self.root.after(0, self.toggle_controls, True)
             self.root.after(0, self.stop_progress)
     
-    def animate_progress(self):
-        """Anima la barra di progresso"""
-        import time
+    def animate_progress(self, job):
+        """Aggiorna la barra di progresso con la stima reale del job"""
         self.progress_running = True
+        estimator = EtaEstimator(self.automation.job_runner.history)
         
         def _animate():
             if not self.progress_running:
                 return
             
-            current = self.progress_var.get()
-            if current >= 100:
-                self.progress_var.set(0)
-            else:
-                self.progress_var.set(current + 1)
+            eta = estimator.estimate(job)
+            self.progress_var.set(eta["progress"] * 100)
+            if job.current_stage:
+                self.eta_var.set(f"{job.current_stage}: ~{eta['eta_seconds']:.0f}s remaining (p90 {eta['eta_p90_seconds']:.0f}s)")
             
-            self.root.after(50, _animate)
+            self.root.after(500, _animate)
         
         _animate()
     
     def stop_progress(self):
-        """Ferma l'animazione della barra di progresso"""
+        """Ferma l'aggiornamento della barra di progresso"""
         self.progress_running = False
         self.progress_var.set(0)
+        self.eta_var.set("")
     
     def toggle_controls(self, enabled):
         """Abilita/disabilita i controlli del form"""
@@ -551,6 +579,11 @@ class SunoAutomationGUI:
             if isinstance(child, ttk.Button):
                 child.config(state=state)
     
+    def load_history(self, library):
+        """Mostra le ultime canzoni salvate nella libreria"""
+        for song in reversed(library.recent(10)):
+            self.add_to_history(song)
+    
     def add_to_history(self, result):
         """Aggiunge una canzone alla cronologia"""
         # Rimuovi il placeholder se è la prima canzone
@@ -0,0 +1,209 @@
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Playwright request.timing fields, in the order they happen. Values are ms
+# relative to startTime, or -1 when the phase did not take place.
+NETWORK_PHASES = [
+    ("dns", "domainLookupStart", "domainLookupEnd"),
+    ("connect", "connectStart", "connectEnd"),
+    ("tls", "secureConnectionStart", "connectEnd"),
+    ("ttfb", "requestStart", "responseStart"),
+    ("download", "responseStart", "responseEnd"),
+]
+
+
+def now_us():
+    return int(time.time() * 1000000)
+
+
+class JobTrace:
+    """Spans recorded for one job, in Chrome Trace Event format.
+
+    Python spans are complete ("X") events on the thread that ran them, so
+    nested calls nest in the viewer. Network requests overlap freely and are
+    recorded as async ("b"/"e") events on their own track.
+    """
+
+    enabled = True
+
+    def __init__(self, job_id, max_events=20000):
+        self.job_id = job_id
+        self.max_events = max_events
+        self.started_us = now_us()
+        self.dropped = 0
+        self._events = []
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _add(self, event):
+        with self._lock:
+            if len(self._events) >= self.max_events:
+                self.dropped += 1
+                return
+            event.setdefault("pid", 1)
+            event.setdefault("tid", threading.get_ident())
+            self._events.append(event)
+
+    @contextmanager
+    def span(self, name, cat="python", **args):
+        """Record the duration of a block as a nested span"""
+        start = now_us()
+        try:
+            yield
+        except Exception as e:
+            args["error"] = str(e)[:200]
+            raise
+        finally:
+            self.complete(name, start, now_us(), cat=cat, **args)
+
+    def complete(self, name, start_us, end_us, cat="python", **args):
+        """Record a span whose start and end are already known (epoch µs)"""
+        self._add({"name": name, "cat": cat, "ph": "X", "ts": start_us,
+                   "dur": max(0, end_us - start_us), "args": args})
+
+    def instant(self, name, cat="event", **args):
+        """Record a point in time, such as a page event"""
+        self._add({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": now_us(), "args": args})
+
+    def network(self, request, failure=None):
+        """Record a finished or failed Playwright request with its timing breakdown"""
+        try:
+            timing = request.timing
+        except Exception:
+            return
+        start_ms = timing.get("startTime")
+        end = timing.get("responseEnd", -1)
+        if not start_ms or start_ms < 0:
+            return
+        start_us = int(start_ms * 1000)
+        end_us = start_us + int(max(end, 0) * 1000) if end >= 0 else now_us()
+        with self._lock:
+            self._next_id += 1
+            span_id = self._next_id
+
+        args = {"method": request.method, "resource_type": request.resource_type}
+        if failure:
+            args["failure"] = failure
+        name = request.url.split("?")[0][:200]
+        common = {"cat": "network", "id": span_id, "tid": "network"}
+        self._add(dict(common, name=name, ph="b", ts=start_us, args=args))
+        for phase, begin_key, end_key in NETWORK_PHASES:
+            begin, finish = timing.get(begin_key, -1), timing.get(end_key, -1)
+            if begin >= 0 and finish > begin:
+                self._add(dict(common, name=phase, ph="b", ts=start_us + int(begin * 1000)))
+                self._add(dict(common, name=phase, ph="e", ts=start_us + int(finish * 1000)))
+        self._add(dict(common, name=name, ph="e", ts=max(end_us, start_us)))
+
+    def to_chrome(self):
+        """The trace as a Chrome Trace Event JSON object"""
+        with self._lock:
+            events = list(self._events)
+        threads = {event["tid"] for event in events}
+        metadata = [{"name": "process_name", "ph": "M", "pid": 1, "tid": 0,
+                     "args": {"name": f"suno job {self.job_id}"}}]
+        for tid in threads:
+            label = "network" if tid == "network" else f"python thread {tid}"
+            metadata.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": label}})
+        return {
+            "traceEvents": metadata + sorted(events, key=lambda event: event["ts"]),
+            "displayTimeUnit": "ms",
+            "otherData": {"job_id": self.job_id, "dropped_events": self.dropped},
+        }
+
+
+class NullTrace:
+    """Stand-in for jobs that were not sampled, recording nothing"""
+
+    enabled = False
+
+    @contextmanager
+    def span(self, name, cat="python", **args):
+        yield
+
+    def complete(self, name, start_us, end_us, cat="python", **args):
+        pass
+
+    def instant(self, name, cat="event", **args):
+        pass
+
+    def network(self, request, failure=None):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+def trace_of(job):
+    """The trace of a job, or a no-op trace when there is no job or it is not sampled"""
+    trace = getattr(job, "trace", None) if job is not None else None
+    return trace or NULL_TRACE
+
+
+class Tracer:
+    """Decides which jobs are traced and writes their traces to disk"""
+
+    def __init__(self, sample_rate=0.1, output_dir=None, max_files=200, max_events=20000):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.max_files = max_files
+        self.max_events = max_events
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a tracer from get_config values"""
+        return cls(
+            sample_rate=config.get("TRACE_SAMPLE_RATE", 0.1),
+            output_dir=config.get("TRACE_DIR"),
+            max_files=config.get("TRACE_MAX_FILES", 200),
+        )
+
+    def begin(self, job, force=False):
+        """Start tracing a job if it is sampled. Safe to call more than once"""
+        if job.trace is None:
+            sampled = force or (self.output_dir and random.random() < self.sample_rate)
+            job.trace = JobTrace(job.id, self.max_events) if sampled else NULL_TRACE
+        return job.trace
+
+    def finish(self, job):
+        """Write a job's trace to disk and return its path, or None if not traced"""
+        trace = trace_of(job)
+        if not trace.enabled or not self.output_dir:
+            return None
+        path = os.path.join(self.output_dir, f"trace_{job.id}.json")
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(trace.to_chrome(), f)
+            os.replace(tmp_path, path)
+            job.trace_path = path
+            logger.info(f"Trace for job {job.id} written to {path}")
+            self._prune()
+            return path
+        except Exception as e:
+            logger.error(f"Could not write trace for job {job.id}: {str(e)}")
+            return None
+
+    def _prune(self):
+        """Keep only the newest max_files traces"""
+        try:
+            paths = [os.path.join(self.output_dir, name) for name in os.listdir(self.output_dir)
+                     if name.startswith("trace_") and name.endswith(".json")]
+        except OSError:
+            return
+        if len(paths) <= self.max_files:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -3,6 +3,7 @@ import time
 import random
 import os
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -18,3 +19,8 @@ def ensure_dir_exists(directory):
         logger.info(f"Creating directory: {directory}")
         os.makedirs(directory)
     return directory
+
+def safe_filename(name, default="song"):
+    """Turn a song title into a file name that is valid on every OS"""
+    name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name or "").strip(" .")
+    return name[:120] or default